@@ -0,0 +1,427 @@
+import os
+import re
+import time
+import fcntl
+import hashlib
+import sqlite3
+import logging
+from git import Repo, InvalidGitRepositoryError, NoSuchPathError, GitCommandError
+from app.repo_index import PRUNED_DIRS, MANIFESTS, SOURCE_EXTENSIONS, CONFIG_EXTENSIONS
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+logger = logging.getLogger('[Orchestrator]')
+
+TEXT_EXTENSIONS = SOURCE_EXTENSIONS | CONFIG_EXTENSIONS | {".md", ".rst", ".txt", ".sql", ".gradle", ".kts"}
+SKIPPED_FILES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Cargo.lock", "go.sum"}
+STALE_BLOB_SECONDS = 7 * 24 * 3600  # chunks of file versions no job has used for this long are dropped
+CANDIDATES = 200  # BM25 rows fetched per search before filtering to the job's files
+MAX_LINE_CHARS = 300
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_DEFINITION = re.compile(r"(?:export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+|pub\s+)*"
+                         r"(?:def|class|func|function|interface|struct|enum|impl|fn|type|module|const|var|let)\b")
+
+def terms(text):
+    """Search terms of code or a query: identifiers, lowercased, plus their snake_case/camelCase parts."""
+    result = []
+    for word in _IDENTIFIER.findall(text):
+        lower = word.lower()
+        result.append(lower)
+        parts = [p.lower() for piece in word.split('_') for p in _CAMEL.findall(piece)]
+        if len(parts) > 1:
+            result.extend(parts)
+    return result
+
+def blob_hash(data):
+    """Git blob hash of file content (what `git hash-object` prints)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def indexable(path):
+    parts = path.split('/')
+    if any(part in PRUNED_DIRS for part in parts[:-1]):
+        return False
+    name = parts[-1]
+    if name in SKIPPED_FILES or name.endswith((".min.js", ".min.css", ".map")):
+        return False
+    return name in MANIFESTS or os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS
+
+def chunk_lines(lines, size):
+    """
+    Splits a file into (start, end) line ranges (1-based, inclusive) of at most
+    `size` lines. Ranges start at definitions (with their decorators) or at
+    top-level lines after a blank line where possible; longer blocks are cut
+    into overlapping windows.
+    """
+    def starts_block(i):
+        line, previous = lines[i].strip(), lines[i - 1].strip()
+        if not line or previous.startswith('@'):
+            return False
+        if line.startswith('@') or _DEFINITION.match(line):
+            return True
+        return not lines[i][0].isspace() and not previous
+
+    starts = [0] + [i for i in range(1, len(lines)) if starts_block(i)]
+    blocks = list(zip(starts, starts[1:] + [len(lines)]))
+    ranges = []
+    current = None
+    for start, end in blocks:
+        if end - start > size:
+            if current:
+                ranges.append(current)
+                current = None
+            step = max(1, size - size // 6)
+            for window in range(start, end, step):
+                ranges.append((window, min(window + size, end)))
+                if window + size >= end:
+                    break
+        elif current and end - current[0] <= size:
+            current = (current[0], end)
+        else:
+            if current:
+                ranges.append(current)
+            current = (start, end)
+    if current:
+        ranges.append(current)
+    return [(start + 1, end) for start, end in ranges if any(line.strip() for line in lines[start:end])]
+
+class Hit:
+    def __init__(self, path, start, end, score):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.score = score
+
+class CodeIndex:
+    """
+    Per-repository chunk index of the checked-out code for the agents'
+    `search_code` tool.
+
+    Files are split into chunks of about `chunk_lines` lines, stored by git blob
+    hash in `<index_dir>/<key>.sqlite3` and ranked with BM25 (SQLite FTS5), so
+    nothing needs the network. The file list of the last indexed commit is kept
+    too: the next job diffs that commit against its own and only chunks file
+    versions the index has not seen. Because chunks are keyed by content, jobs
+    testing different commits of one repository share the index without
+    seeing each other's files.
+
+    With `embedding_model` (a local sentence-transformers model) and chromadb
+    installed, chunks are also embedded into a chromadb collection and both
+    rankings are merged (reciprocal rank fusion).
+    """
+    def __init__(self, index_dir, chunk_lines=60, max_file_bytes=512 * 1024, embedding_model=""):
+        self.index_dir = index_dir
+        self.chunk_lines = chunk_lines
+        self.max_file_bytes = max_file_bytes
+        os.makedirs(index_dir, exist_ok=True)
+        self._chroma = None
+        self._embed = None
+        if embedding_model:
+            if chromadb is None:
+                logger.warning("Code index: chromadb is not installed, using BM25 only")
+            else:
+                try:
+                    from chromadb.utils import embedding_functions
+                    self._embed = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=embedding_model)
+                    self._chroma = chromadb.PersistentClient(
+                        path=os.path.join(index_dir, "chroma"),
+                        settings=chromadb.Settings(anonymized_telemetry=False),
+                    )
+                except Exception as e:
+                    logger.warning(f"Code index: Embedding model {embedding_model} unavailable, using BM25 only: {e}")
+                    self._chroma = None
+
+    @property
+    def mode(self):
+        return "BM25 + embeddings" if self._chroma else "BM25"
+
+    def _key(self, repo_url):
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", repo_url.rstrip('/').split('/')[-1] or "repo")
+        return f"{name}-{hashlib.sha256(repo_url.encode()).hexdigest()[:12]}"
+
+    def _connect(self, key):
+        conn = sqlite3.connect(os.path.join(self.index_dir, f"{key}.sqlite3"), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, blob TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " blob TEXT PRIMARY KEY, chunks INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            " terms, blob UNINDEXED, start UNINDEXED, end UNINDEXED, tokenize=\"unicode61 tokenchars '_'\")"
+        )
+        return conn
+
+    def _collection(self, key):
+        if not self._chroma:
+            return None
+        return self._chroma.get_or_create_collection(
+            name=f"code-{key.rsplit('-', 1)[-1]}", embedding_function=self._embed, metadata={"hnsw:space": "cosine"},
+        )
+
+    # --- Listing the checkout ---
+
+    def _list_files(self, repo_path, conn, stats):
+        """
+        path -> blob of the checkout. Diffs from the last indexed commit when it
+        is present in the clone, otherwise lists the whole tree.
+        """
+        try:
+            repo = Repo(repo_path)
+            head = repo.head.commit.hexsha
+        except (InvalidGitRepositoryError, NoSuchPathError, ValueError):
+            stats["source"] = "not a git checkout, files hashed"
+            return None, self._walk(repo_path)
+
+        row = conn.execute("SELECT value FROM meta WHERE key = 'sha'").fetchone()
+        indexed = row[0] if row else None
+        if indexed:
+            try:
+                repo.git.cat_file('-e', f"{indexed}^{{commit}}")
+                diff = repo.git.diff('--name-status', '--no-renames', '-z', indexed, head) if indexed != head else ""
+            except GitCommandError:
+                diff = None
+            if diff is not None:
+                files = dict(conn.execute("SELECT path, blob FROM files").fetchall())
+                fields = diff.split('\0')
+                changed = []
+                for status, path in zip(fields[0::2], fields[1::2]):
+                    files.pop(path, None)
+                    if status != "D" and indexable(path):
+                        changed.append(path)
+                for i in range(0, len(changed), 500):
+                    for line in repo.git.ls_tree('-z', head, '--', *changed[i:i + 500]).split('\0'):
+                        meta, _, path = line.partition('\t')
+                        if path:
+                            files[path] = meta.split()[2]
+                stats["source"] = f"{len(fields) // 2} files changed since {indexed[:7]}"
+                return head, files
+
+        files = {}
+        for line in repo.git.ls_files('-s', '-z').split('\0'):
+            meta, _, path = line.partition('\t')
+            if path and indexable(path):
+                files[path] = meta.split()[1]
+        stats["source"] = "full listing" if not indexed else f"full listing ({indexed[:7]} not in the clone)"
+        return head, files
+
+    def _walk(self, repo_path):
+        files = {}
+        for root, dirs, names in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if d not in PRUNED_DIRS]
+            for name in names:
+                path = os.path.relpath(os.path.join(root, name), repo_path)
+                if not indexable(path):
+                    continue
+                try:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        files[path] = blob_hash(f.read(self.max_file_bytes + 1))
+                except OSError:
+                    continue
+        return files
+
+    # --- Chunking ---
+
+    def _read(self, repo_path, path):
+        """Text of a checked-out file, or None for missing (sparse), large or binary files."""
+        full_path = os.path.join(repo_path, path)
+        try:
+            if os.path.getsize(full_path) > self.max_file_bytes:
+                return None
+            with open(full_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None
+        return data.decode('utf-8', errors='replace')
+
+    def _add_blob(self, conn, collection, blob, text):
+        """Chunks one file version. Returns the number of chunks, 0 when another job already added it."""
+        lines = text.splitlines()
+        ranges = chunk_lines(lines, self.chunk_lines)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO blobs (blob, chunks, last_used) VALUES (?, ?, ?)",
+                (blob, len(ranges), time.time()),
+            ).rowcount
+            if added:
+                conn.executemany(
+                    "INSERT INTO chunks (terms, blob, start, end) VALUES (?, ?, ?, ?)",
+                    [(" ".join(terms("\n".join(lines[s - 1:e]))), blob, s, e) for s, e in ranges],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if added and collection is not None and ranges:
+            collection.add(
+                ids=[f"{blob}:{s}" for s, _ in ranges],
+                documents=["\n".join(lines[s - 1:e])[:4000] for s, e in ranges],
+                metadatas=[{"blob": blob, "start": s, "end": e} for s, e in ranges],
+            )
+        return len(ranges) if added else 0
+
+    def _prune(self, conn, collection):
+        stale = [row[0] for row in conn.execute(
+            "SELECT blob FROM blobs WHERE last_used < ?", (time.time() - STALE_BLOB_SECONDS,)
+        ).fetchall()]
+        for i in range(0, len(stale), 500):
+            batch = stale[i:i + 500]
+            marks = ','.join('?' * len(batch))
+            conn.execute(f"DELETE FROM chunks WHERE blob IN ({marks})", batch)
+            conn.execute(f"DELETE FROM blobs WHERE blob IN ({marks})", batch)
+            if collection is not None:
+                collection.delete(where={"blob": {"$in": batch}})
+        return len(stale)
+
+    # --- Per job ---
+
+    def open(self, repo_path, repo_url):
+        """Brings the index up to date with the checkout at `repo_path` and returns its CodeSearch."""
+        start = time.monotonic()
+        key = self._key(repo_url)
+        stats = {"files": 0, "chunked": 0, "chunks": 0, "source": "", "searches": 0, "seconds": 0.0}
+        with open(os.path.join(self.index_dir, f"{key}.lock"), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            conn = self._connect(key)
+            try:
+                collection = self._collection(key)
+                head, listed = self._list_files(repo_path, conn, stats)
+                files = dict(listed)  # without files this checkout does not have (sparse, large, binary)
+                known = set()
+                blobs = list(set(files.values()))
+                for i in range(0, len(blobs), 500):
+                    batch = blobs[i:i + 500]
+                    known.update(row[0] for row in conn.execute(
+                        f"SELECT blob FROM blobs WHERE blob IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall())
+                    conn.execute(
+                        f"UPDATE blobs SET last_used = ? WHERE blob IN ({','.join('?' * len(batch))})",
+                        [time.time()] + batch,
+                    )
+                for path, blob in list(files.items()):
+                    if blob in known:
+                        continue
+                    text = self._read(repo_path, path)
+                    if text is None:
+                        del files[path]
+                        continue
+                    stats["chunks"] += self._add_blob(conn, collection, blob, text)
+                    stats["chunked"] += 1
+                    known.add(blob)
+                if head:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("DELETE FROM files")
+                    conn.executemany("INSERT INTO files (path, blob) VALUES (?, ?)", listed.items())
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sha', ?)", (head,))
+                    conn.execute("COMMIT")
+                pruned = self._prune(conn, collection)
+            finally:
+                conn.close()
+        stats["files"] = len(files)
+        stats["seconds"] = round(time.monotonic() - start, 1)
+        logger.info(f"Code index: {len(files)} files ({stats['source']}), {stats['chunked']} chunked into "
+                    f"{stats['chunks']} chunks, {pruned} stale versions dropped, {stats['seconds']}s ({self.mode})")
+        return CodeSearch(self, key, repo_path, files, stats)
+
+class CodeSearch:
+    """Searches the CodeIndex restricted to one job's files; snippets are read from the job's checkout."""
+    def __init__(self, index, key, repo_path, files, stats):
+        self.index = index
+        self.key = key
+        self.repo_path = repo_path
+        self.files = files
+        self.stats = stats
+        self._paths = {}
+        for path, blob in sorted(files.items()):
+            self._paths.setdefault(blob, path)
+
+    def refresh(self, path):
+        """Re-indexes a file the agents rewrote, so later searches see the new content."""
+        if not indexable(path):
+            return
+        text = self.index._read(self.repo_path, path)
+        if text is None:
+            return
+        blob = blob_hash(text.encode('utf-8'))
+        old = self.files.get(path)
+        if old == blob:
+            return
+        conn = self.index._connect(self.key)
+        try:
+            self.index._add_blob(conn, self.index._collection(self.key), blob, text)
+        finally:
+            conn.close()
+        self.files[path] = blob
+        if old and self._paths.get(old) == path:
+            del self._paths[old]
+        self._paths.setdefault(blob, path)
+
+    def _bm25(self, query_terms):
+        conn = self.index._connect(self.key)
+        try:
+            match = " OR ".join(f'"{t}"' for t in query_terms)
+            rows = conn.execute(
+                "SELECT blob, start, end, bm25(chunks) FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                (match, CANDIDATES),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [(blob, start, end) for blob, start, end, _ in rows if blob in self._paths]
+
+    def _embedded(self, query):
+        collection = self.index._collection(self.key)
+        if collection is None or not collection.count():
+            return []
+        result = collection.query(query_texts=[query], n_results=min(CANDIDATES, collection.count()),
+                                  include=["metadatas"])
+        return [(m["blob"], m["start"], m["end"]) for m in result["metadatas"][0] if m["blob"] in self._paths]
+
+    def search(self, query, top_k=5):
+        """Best matching chunks for `query` as Hits, at most one per overlapping range of a file."""
+        query_terms = list(dict.fromkeys(terms(query)))
+        if not query_terms:
+            return []
+        self.stats["searches"] += 1
+        scores = {}
+        for ranking in (self._bm25(query_terms), self._embedded(query)):
+            for rank, chunk in enumerate(ranking):
+                scores[chunk] = scores.get(chunk, 0.0) + 1.0 / (60 + rank)
+        hits = []
+        for (blob, start, end), score in scores.items():
+            path = self._paths[blob]
+            path_terms = set(terms(path))
+            score *= 1 + 0.25 * sum(1 for t in query_terms if t in path_terms)
+            hits.append(Hit(path, start, end, score))
+        hits.sort(key=lambda h: -h.score)
+        chosen = []
+        for hit in hits:
+            if any(h.path == hit.path and h.start <= hit.end and hit.start <= h.end for h in chosen):
+                continue
+            chosen.append(hit)
+            if len(chosen) >= top_k:
+                break
+        return chosen
+
+    def format(self, query, hits):
+        """Tool output: each hit's path and line range with the numbered lines from the checkout."""
+        if not hits:
+            return f"No code found for '{query}'. Try other identifiers, or list files with run_shell_command."
+        sections = [f"Top {len(hits)} matches for '{query}' ({self.index.mode}):"]
+        for i, hit in enumerate(hits, 1):
+            try:
+                with open(os.path.join(self.repo_path, hit.path), errors='replace') as f:
+                    lines = f.read().splitlines()[hit.start - 1:hit.end]
+            except OSError:
+                lines = ["(file no longer exists)"]
+            body = "\n".join(f"{hit.start + n:>5}  {line[:MAX_LINE_CHARS]}" for n, line in enumerate(lines))
+            sections.append(f"[{i}] {hit.path}:{hit.start}-{hit.end}\n{body}")
+        return "\n\n".join(sections)
@@ -0,0 +1,181 @@
+import re
+import shlex
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+
+from app.config import Config
+from app.models import db, CommandStat
+
+logger = logging.getLogger('[Orchestrator]')
+
+# Default timeouts (seconds) per phase before a repository has any history,
+# by image family. Heavier toolchains get more room.
+PROFILES = {
+    "default": {"install": 300, "build": 600, "test": 600, "other": 60},
+    "maven": {"install": 900, "build": 1200, "test": 1200, "other": 60},
+    "gradle": {"install": 900, "build": 1200, "test": 1200, "other": 60},
+    "node": {"install": 600, "build": 600, "test": 600, "other": 60},
+    "python": {"install": 600, "build": 300, "test": 900, "other": 60},
+    "golang": {"install": 300, "build": 600, "test": 900, "other": 60},
+    "rust": {"install": 600, "build": 1800, "test": 1200, "other": 60},
+}
+
+PHASES = [
+    ("install", re.compile(r"\b(pip3?|npm|yarn|pnpm|poetry|pipenv|bundle|apt-get|apk)\b.*\b(install|ci|add|sync)\b"
+                           r"|\bgo mod download\b|\bdependency:")),
+    ("test", re.compile(r"\b(test|tests|pytest|jest|mocha|vitest|tox|nox|verify|unittest)\b")),
+    ("build", re.compile(r"\b(build|compile|package|install|mvn|gradlew?|cargo|make|tsc|javac|go build)\b")),
+]
+
+def strip_timeout(command):
+    """Removes a leading `timeout [opts] DURATION` wrapper added by an agent."""
+    return re.sub(r"^\s*timeout\s+(-{1,2}[\w-]+(=\S+)?\s+)*\S+\s+", "", command)
+
+def command_key(command):
+    """
+    Groups similar commands: for each `&&`/`;`/`|` segment the program and
+    its first sub-command word, without options or paths
+    (`pip install -r requirements.txt && python -m pytest -q` -> `pip install && python -m pytest`).
+    """
+    try:
+        lexer = shlex.shlex(strip_timeout(command), posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        tokens = strip_timeout(command).split()
+
+    segments, current, redirect = [], [], False
+    for token in tokens:
+        if token in ("&&", "||", ";", "|", "&", "(", ")"):
+            segments.append(current)
+            current = []
+        elif set(token) <= set("<>&|"):
+            redirect = True  # the next word is the redirection target
+        elif redirect or token.isdigit():
+            redirect = False
+        else:
+            current.append(token)
+    segments.append(current)
+
+    parts = []
+    for words in segments:
+        words = [w for w in words if "=" not in w or w.startswith("-")]  # drop VAR=value prefixes
+        kept = []
+        for word in words:
+            if word in ("-c", "-e", "--eval"):
+                break  # inline script follows
+            if word.startswith("-") and word != "-m":
+                continue
+            if "/" in word or "." in word:
+                break
+            kept.append(word)
+            if len(kept) == (3 if "-m" in kept else 2):
+                break
+        if kept and kept[0] != "cd":
+            parts.append(" ".join(kept))
+    return " && ".join(parts)[:200] or command.strip()[:200]
+
+def command_phase(command):
+    for phase, pattern in PHASES:
+        if pattern.search(command):
+            return phase
+    return "other"
+
+def profile_for_image(image):
+    name = (image or "").split('/')[-1]
+    for family, profile in PROFILES.items():
+        if family != "default" and name.startswith(family):
+            return profile
+    return PROFILES["default"]
+
+class TimeoutAdvisor:
+    """
+    Chooses the timeout for a sandbox command from how long similar commands
+    took on the same repository (CommandStat rows), falling back to the image's
+    profile. Durations are recorded after each command. Stats are read once per
+    job and written with short transactions of their own, on the engine of the
+    app context it was created in (commands may run on helper threads).
+    """
+    def __init__(self, repo_url):
+        self.repo_url = repo_url
+        self._stats = None
+        self._lock = threading.RLock()
+        try:
+            self.engine = db.engine
+        except RuntimeError:
+            self.engine = None  # no app context: profiles only, nothing recorded
+
+    def _load(self):
+        with self._lock:
+            return self._load_locked()
+
+    def _load_locked(self):
+        if self._stats is None:
+            self._stats = {}
+            if self.engine is None:
+                return self._stats
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        db.select(CommandStat.__table__).where(CommandStat.repo_url == self.repo_url)
+                    ).mappings().all()
+                self._stats = {row["command_key"]: dict(row) for row in rows}
+            except Exception as e:
+                logger.warning(f"Timeouts: Could not load command history: {e}")
+        return self._stats
+
+    def timeout_for(self, command, image=None):
+        """Returns (seconds, reason)."""
+        key = command_key(command)
+        stat = self._load().get(key)
+        if stat and stat["runs"]:
+            seconds = max(stat["max_seconds"] * 2, stat["avg_seconds"] * 3)
+            reason = f"history of '{key}': {stat['runs']} runs, avg {stat['avg_seconds']:.0f}s, max {stat['max_seconds']:.0f}s"
+            if stat["last_timed_out"]:
+                reason += ", timed out last time"
+        else:
+            phase = command_phase(command)
+            seconds = profile_for_image(image)[phase]
+            reason = f"{phase} profile"
+        seconds = int(min(max(seconds, Config.SANDBOX_TIMEOUT_MIN), Config.SANDBOX_TIMEOUT_MAX))
+        return seconds, reason
+
+    def record(self, command, seconds, timed_out=False):
+        key = command_key(command)
+        with self._lock:
+            stats = self._load()
+            stat = stats.get(key) or {"runs": 0, "avg_seconds": 0.0, "max_seconds": 0.0}
+            runs = stat["runs"] + 1
+            values = {
+                "runs": runs,
+                # Moving average over roughly the last 20 runs
+                "avg_seconds": stat["avg_seconds"] + (seconds - stat["avg_seconds"]) / min(runs, 20),
+                # Recent maximum: decays 10% per run so one slow outlier does not stick forever
+                "max_seconds": max(seconds, stat["max_seconds"] * 0.9),
+                "last_timed_out": timed_out,
+                "updated_at": datetime.utcnow(),
+            }
+            stats[key] = dict(stat, command_key=key, **values)
+        if self.engine is None:
+            return
+
+        table = CommandStat.__table__
+        where = (table.c.repo_url == self.repo_url) & (table.c.command_key == key)
+        try:
+            with self.engine.begin() as conn:
+                if conn.execute(table.update().where(where).values(**values)).rowcount == 0:
+                    conn.execute(table.insert().values(repo_url=self.repo_url, command_key=key, **values))
+        except IntegrityError:
+            # Another job inserted the same key concurrently
+            self._update(where, values, key)
+        except Exception as e:
+            logger.warning(f"Timeouts: Could not record duration of '{key}': {e}")
+
+    def _update(self, where, values, key):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(CommandStat.__table__.update().where(where).values(**values))
+        except Exception as e:
+            logger.warning(f"Timeouts: Could not record duration of '{key}': {e}")
@@ -0,0 +1,229 @@
+import os
+import re
+import copy
+import shutil
+import hashlib
+import logging
+import threading
+from security.output_capture import ERROR_LINE
+
+logger = logging.getLogger('[Orchestrator]')
+
+SUMMARY_REF = re.compile(r"full output: (tool-output-\d+|not kept)\]")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def count_tokens(text):
+    """
+    Token count of `text` with tiktoken's cl100k_base encoding.
+    Falls back to ~4 characters per token when the encoding cannot be
+    loaded (tiktoken downloads it on first use, which fails offline).
+    """
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"Context: tiktoken unavailable ({e}), estimating tokens from length.")
+                    _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def message_tokens(message):
+    """Tokens of one chat message: its content, tool calls and unrolled tool responses."""
+    total = 4  # role/name framing
+    content = message.get("content")
+    # A 'tool' message's content just repeats its tool_responses and is not sent
+    if isinstance(content, str) and not (message.get("role") == "tool" and message.get("tool_responses")):
+        total += count_tokens(content)
+    for call in message.get("tool_calls") or []:
+        function = call.get("function", {})
+        total += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", ""))
+    for response in message.get("tool_responses") or []:
+        total += 4 + count_tokens(response.get("content") or "")
+    return total
+
+def summarize_output(text, ref, head=10, tail=20, max_errors=20):
+    """
+    Extractive summary of a long tool output: the first `head` lines, up to
+    `max_errors` error-looking lines from the middle and the last `tail`
+    lines, with a pointer to the full output in the side store.
+    """
+    lines = text.splitlines()
+    if len(lines) <= head + tail:
+        # Few but very long lines: cut by characters instead
+        return f"{text[:2000]}\n... [output truncated, full output: {ref}] ...\n{text[-2000:]}"
+    middle = lines[head:-tail]
+    errors = [line for line in middle if ERROR_LINE.search(line)][:max_errors]
+    parts = lines[:head]
+    parts.append(f"... [{len(middle)} lines omitted, full output: {ref}] ...")
+    if errors:
+        parts.append("[error lines from the omitted part]")
+        parts.extend(errors)
+        parts.append("[...]")
+    parts.extend(lines[-tail:])
+    return "\n".join(parts)
+
+class ToolOutputStore:
+    """
+    Side store for raw tool outputs that were compacted out of the chat
+    context. Outputs are de-duplicated by content and written to
+    `<directory>/<ref>.log` so the report and the API can point to them.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        """Stores `text` (once) and returns its reference name, e.g. 'tool-output-3'."""
+        digest = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+        with self._lock:
+            ref = self._refs.get(digest)
+            if ref:
+                return ref
+            ref = f"tool-output-{len(self._refs) + 1}"
+            self._refs[digest] = ref
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{ref}.log"), "w") as f:
+                f.write(text)
+        except OSError as e:
+            logger.warning(f"Context: Could not store {ref}: {e}")
+        return ref
+
+    def __len__(self):
+        return len(self._refs)
+
+def prune_artifacts(root, keep):
+    """Deletes all but the `keep` most recently modified job directories under `root`."""
+    try:
+        entries = [os.path.join(root, name) for name in os.listdir(root)]
+    except OSError:
+        return
+    entries = sorted((p for p in entries if os.path.isdir(p)), key=os.path.getmtime, reverse=True)
+    for path in entries[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+class ContextCompactor:
+    """
+    Keeps the chat history each agent sends to the LLM under a token budget.
+
+    Registered as a `process_all_messages_before_reply` hook, so it only
+    changes what is sent, never the stored history. The newest
+    `keep_recent` messages are left alone. When the history is over
+    `budget` tokens, older tool outputs are replaced, oldest first, by an
+    extractive summary; if that is not enough they are reduced to a stub,
+    and then long older messages are cut. Messages are never dropped, so
+    tool calls keep their responses. Raw outputs go to the bound
+    context's ToolOutputStore.
+    """
+    def __init__(self, budget, keep_recent=4, min_output_tokens=300):
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.min_output_tokens = min_output_tokens
+        self.context = None  # agents.team.JobContext of the job being run
+
+    def hook(self, agent_name):
+        """Returns the hook function to register on one agent."""
+        def compact(messages):
+            return self.apply(messages, agent_name)
+        return compact
+
+    def apply(self, messages, agent_name=None):
+        if not messages or self.budget <= 0:
+            return messages
+        before = sum(message_tokens(m) for m in messages)
+        if before <= self.budget:
+            compacted, after = messages, before
+        else:
+            compacted, after = self.compact(messages, before)
+
+        if agent_name and self.context is not None:
+            stats = self.context.context_stats
+            stats["rounds"] += 1
+            stats["tokens_sent"] += after
+            stats["tokens_saved"] += before - after
+            stats["peak_tokens"] = max(stats["peak_tokens"], after)
+            saved = f", {before - after} saved by compaction" if after < before else ""
+            logger.info(f"Context: {agent_name} round with {len(messages)} messages, {after} tokens{saved}")
+        return compacted
+
+    def compact(self, messages, total):
+        """Returns (messages, tokens) with older content reduced until under budget."""
+        messages = copy.deepcopy(messages)
+        older = range(max(0, len(messages) - self.keep_recent))
+
+        # Each pass is more aggressive: summarize tool outputs, stub them, cut long messages
+        for stage in ("summary", "stub", "cut"):
+            for index in older:
+                if total <= self.budget:
+                    return messages, total
+                if stage == "cut" and index == 0:
+                    continue  # the task message
+                before = message_tokens(messages[index])
+                self._reduce(messages[index], stage)
+                total -= before - message_tokens(messages[index])
+        return messages, total
+
+    def _reduce(self, message, stage):
+        responses = message.get("tool_responses") or []
+        if stage in ("summary", "stub"):
+            for response in responses:
+                response["content"] = self._reduce_output(response.get("content") or "", stage)
+            if responses and message.get("role") == "tool":
+                message["content"] = "\n\n".join(r.get("content") or "" for r in responses)
+            elif message.get("role") == "tool" and isinstance(message.get("content"), str):
+                message["content"] = self._reduce_output(message["content"], stage)
+        elif isinstance(message.get("content"), str) and count_tokens(message["content"]) > self.min_output_tokens:
+            content = message["content"]
+            message["content"] = content[:self.min_output_tokens * 4] + "\n... [message truncated to fit the context budget]"
+
+    def _reduce_output(self, text, stage):
+        if count_tokens(text) <= self.min_output_tokens or text.startswith("[tool output "):
+            return text
+        # A summary already points to its raw output
+        summarized = SUMMARY_REF.search(text)
+        if summarized:
+            if stage == "summary":
+                return text
+            return f"[tool output {summarized.group(1)} omitted to fit the context budget]"
+        store = self.context.tool_outputs if self.context is not None else None
+        ref = store.put(text) if store is not None else "not kept"
+        if self.context is not None:
+            self.context.context_stats["outputs_compacted"].add(ref)
+        if stage == "summary":
+            summary = summarize_output(text, ref)
+            if count_tokens(summary) < count_tokens(text):
+                return summary
+        return f"[tool output {ref} omitted to fit the context budget]"
+
+    def render(self, history, budget=None):
+        """
+        Plain-text transcript of a chat history ('name: content' per message),
+        compacted to `budget` tokens. Used for the forced report prompt.
+        """
+        saved_budget = self.budget
+        if budget is not None:
+            self.budget = budget
+        try:
+            messages = self.apply(history)
+        finally:
+            self.budget = saved_budget
+
+        lines = []
+        for msg in messages:
+            name = msg.get("name") or msg.get("role", "unknown")
+            content = msg.get("content") or ""
+            for call in msg.get("tool_calls") or []:
+                function = call.get("function", {})
+                content += f"\n[calls {function.get('name')}({function.get('arguments')})]"
+            lines.append(f"{name}: {content.strip()}")
+        return "\n\n".join(lines)
@@ -8,6 +8,7 @@ class DebuggerAgent(autogen.AssistantAgent):
         
         Steps:
         1. **Identify the Fault**: Explain clearly WHY the build or test failed.
+           Use `search_code(query)` (function names, error messages) to read the relevant code instead of printing whole files.
         2. **Notify**: State "FAULT DETECTED: [Reason]".
         3. **Rectify**: Propose a code fix.
         4. **Apply Fix**: CRITICAL: You MUST use the `write_file(file_path, content)` tool to save the corrected code. Do NOT just propose it.
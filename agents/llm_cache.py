@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from openai.types.chat import ChatCompletion
+
+logger = logging.getLogger(__name__)
+
+def normalize_key(raw_key, volatile=()):
+    """
+    Content address of an autogen completion request.
+
+    `raw_key` is autogen's JSON dump of the create() params. Only the model,
+    temperature, tools and the message list take part; whitespace is
+    normalized and job-specific strings (e.g. the sandbox checkout path)
+    are replaced so identical inputs hash the same across jobs.
+    Returns None for requests that must not be cached (temperature != 0).
+    """
+    try:
+        params = json.loads(raw_key)
+    except (TypeError, ValueError):
+        return None
+    if params.get("temperature", 1) != 0:
+        return None
+
+    def clean(text):
+        if not isinstance(text, str):
+            return text
+        for value in volatile:
+            if value:
+                text = text.replace(value, "<repo>")
+        text = "\n".join(line.rstrip() for line in text.strip().splitlines())
+        return re.sub(r"\n{3,}", "\n\n", text)
+
+    messages = []
+    for msg in params.get("messages", []):
+        msg = dict(msg)
+        msg["content"] = clean(msg.get("content"))
+        messages.append(msg)
+
+    material = {
+        "model": params.get("model"),
+        "temperature": params.get("temperature"),
+        "tools": params.get("tools"),
+        "messages": messages,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+def encode_value(value):
+    """
+    JSON form of a cached value. autogen caches openai ChatCompletion objects
+    (with the `cost` it sets on them); anything else must already be JSON-serialisable.
+    """
+    if isinstance(value, ChatCompletion):
+        return json.dumps({"chat_completion": value.model_dump(mode="json")})
+    return json.dumps({"value": value})
+
+def decode_value(text):
+    """Inverse of encode_value."""
+    payload = json.loads(text)
+    if "chat_completion" in payload:
+        return ChatCompletion.model_validate(payload["chat_completion"])
+    return payload["value"]
+
+class LLMResponseCache:
+    """
+    Persistent, size-bounded LRU store of LLM responses (SQLite on disk).
+    Entries are scoped by repository so one repository can be invalidated
+    without touching the others, and never served across repositories.
+    Values are stored as JSON, never pickled: the file is shared between
+    workers and loading it must not be able to run code.
+    """
+    VERSION = 1  # bump when stored values must not be reused
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+                # Older versions stored pickles: drop them instead of loading them
+                conn.execute("DROP TABLE IF EXISTS responses")
+                conn.execute("DROP TABLE IF EXISTS responses_size")
+                conn.execute(f"PRAGMA user_version = {self.VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, repo TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_used ON responses (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_repo ON responses (repo)")
+            # Running total of `size`, kept by triggers so every worker's writes count
+            conn.execute("CREATE TABLE IF NOT EXISTS responses_size (total INTEGER NOT NULL)")
+            if conn.execute("SELECT COUNT(*) FROM responses_size").fetchone()[0] == 0:
+                conn.execute("INSERT INTO responses_size SELECT COALESCE(SUM(size), 0) FROM responses")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses"
+                " BEGIN UPDATE responses_size SET total = total + new.size; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses"
+                " BEGIN UPDATE responses_size SET total = total + new.size - old.size; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses"
+                " BEGIN UPDATE responses_size SET total = total - old.size; END"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, repo, key):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (f"{repo}:{key}",)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), f"{repo}:{key}"))
+            self.hits += 1
+        try:
+            return decode_value(row[0])
+        except Exception:
+            return None
+
+    def set(self, repo, key, value):
+        try:
+            text = encode_value(value)
+        except Exception as e:
+            logger.warning(f"LLMCache: Response not cacheable: {e}")
+            return
+        with self._lock, self._connect() as conn:
+            # An upsert (not INSERT OR REPLACE) so the size triggers see the old row
+            conn.execute(
+                "INSERT INTO responses (key, repo, value, size, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,"
+                " last_used = excluded.last_used",
+                (f"{repo}:{key}", repo, text, len(text), time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT total FROM responses_size").fetchone()[0]
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 16").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def invalidate(self, repo):
+        """Drops every cached response of one repository. Returns the number removed."""
+        with self._lock, self._connect() as conn:
+            return conn.execute("DELETE FROM responses WHERE repo = ?", (repo,)).rowcount
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = conn.execute("SELECT total FROM responses_size").fetchone()[0]
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+class JobLLMCache:
+    """
+    Per-job view of an LLMResponseCache, passed to autogen as `cache=`.
+    Implements autogen's AbstractCache protocol and counts hits and misses for the job.
+    """
+    def __init__(self, store, repo, volatile=()):
+        self.store = store
+        self.repo = repo
+        self.volatile = [v for v in volatile if v]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        digest = normalize_key(key, self.volatile)
+        if digest is None:
+            return default
+        value = self.store.get(self.repo, digest)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        digest = normalize_key(key, self.volatile)
+        if digest is not None:
+            self.store.set(self.repo, digest, value)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
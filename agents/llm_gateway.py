@@ -0,0 +1,304 @@
+import json
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict, Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import openai
+from agents.context_compactor import count_tokens
+from app.config import Config
+
+logger = logging.getLogger('[Orchestrator]')
+
+# Completion tokens reserved per request when it does not set max_tokens;
+# corrected from the response's usage once it arrives.
+COMPLETION_ESTIMATE = 1000
+SAMPLES = 1000  # latencies kept per endpoint for the percentiles
+
+_job = ContextVar("llm_gateway_job", default=None)
+
+def new_usage():
+    # models: per model requests, tokens, seconds (total and slowest) and failures (timeouts, errors)
+    return {"requests": 0, "retries": 0, "waited": 0.0, "tokens": 0, "models": {}}
+
+def percentiles(samples):
+    values = sorted(samples)
+    if not values:
+        return None
+    return {f"p{p}": round(values[min(len(values) - 1, len(values) * p // 100)] * 1000) for p in (50, 95, 99)}
+
+def request_json(body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def estimate_tokens(data):
+    """Tokens a chat completion request (its parsed body) will use: its messages plus the completion it may produce."""
+    text = json.dumps(data.get("messages") or data.get("input") or "")
+    if data.get("tools"):
+        text += json.dumps(data["tools"])
+    return count_tokens(text) + int(data.get("max_tokens") or data.get("max_completion_tokens") or COMPLETION_ESTIMATE)
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, bursts up to one minute's worth. 0 means unlimited."""
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(float(self.per_minute), self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available."""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.per_minute)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.per_minute
+
+    def take(self, amount):
+        # May go negative when usage exceeded the estimate; later requests wait it off
+        if self.per_minute > 0:
+            self.level -= amount
+
+class Endpoint:
+    """
+    Admission control for one LLM endpoint. Requests wait in one queue per job
+    and are admitted round-robin across jobs, once the request and token
+    buckets allow it and fewer than `max_concurrent` are in flight. A 429
+    pauses admission for the whole endpoint.
+    """
+    def __init__(self, base_url, requests_per_minute, tokens_per_minute, max_concurrent):
+        self.base_url = base_url
+        self.max_concurrent = max_concurrent
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waiting = OrderedDict()  # job -> deque of tickets, in round-robin order
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.counts = Counter()
+        self.latencies = deque(maxlen=SAMPLES)
+        self.waits = deque(maxlen=SAMPLES)
+        self._cond = threading.Condition()
+
+    def _delay(self, job, ticket, tokens, now):
+        """Seconds `ticket` still has to wait (0: admit now), or None while it is not its turn."""
+        if next(iter(self.waiting)) != job or self.waiting[job][0] is not ticket:
+            return None
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            return None
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now), 0.0)
+
+    def acquire(self, job, tokens):
+        """Blocks until the request may be sent; returns the seconds it waited."""
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self.waiting.setdefault(job, deque()).append(ticket)
+            try:
+                while True:
+                    delay = self._delay(job, ticket, tokens, time.monotonic())
+                    if delay == 0:
+                        break
+                    # Woken on every release; the timeout covers refills and pauses
+                    self._cond.wait(timeout=delay if delay is not None else 1.0)
+            finally:
+                queue = self.waiting[job]
+                queue.remove(ticket)
+                if queue:
+                    self.waiting.move_to_end(job)
+                else:
+                    del self.waiting[job]
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self._cond.notify_all()
+        waited = time.monotonic() - start
+        self.waits.append(waited)
+        return waited
+
+    def release(self, estimate, used, latency, status):
+        with self._cond:
+            self.in_flight -= 1
+            if used is not None:
+                self.tokens.take(used - estimate)
+            self.latencies.append(latency)
+            self.counts["requests"] += 1
+            if status == 429:
+                self.counts["throttled"] += 1
+            elif status >= 500 or status == 0:
+                self.counts["server_errors"] += 1
+            self._cond.notify_all()
+
+    def retried(self):
+        with self._cond:
+            self.counts["retries"] += 1
+
+    def pause(self, seconds):
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": sum(len(q) for q in self.waiting.values()),
+                "jobs_waiting": len(self.waiting),
+                "in_flight": self.in_flight,
+                "requests": self.counts["requests"],
+                "retries": self.counts["retries"],
+                "throttled": self.counts["throttled"],
+                "server_errors": self.counts["server_errors"],
+                "latency_ms": percentiles(self.latencies),
+                "wait_ms": percentiles(self.waits),
+            }
+
+class PooledHTTPClient(openai.DefaultHttpxClient):
+    """
+    HTTP client shared by every OpenAI client of one endpoint (one connection
+    pool). Each request goes through the gateway. autogen deep-copies
+    llm_config per agent; the copy is this same client.
+    """
+    def __init__(self, gateway, endpoint, **kwargs):
+        super().__init__(**kwargs)
+        self.gateway = gateway
+        self.endpoint = endpoint
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def send(self, request, **kwargs):
+        return self.gateway.send(self.endpoint, lambda: super(PooledHTTPClient, self).send(request, **kwargs),
+                                 request, stream=kwargs.get("stream", False))
+
+class LLMGateway:
+    """
+    Process-wide gateway for LLM requests, shared by all jobs. Only the process
+    running the job workers sends requests (one per host, see JobQueue), so the
+    limits apply per host.
+
+    Put `http_client(base_url)` into a config_list entry (with max_retries 0, so
+    the OpenAI client does not retry on its own): every agent of every job then
+    shares that endpoint's connection pool and admission queue. Requests and
+    tokens per minute are limited by token buckets (tokens are estimated from
+    the request and corrected from the response's usage), jobs are served
+    round-robin, and 429/5xx responses are retried with jittered exponential
+    backoff (honoring Retry-After). Requests made inside `job()` are counted
+    for that job.
+    """
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrent=0,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._endpoints = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def http_client(self, base_url):
+        """The pooled HTTP client for `base_url` (created on first use)."""
+        with self._lock:
+            if base_url not in self._clients:
+                endpoint = Endpoint(base_url, self.requests_per_minute, self.tokens_per_minute, self.max_concurrent)
+                self._endpoints[base_url] = endpoint
+                self._clients[base_url] = PooledHTTPClient(self, endpoint)
+            return self._clients[base_url]
+
+    @contextmanager
+    def job(self, job_id):
+        """Attributes the LLM requests made in this block (on this thread) to `job_id`; yields its usage dict."""
+        usage = new_usage()
+        token = _job.set((job_id, usage))
+        try:
+            yield usage
+        finally:
+            _job.reset(token)
+
+    def _backoff(self, attempt, response):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    @staticmethod
+    def _used_tokens(response, stream):
+        if stream or "json" not in response.headers.get("content-type", ""):
+            return None
+        try:
+            return int(response.json()["usage"]["total_tokens"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def send(self, endpoint, send, request, stream=False):
+        job_id, usage = _job.get() or (None, new_usage())
+        data = request_json(request.content)
+        estimate = estimate_tokens(data)
+        model = usage["models"].setdefault(str(data.get("model", "unknown")), {
+            "requests": 0, "tokens": 0, "seconds": 0.0, "max_seconds": 0.0, "failures": 0,
+        })
+        attempt = 0
+        while True:
+            usage["waited"] += endpoint.acquire(job_id, estimate)
+            usage["requests"] += 1
+            model["requests"] += 1
+            start = time.monotonic()
+            response = None
+            try:
+                response = send()
+            except Exception as e:
+                # e.g. a timeout: autogen moves on to the next model of the config_list
+                logger.warning(f"LLM gateway: {data.get('model')} request failed after "
+                               f"{time.monotonic() - start:.1f}s: {e.__class__.__name__}")
+                raise
+            finally:
+                seconds = time.monotonic() - start
+                status = response.status_code if response is not None else 0
+                used = self._used_tokens(response, stream) if status == 200 else None
+                if used:
+                    usage["tokens"] += used
+                    model["tokens"] += used
+                model["seconds"] += seconds
+                model["max_seconds"] = max(model["max_seconds"], seconds)
+                if status != 200:
+                    model["failures"] += 1
+                endpoint.release(estimate, used, seconds, status)
+            if (status == 429 or status >= 500) and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                if status == 429:
+                    endpoint.pause(delay)
+                logger.warning(f"LLM gateway: {endpoint.base_url} returned {status}, "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                response.close()
+                usage["retries"] += 1
+                endpoint.retried()
+                time.sleep(delay)
+                attempt += 1
+                continue
+            return response
+
+    def stats(self):
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {base_url: endpoint.stats() for base_url, endpoint in endpoints.items()}
+
+llm_gateway = LLMGateway(
+    requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=Config.LLM_TOKENS_PER_MINUTE,
+    max_concurrent=Config.LLM_MAX_CONCURRENT,
+    max_retries=Config.LLM_MAX_RETRIES,
+    backoff_base=Config.LLM_BACKOFF_BASE,
+    backoff_max=Config.LLM_BACKOFF_MAX,
+)
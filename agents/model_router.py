@@ -0,0 +1,74 @@
+from agents.llm_gateway import llm_gateway
+
+# Model tier used by each part of the agent team
+ROUTES = {
+    "scanner": "fast",
+    "reporter": "fast",
+    "speaker_selection": "fast",
+    "builder": "default",
+    "tester": "default",
+    "debugger": "default",
+    "debugger_escalated": "strong",
+}
+
+class ModelRouter:
+    """
+    Builds the llm_config of each part of the agent team (see ROUTES) from
+    three model tiers: `fast` for routine turns (stack scanning, speaker
+    selection, report formatting), `default` for building and testing, and
+    `strong` for a Debugger whose fixes keep failing.
+
+    Each tier's config_list is its model followed by the fallbacks, in order:
+    autogen moves on to the next entry when a request times out (`timeout`
+    seconds) or fails. The fast tier may use its own OpenAI-compatible endpoint
+    (e.g. a local model server); its fallbacks use the main one. All entries go
+    through the shared LLM gateway.
+    """
+    def __init__(self, api_key, base_url, model, fast_model="", strong_model="", fallbacks=(), timeout=None,
+                 fast_base_url="", fast_api_key=""):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.fast_base_url = fast_base_url or base_url
+        self.fast_api_key = fast_api_key or api_key
+        chain = [model, *fallbacks]
+        self.tiers = {
+            "fast": list(dict.fromkeys([fast_model or model, *chain])),
+            "default": list(dict.fromkeys(chain)),
+            "strong": list(dict.fromkeys([strong_model or model, *chain])),
+        }
+
+    def _entry(self, model, base_url, api_key):
+        entry = {
+            'model': model,
+            'api_key': api_key,
+            'base_url': base_url,
+            'http_client': llm_gateway.http_client(base_url),
+            'max_retries': 0,
+        }
+        if self.timeout:
+            entry['timeout'] = self.timeout
+        return entry
+
+    def config_list(self, tier):
+        models = self.tiers[tier]
+        entries = [self._entry(model, self.base_url, self.api_key) for model in models]
+        if tier == "fast":
+            entries[0] = self._entry(models[0], self.fast_base_url, self.fast_api_key)
+        return entries
+
+    def llm_config(self, route):
+        return {
+            "config_list": self.config_list(ROUTES[route]),
+            "temperature": 0,
+            # Disable autogen's implicit disk cache; responses go through the job's LLM cache instead
+            "cache_seed": None,
+        }
+
+    def llm_configs(self):
+        """llm_config per route, as AgentTeam takes them."""
+        return {route: self.llm_config(route) for route in ROUTES}
+
+    def describe(self):
+        """Model chain per tier, e.g. for the result cache's config version."""
+        return [f"{tier}:{'>'.join(models)}" for tier, models in self.tiers.items()]
@@ -1,282 +1,453 @@
 
 import os
+import time
 from dotenv import load_dotenv
 load_dotenv()
-import autogen
-from security.sandbox import Sandbox
-from agents.scanner_agent import ScannerAgent
-from agents.build_agent import BuildAgent
-from agents.tester_agent import TesterAgent
-from agents.report_agent import ReportAgent
-from agents.debugger_agent import DebuggerAgent
+from security.sandbox import Sandbox, resource_args
+from security.container_pool import ContainerPool
+from security.dependency_cache import DependencyCache
+from security.image_manager import ImageManager
+from agents.team import AgentTeamPool, JobContext
+from agents.stack_detector import detect_stack, SCANNER_LLM_CALLS
+from agents.llm_cache import LLMResponseCache, JobLLMCache
+from agents.context_compactor import ToolOutputStore, prune_artifacts
+from agents.command_timeouts import TimeoutAdvisor
+from agents.test_selection import TestSelector
+from agents.code_index import CodeIndex
+from agents.llm_gateway import llm_gateway
+from agents.model_router import ModelRouter
 
 from app.config import Config
+from app.models import normalize_repo_url
 
 class CIOrchestrator:
     def __init__(self):
         self.api_key = Config.GEMINI_API_KEY
-        # Use OpenAI-compatible endpoint - better compatibility, fewer safety issues
-        self.config_list = [
-            {
-                'model': 'gemini-2.5-flash',
-                'api_key': self.api_key,
-                'base_url': 'https://generativelanguage.googleapis.com/v1beta/openai/',
-            }
-        ]
-        self.llm_config = {
-            "config_list": self.config_list,
-            "temperature": 0,
-        }
-        self.sandbox = Sandbox(use_docker=False)
+        # Use OpenAI-compatible endpoint - better compatibility, fewer safety issues.
+        # Each agent gets the model tier of its task (agents.model_router.ROUTES);
+        # requests go through the shared LLM gateway, which also does the retrying.
+        self.router = ModelRouter(
+            self.api_key, Config.LLM_BASE_URL, Config.LLM_MODEL,
+            fast_model=Config.LLM_MODEL_FAST, strong_model=Config.LLM_MODEL_STRONG,
+            fallbacks=Config.LLM_MODEL_FALLBACKS, timeout=Config.LLM_REQUEST_TIMEOUT,
+            fast_base_url=Config.LLM_FAST_BASE_URL, fast_api_key=Config.LLM_FAST_API_KEY,
+        )
+        self.config_list = self.router.config_list("default")
+        self.llm_configs = self.router.llm_configs()
+        self.llm_cache = LLMResponseCache(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_BYTES) if Config.LLM_CACHE_ENABLED else None
+        self.use_docker = Config.SANDBOX_USE_DOCKER
+        self.sandbox_limits = resource_args(Config.SANDBOX_CPUS, Config.SANDBOX_MEMORY, Config.SANDBOX_PIDS_LIMIT)
+        self.local_limits = {"cpus": Config.SANDBOX_CPUS, "memory": Config.SANDBOX_MEMORY} \
+            if Config.SANDBOX_LOCAL_LIMITS else None
+        self.image_manager = None
+        if self.use_docker:
+            self.image_manager = ImageManager()
+            self.image_manager.start(Config.SANDBOX_PREPULL_IMAGES)
+        self.dep_cache = None
+        if self.use_docker and Config.DEP_CACHE_ENABLED:
+            self.dep_cache = DependencyCache(Config.DEP_CACHE_LOCK_DIR, Config.DEP_CACHE_MAX_BYTES,
+                                             helper_image=Config.DEP_CACHE_HELPER_IMAGE)
+            self.dep_cache.start(Config.DEP_CACHE_EVICT_INTERVAL)
+        self.container_pool = None
+        if self.use_docker and Config.SANDBOX_WARM_POOL_SIZE > 0:
+            from app.utils import SANDBOX_ROOT
+            self.container_pool = ContainerPool(SANDBOX_ROOT, Config.SANDBOX_WARM_IMAGES,
+                                                size=Config.SANDBOX_WARM_POOL_SIZE, dep_cache=self.dep_cache,
+                                                image_manager=self.image_manager, limits=self.sandbox_limits)
+            self.container_pool.start()
+        self.test_selector = None
+        if Config.TEST_SELECTION_ENABLED:
+            self.test_selector = TestSelector(Config.TEST_INDEX_DIR, full_every=Config.TEST_SELECTION_FULL_EVERY,
+                                              shards=Config.TEST_SHARDS)
+        self.code_index = None
+        if Config.CODE_INDEX_ENABLED:
+            self.code_index = CodeIndex(Config.CODE_INDEX_DIR, chunk_lines=Config.CODE_INDEX_CHUNK_LINES,
+                                        max_file_bytes=Config.CODE_INDEX_MAX_FILE_BYTES,
+                                        embedding_model=Config.CODE_INDEX_EMBEDDING_MODEL)
+        # Agent teams are built once per process and reused across jobs
+        self.team_pool = AgentTeamPool(self.llm_configs, size=Config.WORKER_POOL_SIZE)
 
-    def run(self, repo_path: str, repo_structure: str, job_id: str = None):
+    def run(self, repo_path: str, repo_structure: str, job_id: str = None, repo_url: str = None,
+            use_llm_cache: bool = True, change=None):
         """
         Orchestrates the CI process for a given repository.
+        `use_llm_cache=False` bypasses the LLM response cache for this run.
+        `change` (agents.test_selection.PushedChange) limits the tests to those the push affects.
         """
         import logging
-        from app.models import db, Log
+        from app.log_writer import JobLogHandler, log_writer
 
         logger = logging.getLogger('[Orchestrator]')
         
-        # 1. Setup DB Logging if job_id is present
+        # 1. Setup DB Logging if job_id is present (batched by the shared LogWriter)
         db_handler = None
         if job_id:
-            class DBLogHandler(logging.Handler):
-                def __init__(self, job_id):
-                    super().__init__()
-                    self.job_id = job_id
-                def emit(self, record):
-                    try:
-                        log_entry = self.format(record)
-                        new_log = Log(job_id=self.job_id, content=log_entry)
-                        db.session.add(new_log)
-                        db.session.commit()
-                    except Exception:
-                        pass
-            
-            db_handler = DBLogHandler(job_id)
+            db_handler = JobLogHandler(job_id)
             formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
             db_handler.setFormatter(formatter)
             logger.addHandler(db_handler)
 
+        context = None
         try:
-            logger.info("STEP 1: Creating UserProxyAgent...")
-            # 1. Define Standard Admin Agent
-            user_proxy = autogen.UserProxyAgent(
-                name="Admin",
-                system_message="A human admin. You execute the build/test steps.",
-                human_input_mode="NEVER",
-                max_consecutive_auto_reply=15,
-                is_termination_msg=lambda x: (x.get("content") or "").rstrip().endswith("TERMINATE"),
-                code_execution_config={
-                    "work_dir": "workspace",
-                    "use_docker": False, 
-                },
-            )
-            logger.info("UserProxyAgent created successfully")
+            # 1. Check out a pre-built agent team and bind it to this job
+            sandbox = Sandbox(use_docker=self.use_docker, pool=self.container_pool,
+                              dep_cache=self.dep_cache, images=self.image_manager, limits=self.sandbox_limits,
+                              local_limits=self.local_limits)
+            context = JobContext(repo_path, job_id=job_id, sandbox=sandbox)
+            context.log_handler = db_handler
+            context.change = change
+            context.repo_url = normalize_repo_url(repo_url or repo_path)
+            context.timeouts = TimeoutAdvisor(context.repo_url)
+            prune_artifacts(Config.ARTIFACTS_DIR, Config.ARTIFACTS_KEEP_JOBS)
+            context.artifacts_dir = os.path.join(Config.ARTIFACTS_DIR, job_id or os.path.basename(repo_path.rstrip('/')))
+            context.tool_outputs = ToolOutputStore(context.artifacts_dir)
+            if self.llm_cache and use_llm_cache:
+                # The checkout path differs per job; mask it so identical prompts hit the cache
+                context.llm_cache = JobLLMCache(
+                    self.llm_cache,
+                    context.repo_url,
+                    volatile=[repo_path, os.path.basename(repo_path.rstrip('/'))],
+                )
+            with llm_gateway.job(job_id or repo_path) as context.llm_usage, \
+                    self.team_pool.checkout(context) as team:
+                return self._run_team(team, repo_path, repo_structure, logger)
 
-            # 2. Skip RAG Agent (dependencies commented out)
-            logger.info("STEP 2: Skipping RAG agent (dependencies not installed)")
-            rag_agent = None
+        finally:
+             if context:
+                 # Tear down the job's sandbox container
+                 context.sandbox.close()
+                 for summary in context.sandbox.cache_summaries:
+                     logger.info(f"Dependency {summary}")
+             if db_handler:
+                 logger.removeHandler(db_handler)
+                 log_writer.flush()
 
-            logger.info("STEP 3: Creating specialized agents...")
-            scanner = ScannerAgent(llm_config=self.llm_config)
-            logger.info("Scanner agent created")
-            builder = BuildAgent(llm_config=self.llm_config)
-            logger.info("Builder agent created")
-            tester = TesterAgent(llm_config=self.llm_config)
-            logger.info("Tester agent created")
-            reporter = ReportAgent(llm_config=self.llm_config)
-            logger.info("Reporter agent created")
-            debugger = DebuggerAgent(llm_config=self.llm_config)
-            logger.info("Debugger agent created")
+    def _save_report(self, repo_path, report_content, logger):
+        # Write report to file
+        report_path = os.path.join(repo_path, "ci_report.md")
+        try:
+            with open(report_path, "w") as f:
+                f.write(report_content)
+            logger.info(f"Report saved to {report_path}")
+        except Exception as e:
+            logger.error(f"Failed to save report: {e}")
 
-            # 3. Register Tools
-            def run_shell_command(command: str) -> str:
-                """
-                Executes a shell command in a secure sandbox environment.
-                Prepends 'timeout --preserve-status 5s' if no timeout is specified.
-                """
-                if "timeout" not in command:
-                    command = f"timeout --preserve-status 5s {command}"
-                print(f">>> Executing in Sandbox: {command}")
-                # Pass repo_path as work_dir to mount it
-                stdout, stderr = self.sandbox.run_command(command, work_dir=repo_path)
-                output = stdout + stderr
-                return f"Output:\n{output}"
+    def _run_fast_steps(self, context, logger):
+        """
+        Runs the detected stack's build commands, then its test commands, directly
+        in the sandbox. Build commands run one by one and stop at the first failure;
+        several test commands are independent and run in parallel (context.run_parallel).
+        Returns (steps, passed) where each step is a dict with phase, command,
+        exit_code, seconds, output (bounded) and size.
+        """
+        steps = []
+        for command in context.stack.build_commands:
+            logger.info(f"Fast mode [build]: {command}")
+            result = context.run_command(command, timeout=Config.FAST_MODE_STEP_TIMEOUT)
+            steps.append(self._fast_step(context, "build", command, result, logger))
+            if result.exit_code != 0:
+                return steps, False
 
-            def write_file(file_path: str, content: str) -> str:
-                """
-                Writes content to a file in the repository.
-                """
-                print(f">>> Writing to file: {file_path}")
-                # Ensure path is within repo_path
-                full_path = os.path.join(repo_path, file_path.lstrip('/'))
-                
-                try:
-                    # Ensure directory exists
-                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                    with open(full_path, 'w') as f:
-                        f.write(content)
-                    return f"Successfully wrote to {file_path}"
-                except Exception as e:
-                    return f"Error writing file: {str(e)}"
+        tests = context.stack.test_commands
+        if len(tests) > 1:
+            for i, command in enumerate(tests, 1):
+                logger.info(f"Fast mode [test] [{i}]: {command}")
+            start = time.monotonic()
+            results = context.run_parallel(tests, timeout=Config.FAST_MODE_STEP_TIMEOUT)
+            logger.info(f"Fast mode [test]: {len(tests)} commands in parallel took "
+                        f"{time.monotonic() - start:.1f}s (sum {sum(r.seconds for r in results):.1f}s)")
+        else:
+            for command in tests:
+                logger.info(f"Fast mode [test]: {command}")
+            results = [context.run_command(c, timeout=Config.FAST_MODE_STEP_TIMEOUT) for c in tests]
+        for command, result in zip(tests, results):
+            steps.append(self._fast_step(context, "test", command, result, logger))
+        return steps, all(r.exit_code == 0 for r in results)
 
-            def set_sandbox_image(image_name: str) -> str:
-                """
-                Sets the Docker image for the sandbox environment.
-                """
-                print(f">>> Setting Sandbox Image: {image_name}")
-                self.sandbox.set_image(image_name)
-                return f"Sandbox image set to {image_name}"
+    def _fast_step(self, context, phase, command, result, logger):
+        logger.info(f"Fast mode [{phase}]: exit code {result.exit_code} after {result.seconds}s")
+        return {
+            "phase": phase,
+            "command": command,
+            "exit_code": result.exit_code,
+            "seconds": result.seconds,
+            "output": result.output,
+            "size": context.describe_output(result),
+        }
 
-            # Register run_shell_command
-            for agent in [builder, tester, reporter, debugger]:
-                autogen.agentchat.register_function(
-                    run_shell_command,
-                    caller=agent,
-                    executor=user_proxy,
-                    name="run_shell_command",
-                    description="Run a shell command in the sandbox"
-                )
-                
-            # Register write_file
-            for agent in [builder, tester, debugger]:
-                 autogen.agentchat.register_function(
-                    write_file,
-                    caller=agent,
-                    executor=user_proxy,
-                    name="write_file",
-                    description="Write content to a file. Use this to create config files or fix code."
+    def _format_steps(self, steps, limit=4000):
+        """Markdown listing of fast mode steps; each output is cut to its last `limit` characters."""
+        parts = []
+        for step in steps:
+            output = step["output"]
+            if len(output) > limit:
+                output = "... (truncated)\n" + output[-limit:]
+            status = "passed" if step["exit_code"] == 0 else f"FAILED (exit code {step['exit_code']})"
+            parts.append(
+                f"- [{step['phase']}] `{step['command']}`: {status} in {step['seconds']}s ({step['size']})\n"
+                f"```\n{output.strip()}\n```"
+            )
+        return "\n".join(parts)
+
+    def _fast_report(self, team, stack, steps, logger):
+        """
+        Report for a green fast-mode run. Uses a single Reporter call when
+        FAST_MODE_LLM_REPORT is set, otherwise (or if that call fails) a template.
+        """
+        results = self._format_steps(steps)
+        if Config.FAST_MODE_LLM_REPORT:
+            try:
+                res = team.user_proxy.initiate_chat(
+                    team.reporter,
+                    message=(
+                        f"The build and tests for this {stack.name} repository passed"
+                        f"{'' if stack.test_commands else ' (no tests are affected by this push)'}. "
+                        f"Write the final CI report from these results. Do not call any tools.\n\n{results}"
+                    ),
+                    max_turns=1,
+                    cache=team.context.llm_cache,
                 )
+                content = (res.chat_history[-1].get("content") or "") if res.chat_history else ""
+                if len(content) >= 50:
+                    return content.replace("TERMINATE", "").strip()
+            except Exception as e:
+                logger.warning(f"Fast mode report call failed, using template: {e}")
+
+        total = round(sum(step["seconds"] for step in steps), 1)
+        outcome = "Build and tests passed" if stack.test_commands else "Build passed (no tests affected by this push)"
+        return (
+            "# CI Report\n\n"
+            "## Executive Summary\n"
+            f"✅ PASSED. Stack: {stack.name} (`{stack.image}`). "
+            f"{outcome} in {total}s.\n\n"
+            "## Issues Found\nNone.\n\n"
+            "## Rectified Code\nNo changes were needed.\n\n"
+            f"## Test Results\n{results}\n\n"
+            "## Recommendations\nNone."
+        )
+
+    def _select_tests(self, context, stack, logger):
+        """Narrows stack.test_commands to the tests the push affects. Returns the Selection, or None."""
+        if not self.test_selector or not context.change or not stack.test_commands:
+            return None
+        try:
+            selection = self.test_selector.select(context.repo_path, context.repo_url, stack, context.change)
+        except Exception as e:
+            logger.warning(f"Test selection failed, running all tests: {e}")
+            return None
+        context.test_selection = selection
+        context.change.selection = selection
+        logger.info(f"Test selection: {selection.summary()}")
+        if not selection.full:
+            for test, why in sorted(selection.tests.items()):
+                logger.info(f"Test selection:   {test} ({why})")
+            stack.test_commands = selection.commands
+        return selection
+
+    def _pipeline_details(self, context):
+        """Markdown section describing how the pipeline ran (paths taken, savings)."""
+        notes = list(context.notes)
+        if context.llm_cache:
+            notes.append(("LLM cache", f"{context.llm_cache.hits} hits, {context.llm_cache.misses} misses"))
+        usage = context.llm_usage
+        if usage and usage["requests"]:
+            notes.append(("LLM requests", f"{usage['requests']} sent ({usage['retries']} retries after 429/5xx), "
+                                           f"{usage['tokens']} tokens, {usage['waited']:.1f}s queued for rate limits"))
+            for name, model in usage["models"].items():
+                text = (f"{model['requests']} requests, {model['tokens']} tokens, "
+                        f"{model['seconds'] / model['requests']:.1f}s average, {model['max_seconds']:.1f}s slowest")
+                if model["failures"]:
+                    text += f", {model['failures']} failed"
+                notes.append((f"Model `{name}`", text))
+        if context.sandbox.cache_session:
+            notes.append(("Dependency cache", context.sandbox.cache_session.summary()))
+        if context.commands_run and context.artifacts_dir:
+            notes.append(("Sandbox commands", f"{context.commands_run} run, full logs at "
+                                               f"`{context.artifact_url('command-<n>.log')}`"))
+        stats = context.context_stats
+        if stats["rounds"]:
+            text = (f"{stats['rounds']} agent rounds, {stats['tokens_sent']} tokens sent "
+                    f"(peak {stats['peak_tokens']}), {stats['tokens_saved']} saved by compaction")
+            if stats["outputs_compacted"]:
+                text += (f"; {len(stats['outputs_compacted'])} tool outputs compacted, "
+                         f"full outputs at `{context.artifact_url('<name>.log')}`")
+            notes.append(("LLM context", text))
+        speakers = context.speaker_stats
+        if speakers["rules"] or speakers["fallbacks"]:
+            notes.append(("Speaker selection", f"{speakers['rules']} turns chosen by rules "
+                                                f"({speakers['rules']} selector LLM calls avoided), "
+                                                f"{speakers['fallbacks']} by the LLM selector"))
+        selection = context.test_selection
+        if selection:
+            notes.append(("Test selection", selection.summary()))
+        search = context.code_search
+        if search:
+            index = search.stats
+            notes.append(("Code search", f"{index['files']} files indexed ({index['source']}; "
+                                          f"{index['chunked']} chunked in {index['seconds']}s), "
+                                          f"{index['searches']} searches"))
+        if not notes:
+            return ""
+        lines = [f"- **{label}**: {text}" for label, text in notes]
+        details = "\n\n## Pipeline Details\n" + "\n".join(lines) + "\n"
+        if selection and selection.tests:
+            details += "\n### Selected Tests\n" + selection.details() + "\n"
+        return details
 
-            # Register set_sandbox_image for Scanner
-            autogen.agentchat.register_function(
-                set_sandbox_image,
-                caller=scanner,
-                executor=user_proxy,
-                name="set_sandbox_image",
-                description="Set the Docker image for the sandbox (e.g., maven:3.8-openjdk-17)"
+    def _run_team(self, team, repo_path, repo_structure, logger):
+        """Runs the GroupChat on a checked-out team and returns the report."""
+        user_proxy = team.user_proxy
+        reporter = team.reporter
+        manager = team.manager
+        context = team.context
+
+        # 2. Rule-based stack detection; the LLM Scanner only runs when it is ambiguous
+        stack, reason = detect_stack(repo_path) if Config.STACK_DETECTION_ENABLED else (None, "disabled")
+        if stack:
+            logger.info(f"STEP 2: Stack detected by rules ({reason}): {stack.name}, image {stack.image}. Skipping Scanner.")
+            context.stack = stack
+            context.sandbox.set_image(stack.image)
+            team.exclude(team.scanner)
+            context.note("Stack detection", f"rule-based ({reason}), Scanner skipped, ~{SCANNER_LLM_CALLS} LLM calls saved")
+            selection = self._select_tests(context, stack, logger)
+            scanner_task = (
+                f"Stack (already detected, sandbox image set, Scanner is not needed): {stack.name}, image `{stack.image}`.\n"
+                f"        Suggested build commands: {'; '.join(stack.build_commands) or 'none'}\n"
+                f"        Suggested test commands: {'; '.join(stack.test_commands) or 'none found'}"
             )
+            if selection and not selection.full:
+                scanner_task += (
+                    f"\n        Test selection: {selection.summary()}. Run only the suggested test commands"
+                    + (" (no tests need to run or be created)." if not selection.tests else ".")
+                )
+        else:
+            logger.info(f"STEP 2: Stack detection ambiguous ({reason}), using LLM Scanner.")
+            context.note("Stack detection", f"LLM Scanner ({reason})")
+            scanner_task = "Scanner: Identify the stack"
 
-            # 4. Start the Chat
-            logger.info("STEP 4: Creating GroupChat with all agents...")
-            agents_list = [user_proxy, scanner, builder, tester, reporter, debugger]
-            if rag_agent:
-                agents_list.append(rag_agent)
-            
-            logger.info(f"Agents in group: {[a.name for a in agents_list]}")
-            
-            groupchat = autogen.GroupChat(
-                agents=agents_list, 
-                messages=[], 
-                max_round=50,
+        # 3. Fast mode: run the known build/test commands directly, no GroupChat if they pass
+        fast_results_text = ""
+        if stack and Config.FAST_MODE_ENABLED:
+            steps, passed = self._run_fast_steps(context, logger)
+            selected_none = context.test_selection and not context.test_selection.full and not stack.test_commands
+            if passed and (stack.test_commands or selected_none):
+                logger.info("STEP 3: Fast mode build and tests passed. Skipping GroupChat.")
+                context.note("Execution", "fast mode (build and tests passed without the agent GroupChat)")
+                report_content = self._fast_report(team, stack, steps, logger)
+                report_content += self._pipeline_details(context)
+                self._save_report(repo_path, report_content, logger)
+                return report_content
+
+            reason = "a step failed" if not passed else "no test command found"
+            logger.info(f"STEP 3: Fast mode escalating to agents ({reason}).")
+            context.note("Execution", f"fast mode escalated to the agent GroupChat ({reason})")
+            fast_results_text = (
+                "\n        Fast mode already ran these steps (do not repeat passing ones; "
+                "Debugger should fix failures):\n" + self._format_steps(steps, limit=2000)
             )
-            logger.info("GroupChat created successfully")
-            
-            logger.info("STEP 5: Creating GroupChatManager...")
-            manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=self.llm_config)
-            logger.info("GroupChatManager created successfully")
+
+        # Index the checkout for the agents' search_code tool (only changed files since the last indexed commit)
+        if self.code_index:
+            try:
+                context.code_search = self.code_index.open(repo_path, context.repo_url)
+            except Exception as e:
+                logger.warning(f"Code index unavailable, agents fall back to shell commands: {e}")
+
+        logger.info(f"Agents in group: {[a.name for a in team.groupchat.agents]}")
+
+        # 4. Initiate the Conversation
+        logger.info("STEP 4: Initiating chat with initial message...")
+        message = f"""
+        Analyze this repository and generate a CI report.
+        
+        Repository Structure:
+        {repo_structure}
+        
+        Tasks:
+        1. {scanner_task}{fast_results_text}
+        2. Builder: Check if code runs. If it fails, ask Debugger to fix it.
+        3. Tester: Look for existing tests. **If NO tests are found, you MUST create a new test file (e.g. `test_suite.py`) covering the codebase.** Then run the tests. If tests fail, ask Debugger to fix the code.
+        4. Reporter: Create final report. **If code was modified/rectified, INCLUDE the fixed code snippets in the report.** Say TERMINATE.
+        
+        Keep it brief. Reporter must end with TERMINATE.
+        """
+        
+        logger.info("STEP 5: Starting user_proxy.initiate_chat()...")
+        chat_res = user_proxy.initiate_chat(
+            manager,
+            message=message,
+            cache=context.llm_cache,
+        )
+        logger.info("Chat completed successfully!")
+        logger.info(f"Speaker selection: {context.speaker_stats}")
+        
+        # Extract the last message from the Reporter if possible, or search history
+        report_content = "Report generation failed or not found."
+        
+        # Debug: Log chat history length
+        import logging
+        logger = logging.getLogger('[Orchestrator]')
+        logger.info(f"DEBUG: Chat history has {len(chat_res.chat_history)} messages")
+        
+        # Iterate backwards to find the last message from 'Reporter'
+        for msg in reversed(chat_res.chat_history):
+            msg_name = msg.get("name", "Unknown")
+            logger.info(f"DEBUG: Checking message from {msg_name}")
+            if msg_name == "Reporter":
+                 report_content = msg.get("content", "")
+                 logger.info(f"DEBUG: Found Reporter message, length: {len(report_content)}")
+                 break
+        
+        # --- FALLBACK: FORCE REPORT GENERATION ---
+        if report_content == "Report generation failed or not found." or len(report_content) < 50:
+            logger.warning("⚠️ Reporter did not speak or report is empty. Forcing report generation.")
             
-            # 5. Initiate the Conversation
-            logger.info("STEP 6: Initiating chat with initial message...")
-            message = f"""
-            Analyze this repository and generate a CI report.
+            force_prompt = f"""
+            The team has finished their work. Review the conversation history above and generate the final CI Report as requested.
             
-            Repository Structure:
-            {repo_structure}
+            Content:
+            {team.compactor.render(chat_res.chat_history)}
             
-            Tasks:
-            1. Scanner: Identify the stack
-            2. Builder: Check if code runs. If it fails, ask Debugger to fix it.
-            3. Tester: Look for existing tests. **If NO tests are found, you MUST create a new test file (e.g. `test_suite.py`) covering the codebase.** Then run the tests. If tests fail, ask Debugger to fix the code.
-            4. Reporter: Create final report. **If code was modified/rectified, INCLUDE the fixed code snippets in the report.** Say TERMINATE.
+            Format:
+            Markdown.
+            Structure:
+            1. Executive Summary
+            2. Issues Found
+            3. Rectified Code (CRITICAL: Include the fixed code snippets if any)
+            3. Rectified Code (CRITICAL: Include the fixed code snippets if any)
+            4. Test Results (CRITICAL: You MUST copy the exact, verbose output of the shell command. Do not summarize.)
+            5. Recommendations
             
-            Keep it brief. Reporter must end with TERMINATE.
+            Ending with TERMINATE.
             """
             
-            logger.info("STEP 7: Starting user_proxy.initiate_chat()...")
-            chat_res = user_proxy.initiate_chat(
-                manager,
-                message=message,
+            # Direct call to Reporter
+            # We use the user_proxy to ask the reporter directly
+            direct_res = user_proxy.initiate_chat(
+                reporter,
+                message=force_prompt,
+                cache=context.llm_cache,
+                clear_history=False 
             )
-            logger.info("Chat completed successfully!")
-            
-            # Extract the last message from the Reporter if possible, or search history
-            report_content = "Report generation failed or not found."
-            
-            # Debug: Log chat history length
-            import logging
-            logger = logging.getLogger('[Orchestrator]')
-            logger.info(f"DEBUG: Chat history has {len(chat_res.chat_history)} messages")
-            
-            # Iterate backwards to find the last message from 'Reporter'
-            for msg in reversed(chat_res.chat_history):
-                msg_name = msg.get("name", "Unknown")
-                logger.info(f"DEBUG: Checking message from {msg_name}")
-                if msg_name == "Reporter":
-                     report_content = msg.get("content", "")
-                     logger.info(f"DEBUG: Found Reporter message, length: {len(report_content)}")
-                     break
             
-            # --- FALLBACK: FORCE REPORT GENERATION ---
-            if report_content == "Report generation failed or not found." or len(report_content) < 50:
-                logger.warning("⚠️ Reporter did not speak or report is empty. Forcing report generation.")
-                
-                force_prompt = f"""
-                The team has finished their work. Review the conversation history above and generate the final CI Report as requested.
-                
-                Content:
-                {str(chat_res.chat_history)}
-                
-                Format:
-                Markdown.
-                Structure:
-                1. Executive Summary
-                2. Issues Found
-                3. Rectified Code (CRITICAL: Include the fixed code snippets if any)
-                3. Rectified Code (CRITICAL: Include the fixed code snippets if any)
-                4. Test Results (CRITICAL: You MUST copy the exact, verbose output of the shell command. Do not summarize.)
-                5. Recommendations
-                
-                Ending with TERMINATE.
-                """
-                
-                # Direct call to Reporter
-                # We use the user_proxy to ask the reporter directly
-                direct_res = user_proxy.initiate_chat(
-                    reporter,
-                    message=force_prompt,
-                    clear_history=False 
-                )
-                
-                # Extract the last message from this new chat
-                if direct_res.chat_history:
-                     last_msg = direct_res.chat_history[-1]
-                     if last_msg.get("content"):
-                         report_content = last_msg.get("content")
-                         logger.info(f"DEBUG: Forced report content length: {len(report_content)}")
+            # Extract the last message from this new chat
+            if direct_res.chat_history:
+                 last_msg = direct_res.chat_history[-1]
+                 if last_msg.get("content"):
+                     report_content = last_msg.get("content")
+                     logger.info(f"DEBUG: Forced report content length: {len(report_content)}")
 
-            # Clean up TERMINATE
-            if report_content:
-                report_content = report_content.replace("TERMINATE", "").strip()
-            else:
-                report_content = "Report generation failed."
-            
-            logger.info(f"DEBUG: Final report content length: {len(report_content)}")
-            
-            # Write report to file
-            report_path = os.path.join(repo_path, "ci_report.md")
-            try:
-                with open(report_path, "w") as f:
-                    f.write(report_content)
-                logger.info(f"Report saved to {report_path}")
-            except Exception as e:
-                logger.error(f"Failed to save report: {e}")
+        # Clean up TERMINATE
+        if report_content:
+            report_content = report_content.replace("TERMINATE", "").strip()
+        else:
+            report_content = "Report generation failed."
 
-            # Return both success message and report content
-            return report_content
+        report_content += self._pipeline_details(context)
+        
+        logger.info(f"DEBUG: Final report content length: {len(report_content)}")
+        
+        self._save_report(repo_path, report_content, logger)
 
-        finally:
-             if db_handler:
-                 logger.removeHandler(db_handler)
+        # Return both success message and report content
+        return report_content
@@ -5,9 +5,8 @@ class ScannerAgent(autogen.AssistantAgent):
     def __init__(self, name="Scanner", llm_config=None):
         system_message = """You are a senior software engineer. 
         Analyze the provided file structure and identify the technology stack, languages, and frameworks used.
-        You have access to a RAG agent named 'CodebaseOracle'.
-        TO use RAG (CodebaseOracle), send a message to it.
-        HOWEVER, if the file structure provided in the initial message is sufficient, identify the stack IMMEDIATELY without querying.
+        You have a `search_code(query)` tool that returns the most relevant code snippets with their line ranges.
+        HOWEVER, if the file structure provided in the initial message is sufficient, identify the stack IMMEDIATELY without searching.
         
         Example: "Stack: Python. Framework: Flask."
         
@@ -0,0 +1,152 @@
+import re
+import logging
+
+logger = logging.getLogger('[Orchestrator]')
+
+# Stage order (task-list roles) when the initial message does not name them
+DEFAULT_PLAN = ["Scanner", "Builder", "Tester", "Reporter"]
+# Task-list role -> agent name, for the team's default agents
+DEFAULT_ROLES = {"Scanner": "Scanner", "Builder": "Build_Engineer", "Tester": "Test_Engineer", "Reporter": "Reporter"}
+
+_TASK = re.compile(r"^\s*\d+\.\s*(?:\*\*)?(\w+)(?:\*\*)?:", re.MULTILINE)
+_EXIT_CODE = re.compile(r"Exit code: (-?\d+)")
+_FAST_FAILURE = re.compile(r"- \[(\w+)\] `[^`]*`: FAILED")
+
+class SpeakerSelector:
+    """
+    Deterministic speaker selection for the agent GroupChat (a callable for
+    `GroupChat.speaker_selection_method`).
+
+    The stage order comes from the numbered task list of the initial message
+    ("2. Builder: ...", "3. Tester: ..."; `roles` maps these to agent
+    names). Tool calls go to Admin and the tool results back to the caller.
+    When a stage agent finishes its turn after a failed command (a non-zero
+    "Exit code" in its last tool result; merely mentioning the Debugger does
+    not count), the Debugger gets the floor and then hands back to that
+    agent (at most `max_debug_rounds` times per stage, after which the plan
+    moves on so the Reporter can report the failure). Anything else falls back to the LLM ("auto") selection.
+    Each decision is counted in `stats` (the job's speaker_stats when bound).
+    `failed_fixes` counts the Debugger fixes after which the stage still
+    failed; it is reset once a stage passes.
+    """
+    def __init__(self, admin="Admin", debugger="Debugger", reporter="Reporter", roles=None, max_debug_rounds=3):
+        self.roles = dict(DEFAULT_ROLES if roles is None else roles)
+        self.admin = admin
+        self.debugger = debugger
+        self.reporter = reporter
+        self.max_debug_rounds = max_debug_rounds
+        self.stats = self.new_stats()
+        self.reset()
+
+    @staticmethod
+    def new_stats():
+        # rules: turns picked by rules that would otherwise have cost a selector LLM call
+        # tools: tool calls routed to Admin (autogen does this without the LLM as well)
+        # fallbacks: turns left to the LLM selector
+        return {"rules": 0, "tools": 0, "fallbacks": 0}
+
+    def reset(self):
+        self.plan = None
+        self.stage = 0
+        self.failed = False  # the last command of the current turn failed
+        self.return_to = None  # agent the Debugger hands back to
+        self.debug_rounds = {}
+        self.failed_fixes = 0
+
+    def _build_plan(self, groupchat, text):
+        present = set(groupchat.agent_names)
+        named = [self.roles.get(name, name) for name in _TASK.findall(text or "")]
+        named = [name for name in named if name in present]
+        plan = named or [self.roles.get(name, name) for name in DEFAULT_PLAN if self.roles.get(name, name) in present]
+        self.plan = [name for name in plan if name not in (self.admin, self.debugger)]
+        if self.reporter in present and self.reporter not in self.plan:
+            self.plan.append(self.reporter)
+        logger.info(f"Speaker selection: Plan {' -> '.join(self.plan)}")
+
+    def _pick(self, groupchat, name, kind="rules"):
+        self.stats[kind] += 1
+        return groupchat.agent_by_name(name)
+
+    def _fallback(self, reason):
+        logger.info(f"Speaker selection: LLM fallback ({reason})")
+        self.stats["fallbacks"] += 1
+        return "auto"
+
+    def _current(self):
+        return self.plan[self.stage] if self.stage < len(self.plan) else self.reporter
+
+    def _advance(self, groupchat, speaker):
+        if speaker in self.plan:
+            self.stage = max(self.stage, self.plan.index(speaker) + 1)
+        self.failed = False
+        return self._pick(groupchat, self._current())
+
+    def _debug(self, groupchat, speaker):
+        rounds = self.debug_rounds.get(speaker, 0)
+        if rounds:
+            # The stage was re-run after a Debugger fix and failed again
+            self.failed_fixes += 1
+        if rounds >= self.max_debug_rounds:
+            logger.info(f"Speaker selection: {speaker} still failing after {rounds} Debugger rounds, moving on")
+            return self._advance(groupchat, speaker)
+        self.debug_rounds[speaker] = rounds + 1
+        self.return_to = speaker
+        self.failed = False
+        return self._pick(groupchat, self.debugger)
+
+    def __call__(self, last_speaker, groupchat):
+        messages = groupchat.messages
+        if not messages:
+            return self._fallback("no messages")
+        message = messages[-1]
+        speaker = last_speaker.name
+
+        if message.get("tool_calls") or message.get("function_call"):
+            return self._pick(groupchat, self.admin, "tools")
+
+        if speaker == self.admin:
+            if self.plan is None:
+                # The initial task message
+                text = message.get("content") or ""
+                self._build_plan(groupchat, text)
+                failure = _FAST_FAILURE.search(text)
+                if failure and self.debugger in groupchat.agent_names:
+                    # Fast mode already failed: go straight to fixing it
+                    phase_agent = self.roles.get("Tester" if failure.group(1) == "test" else "Builder")
+                    if phase_agent in self.plan:
+                        self.stage = self.plan.index(phase_agent)
+                        return self._debug(groupchat, phase_agent)
+                return self._pick(groupchat, self._current())
+            if message.get("tool_responses") or message.get("role") == "tool":
+                codes = [int(c) for c in _EXIT_CODE.findall(message.get("content") or "")]
+                self.failed = any(codes)
+                caller = messages[-2].get("name") if len(messages) > 1 else None
+                if caller in groupchat.agent_names and caller != self.admin:
+                    return self._pick(groupchat, caller)
+                return self._fallback("tool result without a caller")
+            return self._fallback("unexpected Admin message")
+
+        if self.plan is None:
+            return self._fallback("no task list seen")
+
+        content = message.get("content") or ""
+        if speaker == self.debugger:
+            if self.return_to:
+                target, self.return_to = self.return_to, None
+                self.failed = False
+                return self._pick(groupchat, target)
+            return self._fallback("Debugger without a requesting agent")
+
+        if speaker == self.reporter:
+            if content.rstrip().endswith("TERMINATE"):
+                # Admin recognizes the termination message and ends the chat
+                return self._pick(groupchat, self.admin)
+            return self._fallback("Reporter did not terminate")
+
+        if speaker in self.plan:
+            if self.debugger in groupchat.agent_names and self.failed:
+                return self._debug(groupchat, speaker)
+            self.failed_fixes = 0
+            return self._advance(groupchat, speaker)
+
+        return self._fallback(f"{speaker} is not in the plan")
@@ -0,0 +1,104 @@
+import os
+import json
+
+# Rough number of LLM calls the Scanner turn costs in the GroupChat:
+# its own reply (set_sandbox_image tool call) plus the speaker-selection
+# calls for its turn and for Admin executing the tool.
+SCANNER_LLM_CALLS = 3
+
+class Stack:
+    """A detected technology stack and how to build/test it in the sandbox."""
+    def __init__(self, name, image, build_commands, test_commands, manifests):
+        self.name = name
+        self.image = image
+        self.build_commands = build_commands
+        self.test_commands = test_commands
+        self.manifests = manifests
+
+    def __repr__(self):
+        return f"Stack({self.name}, image={self.image}, manifests={self.manifests})"
+
+def _has_python_tests(repo_path):
+    if os.path.isdir(os.path.join(repo_path, 'tests')) or os.path.isdir(os.path.join(repo_path, 'test')):
+        return True
+    for root, dirs, files in os.walk(repo_path):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ('node_modules', 'venv', '.venv')]
+        if any((f.startswith('test_') or f.endswith('_test.py')) and f.endswith('.py') for f in files):
+            return True
+    return False
+
+def _python(repo_path, files):
+    manifests = [f for f in ('pyproject.toml', 'setup.py', 'requirements.txt', 'Pipfile') if f in files]
+    build = []
+    if 'requirements.txt' in files:
+        build.append("pip install -r requirements.txt")
+    if 'pyproject.toml' in files or 'setup.py' in files:
+        build.append("pip install -e .")
+    elif 'Pipfile' in files and 'requirements.txt' not in files:
+        build.append("pip install pipenv && pipenv install --system --dev")
+    test = ["pip install pytest && python -m pytest -q"] if _has_python_tests(repo_path) else []
+    return Stack("Python", "python:3.11", build, test, manifests)
+
+def _node(repo_path, files):
+    try:
+        with open(os.path.join(repo_path, 'package.json')) as f:
+            scripts = json.load(f).get('scripts', {}) or {}
+    except (OSError, ValueError):
+        scripts = {}
+    install = "npm ci" if 'package-lock.json' in files else "npm install"
+    build = [install]
+    if 'build' in scripts:
+        build.append("npm run build")
+    test_script = scripts.get('test', '')
+    test = ["npm test"] if test_script and 'no test specified' not in test_script else []
+    return Stack("Node.js", "node:18", build, test, ['package.json'])
+
+def _maven(repo_path, files):
+    return Stack("Java (Maven)", "maven:3.8-openjdk-17",
+                 ["mvn -B -q -DskipTests install"], ["mvn -B test"], ['pom.xml'])
+
+def _gradle(repo_path, files):
+    gradle = "./gradlew" if 'gradlew' in files else "gradle"
+    manifest = 'build.gradle.kts' if 'build.gradle.kts' in files else 'build.gradle'
+    return Stack("Java (Gradle)", "gradle:8-jdk17",
+                 [f"{gradle} build -x test"], [f"{gradle} test"], [manifest])
+
+def _go(repo_path, files):
+    return Stack("Go", "golang:1.22", ["go build ./..."], ["go test ./..."], ['go.mod'])
+
+def _rust(repo_path, files):
+    return Stack("Rust", "rust:1.79", ["cargo build"], ["cargo test"], ['Cargo.toml'])
+
+# (manifest files that identify the stack, builder)
+RULES = [
+    (('pom.xml',), _maven),
+    (('build.gradle', 'build.gradle.kts'), _gradle),
+    (('package.json',), _node),
+    (('pyproject.toml', 'setup.py', 'requirements.txt', 'Pipfile'), _python),
+    (('go.mod',), _go),
+    (('Cargo.toml',), _rust),
+]
+
+def detect_stack(repo_path):
+    """
+    Identifies the stack from manifest files at the repository root.
+    Returns (stack, reason). `stack` is None when the rules are ambiguous
+    (no manifest, or manifests of several stacks) and the LLM Scanner should decide.
+    """
+    try:
+        files = set(os.listdir(repo_path))
+    except OSError as e:
+        return None, f"cannot list repository: {e}"
+
+    matches = [builder(repo_path, files) for manifests, builder in RULES if files.intersection(manifests)]
+
+    if not matches:
+        if 'Dockerfile' in files:
+            return None, "only a Dockerfile, no language manifest"
+        return None, "no known manifest files"
+    if len(matches) > 1:
+        names = ', '.join(m.name for m in matches)
+        return None, f"several stacks detected ({names})"
+
+    stack = matches[0]
+    return stack, f"matched {', '.join(stack.manifests)}"
@@ -0,0 +1,446 @@
+import os
+import queue
+import signal
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import autogen
+from security.sandbox import Sandbox
+from security.output_capture import OutputCapture
+from agents.scanner_agent import ScannerAgent
+from agents.build_agent import BuildAgent
+from agents.tester_agent import TesterAgent
+from agents.report_agent import ReportAgent
+from agents.debugger_agent import DebuggerAgent
+from agents.context_compactor import ContextCompactor
+from agents.speaker_selection import SpeakerSelector
+from app.config import Config
+
+logger = logging.getLogger('[Orchestrator]')
+
+class JobContext:
+    """
+    Everything the agent tools need to know about the job being run.
+    A team is bound to one context at a time; tools read it at call time.
+    """
+    def __init__(self, repo_path, job_id=None, sandbox=None):
+        self.repo_path = repo_path
+        self.job_id = job_id
+        self.sandbox = sandbox or Sandbox(use_docker=False)
+        self.stack = None  # agents.stack_detector.Stack once known
+        self.repo_url = None  # normalize_repo_url() form, keys per-repository caches
+        self.change = None  # agents.test_selection.PushedChange of the push being tested
+        self.test_selection = None  # agents.test_selection.Selection once tests were picked
+        self.code_search = None  # agents.code_index.CodeSearch over the checkout, once indexed
+        self.notes = []  # (label, text) lines for the report's Pipeline Details section
+        self.llm_cache = None  # agents.llm_cache.JobLLMCache, or None to bypass
+        self.llm_usage = None  # requests, retries and queueing of this job in the LLM gateway
+        self.artifacts_dir = None  # where full command logs and compacted tool outputs are written
+        self.tool_outputs = None  # agents.context_compactor.ToolOutputStore for compacted outputs
+        self.commands_run = 0
+        self._commands_lock = threading.Lock()
+        self.log_handler = None  # app.log_writer.JobLogHandler of the job, followed by helper threads
+        self.timeouts = None  # agents.command_timeouts.TimeoutAdvisor; None means no timeout unless given
+        self.context_stats = {"rounds": 0, "tokens_sent": 0, "tokens_saved": 0, "peak_tokens": 0,
+                              "outputs_compacted": set()}
+        self.speaker_stats = SpeakerSelector.new_stats()
+
+    def note(self, label, text):
+        self.notes.append((label, text))
+
+    def artifact_url(self, path):
+        """Where a file written under artifacts_dir can be fetched (API path, or the file path without a job)."""
+        if self.job_id:
+            return f"/api/jobs/{self.job_id}/artifacts/{os.path.basename(path)}"
+        return path
+
+    def run_command(self, command, timeout=None, label=""):
+        """
+        Runs a command in the sandbox with bounded output capture.
+        Lines are copied to the job log as they arrive (up to SANDBOX_LIVE_LOG_LINES),
+        prefixed with `label`, and the full output is spooled to artifacts_dir/command-N.log.
+        Without an explicit `timeout` it is chosen by the TimeoutAdvisor, and the
+        duration is recorded for later jobs either way.
+        """
+        with self._commands_lock:
+            self.commands_run += 1
+            number = self.commands_run
+        if timeout is None and self.timeouts:
+            timeout, reason = self.timeouts.timeout_for(command, self.sandbox.image)
+            logger.info(f"Sandbox: Timeout {timeout}s ({reason})")
+        if not self.sandbox.image_ready():
+            # The pull is not part of the command: the timeout starts once the container is up
+            logger.info(f"Sandbox: Waiting for image {self.sandbox.image} to finish pulling...")
+        spool_path = None
+        if self.artifacts_dir:
+            spool_path = os.path.join(self.artifacts_dir, f"command-{number}.log")
+        capture = OutputCapture(
+            head=Config.SANDBOX_OUTPUT_HEAD_LINES,
+            tail=Config.SANDBOX_OUTPUT_TAIL_LINES,
+            max_errors=Config.SANDBOX_OUTPUT_ERROR_LINES,
+        )
+        live = {"lines": 0}
+
+        def on_line(line):
+            live["lines"] += 1
+            if live["lines"] <= Config.SANDBOX_LIVE_LOG_LINES:
+                logger.info(f"  {label}| {line}")
+            elif live["lines"] == Config.SANDBOX_LIVE_LOG_LINES + 1:
+                logger.info(f"  {label}| ... (further output only in the command log)")
+
+        result = self.sandbox.run(command, work_dir=self.repo_path, timeout=timeout,
+                                  on_line=on_line, spool_path=spool_path, capture=capture)
+        logger.info(f"{label}Command exited with {result.exit_code} after {result.seconds}s: "
+                    f"{result.total_lines} lines, {result.total_bytes} bytes")
+        if self.timeouts:
+            self.timeouts.record(command, result.seconds, timed_out=result.timed_out)
+        return result
+
+    def run_parallel(self, commands, timeout=None, max_workers=None):
+        """
+        Runs independent commands concurrently in the job's sandbox (the same
+        container in Docker mode) on a pool of at most `max_workers` threads
+        (SANDBOX_PARALLEL_MAX by default). Returns the CommandResults in order.
+        """
+        max_workers = max(1, min(max_workers or Config.SANDBOX_PARALLEL_MAX, len(commands)))
+
+        def run(index, command):
+            with self.log_handler.follow() if self.log_handler else nullcontext():
+                return self.run_command(command, timeout=timeout, label=f"[{index + 1}] ")
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox") as executor:
+            futures = [executor.submit(run, i, c) for i, c in enumerate(commands)]
+            return [f.result() for f in futures]
+
+    def describe_run(self, result):
+        """Elapsed time and peak memory of a CommandResult."""
+        text = f"took {result.seconds}s"
+        if result.peak_memory:
+            scope = "container peak" if self.sandbox.use_docker else "peak"
+            text += f", {scope} memory {result.peak_memory / 1024 ** 2:.0f} MB"
+        if result.timed_out:
+            text += ", killed by timeout"
+        elif not self.sandbox.use_docker and result.exit_code in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            text += ", killed by the CPU time limit"
+        return text
+
+    def describe_output(self, result):
+        """One-line header for a CommandResult's output: totals, what was left out and where the full log is."""
+        text = f"{result.total_bytes} bytes, {result.total_lines} lines"
+        if result.omitted_lines:
+            text += f"; {result.omitted_lines} lines omitted"
+        if result.log_path:
+            text += f"; full log: {self.artifact_url(result.log_path)}"
+        return text
+
+class CompactingGroupChat(autogen.GroupChat):
+    """GroupChat whose LLM speaker selection also sees the compacted history."""
+    compactor = None
+
+    def _auto_select_speaker(self, last_speaker, selector, messages, agents):
+        if self.compactor is not None and messages:
+            messages = self.compactor.apply(messages, "speaker selection")
+        return super()._auto_select_speaker(last_speaker, selector, messages, agents)
+
+class AgentTeam:
+    """
+    One pre-built set of agents (Admin, Scanner, Builder, Tester, Reporter,
+    Debugger), their GroupChat/GroupChatManager and registered tools.
+    Tools are methods that act on `self.context`, so the team can be
+    reused for many jobs: bind() a JobContext, run the chat, then reset().
+    `llm_configs` has one llm_config per route of agents.model_router.ROUTES.
+    """
+    MAX_ROUND = 50
+
+    def __init__(self, llm_configs):
+        self.context = None
+
+        # 1. Define Standard Admin Agent
+        self.user_proxy = autogen.UserProxyAgent(
+            name="Admin",
+            system_message="A human admin. You execute the build/test steps.",
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=15,
+            is_termination_msg=lambda x: (x.get("content") or "").rstrip().endswith("TERMINATE"),
+            code_execution_config={
+                "work_dir": "workspace",
+                "use_docker": False,
+            },
+        )
+
+        # 2. Specialized agents
+        self.scanner = ScannerAgent(llm_config=llm_configs["scanner"])
+        self.builder = BuildAgent(llm_config=llm_configs["builder"])
+        self.tester = TesterAgent(llm_config=llm_configs["tester"])
+        self.reporter = ReportAgent(llm_config=llm_configs["reporter"])
+        self.debugger = DebuggerAgent(llm_config=llm_configs["debugger"])
+
+        # The Debugger switches to the strong model once its fixes keep failing
+        self.debugger_default_client = self.debugger.client
+        self.debugger_escalated_client = autogen.OpenAIWrapper(**llm_configs["debugger_escalated"])
+        self.escalated_models = [c["model"] for c in llm_configs["debugger_escalated"]["config_list"]]
+
+        # 3. Register Tools
+        self._register_tools()
+
+        # 4. Keep what each LLM agent sends under the context token budget
+        self.compactor = ContextCompactor(Config.CONTEXT_TOKEN_BUDGET, keep_recent=Config.CONTEXT_KEEP_RECENT)
+        for agent in [self.scanner, self.builder, self.tester, self.reporter, self.debugger]:
+            agent.register_hook("process_all_messages_before_reply", self.compactor.hook(agent.name))
+        self.debugger.register_hook("process_all_messages_before_reply", self._route_debugger)
+
+        # 5. GroupChat and its manager. Speakers follow the task list by rules;
+        # the LLM selector only decides in states the rules do not cover.
+        self.agents = [self.user_proxy, self.scanner, self.builder, self.tester, self.reporter, self.debugger]
+        self.speaker_selector = SpeakerSelector(
+            admin=self.user_proxy.name,
+            debugger=self.debugger.name,
+            reporter=self.reporter.name,
+            roles={"Scanner": self.scanner.name, "Builder": self.builder.name,
+                   "Tester": self.tester.name, "Reporter": self.reporter.name},
+            max_debug_rounds=Config.SPEAKER_MAX_DEBUG_ROUNDS,
+        )
+        self.groupchat = CompactingGroupChat(
+            agents=self.agents,
+            messages=[],
+            max_round=self.MAX_ROUND,
+            speaker_selection_method=self.speaker_selector if Config.SPEAKER_SELECTION_RULES else "auto",
+        )
+        self.groupchat.compactor = self.compactor
+        self.manager = autogen.GroupChatManager(groupchat=self.groupchat, llm_config=llm_configs["speaker_selection"])
+
+    def _register_tools(self):
+        # autogen annotates the registered callables, which bound methods do not allow,
+        # so each tool is a thin function forwarding to this team (and its current context).
+        def run_shell_command(command: str) -> str:
+            return self.run_shell_command(command)
+
+        def run_shell_commands_parallel(commands: list[str]) -> str:
+            return self.run_shell_commands_parallel(commands)
+
+        def write_file(file_path: str, content: str) -> str:
+            return self.write_file(file_path, content)
+
+        def set_sandbox_image(image_name: str) -> str:
+            return self.set_sandbox_image(image_name)
+
+        def search_code(query: str, top_k: int = Config.CODE_SEARCH_TOP_K) -> str:
+            return self.search_code(query, top_k)
+
+        # Register run_shell_command
+        for agent in [self.builder, self.tester, self.reporter, self.debugger]:
+            autogen.agentchat.register_function(
+                run_shell_command,
+                caller=agent,
+                executor=self.user_proxy,
+                name="run_shell_command",
+                description="Run a shell command in the sandbox"
+            )
+
+        # Register run_shell_commands_parallel
+        for agent in [self.builder, self.tester, self.debugger]:
+            autogen.agentchat.register_function(
+                run_shell_commands_parallel,
+                caller=agent,
+                executor=self.user_proxy,
+                name="run_shell_commands_parallel",
+                description="Run several independent shell commands (e.g. separate test suites or linters) "
+                            "concurrently in the sandbox. Only for commands that do not depend on each other."
+            )
+
+        # Register write_file
+        for agent in [self.builder, self.tester, self.debugger]:
+            autogen.agentchat.register_function(
+                write_file,
+                caller=agent,
+                executor=self.user_proxy,
+                name="write_file",
+                description="Write content to a file. Use this to create config files or fix code."
+            )
+
+        # Register search_code
+        for agent in [self.scanner, self.builder, self.tester, self.debugger]:
+            autogen.agentchat.register_function(
+                search_code,
+                caller=agent,
+                executor=self.user_proxy,
+                name="search_code",
+                description="Search the repository's code. Returns the most relevant snippets with file paths "
+                            "and line ranges. Query with identifiers, error messages or keywords."
+            )
+
+        # Register set_sandbox_image for Scanner
+        autogen.agentchat.register_function(
+            set_sandbox_image,
+            caller=self.scanner,
+            executor=self.user_proxy,
+            name="set_sandbox_image",
+            description="Set the Docker image for the sandbox (e.g., maven:3.8-openjdk-17)"
+        )
+
+    # --- Tools ---
+
+    def run_shell_command(self, command: str) -> str:
+        """
+        Executes a shell command in a secure sandbox environment.
+        The timeout adapts to how long similar commands took on this repository.
+        """
+        print(f">>> Executing in Sandbox: {command}")
+        logger.info(f"Sandbox: {command}")
+        # Runs in repo_path (mounted into the container); output is streamed and bounded
+        result = self.context.run_command(command)
+        return (
+            f"Exit code: {result.exit_code} ({self.context.describe_run(result)})\n"
+            f"Output ({self.context.describe_output(result)}):\n{result.output}"
+        )
+
+    def run_shell_commands_parallel(self, commands: list[str]) -> str:
+        """
+        Executes independent shell commands concurrently in the sandbox.
+        Returns each command's exit code, timing and output, in the given order.
+        """
+        commands = [c for c in commands if c and c.strip()]
+        if not commands:
+            return "No commands given"
+        logger.info(f"Executing {len(commands)} commands in parallel in Sandbox")
+        for i, command in enumerate(commands, 1):
+            logger.info(f"Sandbox [{i}]: {command}")
+        start = time.monotonic()
+        results = self.context.run_parallel(commands)
+        sections = [f"Ran {len(commands)} commands in parallel in {time.monotonic() - start:.1f}s "
+                    f"(sum of durations {sum(r.seconds for r in results):.1f}s)"]
+        for i, (command, result) in enumerate(zip(commands, results), 1):
+            sections.append(
+                f"[{i}] $ {command}\n"
+                f"Exit code: {result.exit_code} ({self.context.describe_run(result)})\n"
+                f"Output ({self.context.describe_output(result)}):\n{result.output}"
+            )
+        return "\n\n".join(sections)
+
+    def write_file(self, file_path: str, content: str) -> str:
+        """
+        Writes content to a file in the repository.
+        """
+        print(f">>> Writing to file: {file_path}")
+        # Ensure path is within repo_path
+        full_path = os.path.join(self.context.repo_path, file_path.lstrip('/'))
+
+        try:
+            # Ensure directory exists
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w') as f:
+                f.write(content)
+            if self.context.code_search:
+                self.context.code_search.refresh(os.path.relpath(full_path, self.context.repo_path))
+            return f"Successfully wrote to {file_path}"
+        except Exception as e:
+            return f"Error writing file: {str(e)}"
+
+    def search_code(self, query: str, top_k: int = Config.CODE_SEARCH_TOP_K) -> str:
+        """
+        Returns the chunks of the repository's code that best match `query`,
+        with their line ranges, instead of whole files.
+        """
+        logger.info(f"Code search: {query}")
+        if not self.context.code_search:
+            return "Code search is not available for this job; use run_shell_command (e.g. grep -rn) instead."
+        top_k = max(1, min(int(top_k or Config.CODE_SEARCH_TOP_K), 10))
+        return self.context.code_search.format(query, self.context.code_search.search(query, top_k))
+
+    def set_sandbox_image(self, image_name: str) -> str:
+        """
+        Sets the Docker image for the sandbox environment.
+        """
+        print(f">>> Setting Sandbox Image: {image_name}")
+        self.context.sandbox.set_image(image_name)
+        if not self.context.sandbox.image_ready():
+            return f"Sandbox image set to {image_name} (pulling in the background; the first command waits for it)"
+        return f"Sandbox image set to {image_name}"
+
+    # --- Model routing ---
+
+    def _route_debugger(self, messages):
+        """
+        Puts the Debugger on the strong model while DEBUGGER_ESCALATE_AFTER or more
+        of its fixes in a row were followed by a failing re-run of the stage (the
+        speaker selector's failed_fixes), and back on its default model once a stage passes.
+        """
+        failed = self.speaker_selector.failed_fixes
+        if failed >= Config.DEBUGGER_ESCALATE_AFTER:
+            if self.debugger.client is not self.debugger_escalated_client:
+                logger.info(f"Model routing: Debugger escalated to {self.escalated_models[0]} "
+                            f"after {failed} fixes that did not make the stage pass")
+                self.debugger.client = self.debugger_escalated_client
+                if self.context:
+                    self.context.note("Model routing", f"Debugger escalated to `{self.escalated_models[0]}` "
+                                                       f"after {failed} fixes that did not make the stage pass")
+        elif self.debugger.client is not self.debugger_default_client:
+            logger.info("Model routing: Debugger back on its default model")
+            self.debugger.client = self.debugger_default_client
+        return messages
+
+    # --- Lifecycle ---
+
+    def bind(self, context):
+        self.context = context
+        self.compactor.context = context
+        self.speaker_selector.stats = context.speaker_stats
+
+    def exclude(self, agent):
+        """Removes an agent from the GroupChat for the current job only (restored by reset())."""
+        self.groupchat.agents = [a for a in self.groupchat.agents if a is not agent]
+
+    def reset(self):
+        """Clears all conversation state so the next job starts fresh."""
+        self.groupchat.agents = list(self.agents)
+        self.groupchat.reset()
+        self.manager.reset()
+        for agent in self.agents:
+            agent.reset()
+        self.context = None
+        self.compactor.context = None
+        self.speaker_selector.reset()
+        self.speaker_selector.stats = SpeakerSelector.new_stats()
+        self.debugger.client = self.debugger_default_client
+
+class AgentTeamPool:
+    """
+    Pool of AgentTeams shared by the pipeline workers.
+    `size` teams are built up front; if more jobs run at once, extra teams
+    are built on demand and kept for reuse.
+    """
+    def __init__(self, llm_configs, size=1):
+        self.llm_configs = llm_configs
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        for _ in range(size):
+            self._idle.put(self._build())
+
+    def _build(self):
+        with self._lock:
+            self.created += 1
+            number = self.created
+        logger.info(f"Building agent team #{number}...")
+        return AgentTeam(self.llm_configs)
+
+    @contextmanager
+    def checkout(self, context):
+        """Yields a team bound to `context`; it is reset and returned to the pool afterwards."""
+        try:
+            team = self._idle.get_nowait()
+        except queue.Empty:
+            team = self._build()
+
+        team.bind(context)
+        try:
+            yield team
+        finally:
+            try:
+                team.reset()
+                self._idle.put(team)
+            except Exception as e:
+                # A team that cannot be reset is dropped; a new one is built on demand
+                logger.error(f"Discarding agent team after failed reset: {e}")
@@ -0,0 +1,425 @@
+import os
+import re
+import ast
+import json
+import shlex
+import fcntl
+import hashlib
+import logging
+from collections import deque
+from git import Repo, GitCommandError
+
+logger = logging.getLogger('[Orchestrator]')
+
+NULL_SHA = "0" * 40
+
+# Build, dependency and test-runner configuration: a change here can affect any test
+GLOBAL_FILES = re.compile(
+    r"(^|/)(requirements[^/]*\.txt|setup\.py|setup\.cfg|pyproject\.toml|Pipfile(\.lock)?|poetry\.lock|"
+    r"tox\.ini|pytest\.ini|conftest\.py|noxfile\.py|"
+    r"package(-lock)?\.json|yarn\.lock|pnpm-lock\.yaml|tsconfig[^/]*\.json|"
+    r"(jest|vitest|vite|babel|mocha|karma)\.config\.[^/]+|\.babelrc|\.mocharc[^/]*|"
+    r"go\.(mod|sum)|pom\.xml|build\.gradle(\.kts)?|settings\.gradle(\.kts)?|gradle\.properties|"
+    r"Cargo\.(toml|lock)|Dockerfile|Makefile)$"
+)
+# Files that never affect test results
+IGNORED_FILES = re.compile(
+    r"(^|/)(LICENSE|NOTICE|CHANGELOG|AUTHORS|CODEOWNERS)[^/]*$|^\.github/|^docs?/|"
+    r"\.(md|rst|adoc|txt|png|jpe?g|gif|svg|ico)$",
+    re.IGNORECASE,
+)
+
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+SOURCE_EXTENSIONS = (".py", ".go", ".java", ".kt") + JS_EXTENSIONS
+
+_JS_IMPORT = re.compile(
+    r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*|\bjest\.mock\s*\(\s*)['"](\.{1,2}/[^'"]*)['"]"""
+)
+_GO_IMPORT_BLOCK = re.compile(r"^import\s*\((.*?)^\)", re.MULTILINE | re.DOTALL)
+_GO_IMPORT_LINE = re.compile(r'^import\s+(?:[\w.]+\s+)?"([^"]+)"', re.MULTILINE)
+_GO_QUOTED = re.compile(r'"([^"]+)"')
+_JAVA_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)", re.MULTILINE)
+_JAVA_IMPORT = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+(?:\.\*)?)", re.MULTILINE)
+_JAVA_REF = re.compile(r"\b[A-Z]\w*\b")
+
+def _parse_python(path, text):
+    """Absolute module names imported by a Python file (`from a import b` gives both a and a.b)."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    package = path[:-3].replace('/', '.').split('.')
+    package = package[:-1]  # a module's own package, also for __init__.py
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level > 1 else package
+                base = '.'.join(base + ([node.module] if node.module else []))
+            else:
+                base = node.module or ""
+            if base:
+                modules.add(base)
+            modules.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names)
+    return sorted(modules)
+
+def _parse_js(path, text):
+    """Relative imports of a JS/TS file, as repo-relative paths without extension."""
+    directory = os.path.dirname(path)
+    return sorted({os.path.normpath(os.path.join(directory, spec)) for spec in _JS_IMPORT.findall(text)})
+
+def _parse_go(path, text):
+    imports = set(_GO_IMPORT_LINE.findall(text))
+    for block in _GO_IMPORT_BLOCK.findall(text):
+        imports.update(_GO_QUOTED.findall(block))
+    return sorted(imports)
+
+def _parse_java(path, text):
+    package = _JAVA_PACKAGE.search(text)
+    return {
+        "package": package.group(1) if package else "",
+        "imports": sorted(set(_JAVA_IMPORT.findall(text))),
+        "refs": sorted(set(_JAVA_REF.findall(text))),
+    }
+
+def parse_imports(path, text):
+    """Raw dependency data of one source file (resolved against the tree at selection time)."""
+    if path.endswith(".py"):
+        return _parse_python(path, text)
+    if path.endswith(JS_EXTENSIONS):
+        return _parse_js(path, text)
+    if path.endswith(".go"):
+        return _parse_go(path, text)
+    if path.endswith((".java", ".kt")):
+        return _parse_java(path, text)
+    return []
+
+def is_test_file(path):
+    name = os.path.basename(path)
+    if path.endswith(".py"):
+        return name.startswith("test_") or name.endswith("_test.py")
+    if path.endswith(JS_EXTENSIONS):
+        return bool(re.search(r"\.(test|spec)\.[^.]+$", name)) or "/__tests__/" in f"/{path}"
+    if path.endswith(".go"):
+        return name.endswith("_test.go")
+    if path.endswith((".java", ".kt")):
+        return "src/test/" in path
+    return False
+
+def _unit(path):
+    """What is selected for a file: Go tests run per package (directory), others per file."""
+    return os.path.dirname(path) or "." if path.endswith(".go") else path
+
+class PushedChange:
+    """What a push changed, from the webhook: the commit range and, if known, the pushed file list."""
+    def __init__(self, before, after, files=None, full_reason=None):
+        self.before = before
+        self.after = after
+        self.files = files  # [(status, path)] from the payload, or None if it is incomplete
+        self.full_reason = full_reason  # set when a full test run was requested
+        self.selection = None  # the Selection made for it, once the stack is known
+
+def changed_files(repo_path, change):
+    """
+    Files changed by the push as ([(status, path)], source), diffing
+    before..after in the checkout. Falls back to the webhook's file list when
+    the base commit is not available. Returns (None, reason) if neither works.
+    """
+    if change.before and change.before != NULL_SHA:
+        try:
+            repo = Repo(repo_path)
+            try:
+                repo.git.cat_file('-e', f"{change.before}^{{commit}}")
+            except GitCommandError:
+                # Shallow or partial checkout without the base: trees are enough for a name diff
+                repo.git.fetch('--depth=1', 'origin', change.before)
+            output = repo.git.diff('--name-status', '--no-renames', change.before, change.after)
+            files = []
+            for line in output.splitlines():
+                status, _, path = line.partition('\t')
+                if path:
+                    files.append((status[:1], path))
+            return files, f"git diff {change.before[:7]}..{change.after[:7]}"
+        except GitCommandError as e:
+            logger.info(f"Test selection: Cannot diff {change.before[:7]}..{change.after[:7]}: {e}")
+    if change.files is not None:
+        return list(change.files), "files listed in the push"
+    if not change.before or change.before == NULL_SHA:
+        return None, "new branch, no base commit to compare against"
+    return None, "base commit unavailable and the push did not list its files"
+
+class Selection:
+    """The tests chosen for one job and why."""
+    def __init__(self, full, reason, changed=(), tests=None, commands=None, source=None):
+        self.full = full
+        self.reason = reason
+        self.changed = list(changed)
+        self.tests = tests or {}  # test path (or Go package) -> why it was selected
+        self.commands = commands or []
+        self.source = source
+
+    def summary(self):
+        if self.full:
+            return f"full test run ({self.reason})"
+        if not self.tests:
+            return f"no tests affected by {len(self.changed)} changed files ({self.source})"
+        return f"{len(self.tests)} tests selected for {len(self.changed)} changed files ({self.source})"
+
+    def details(self, limit=50):
+        """Markdown list of the selected tests and why."""
+        lines = [f"- `{test}`: {why}" for test, why in sorted(self.tests.items())[:limit]]
+        if len(self.tests) > limit:
+            lines.append(f"- ... and {len(self.tests) - limit} more")
+        return "\n".join(lines)
+
+class TestSelector:
+    """
+    Picks the tests affected by a push.
+
+    A per-repository import index (`<index_dir>/<key>.json`) maps every source
+    file to its raw imports. It is kept between jobs and only files whose git
+    blob changed are parsed again. Tests reached by following imports backwards
+    from the changed files are selected. Changes to build or test configuration,
+    deleted sources and unknown file types fall back to the full run, as does
+    every `full_every`-th selective run of a repository.
+    """
+    VERSION = 1
+
+    def __init__(self, index_dir, full_every=10, shards=1):
+        self.index_dir = index_dir
+        self.full_every = full_every
+        self.shards = max(1, shards)
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _key(self, repo_url):
+        name = repo_url.rstrip('/').split('/')[-1] or "repo"
+        return f"{name}-{hashlib.sha256(repo_url.encode()).hexdigest()[:12]}"
+
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {"version": self.VERSION, "files": {}, "selective_runs": 0}
+
+    def _save(self, path, data):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _update_index(self, repo_path, index):
+        """Re-parses files whose blob changed since the cached index. Returns how many were parsed."""
+        blobs = {}
+        for line in Repo(repo_path).git.ls_files('-s').splitlines():
+            meta, _, path = line.partition('\t')
+            if path.endswith(SOURCE_EXTENSIONS):
+                blobs[path] = meta.split()[1]
+        old = index["files"]
+        files, parsed = {}, 0
+        for path, blob in blobs.items():
+            if path in old and old[path][0] == blob:
+                files[path] = old[path]
+                continue
+            try:
+                with open(os.path.join(repo_path, path), errors='replace') as f:
+                    files[path] = [blob, parse_imports(path, f.read())]
+                parsed += 1
+            except OSError:
+                continue  # not checked out (sparse)
+        index["files"] = files
+        return parsed
+
+    def select(self, repo_path, repo_url, stack, change):
+        """Returns a Selection for `stack` (an agents.stack_detector.Stack) and a PushedChange."""
+        if change.full_reason:
+            return Selection(True, change.full_reason)
+        language = _LANGUAGES.get(stack.name)
+        if language is None:
+            return Selection(True, f"selection not supported for {stack.name}")
+
+        changed, source = changed_files(repo_path, change)
+        if changed is None:
+            return Selection(True, source)
+
+        relevant = []
+        for status, path in changed:
+            if GLOBAL_FILES.search(path):
+                return Selection(True, f"`{path}` affects every test", changed, source=source)
+            if IGNORED_FILES.search(path):
+                continue
+            if not path.endswith(SOURCE_EXTENSIONS):
+                return Selection(True, f"`{path}` is not a source file the index understands", changed, source=source)
+            if status == "D":
+                return Selection(True, f"`{path}` was deleted", changed, source=source)
+            relevant.append(path)
+
+        path = os.path.join(self.index_dir, f"{self._key(repo_url)}.json")
+        with open(f"{path}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._load(path)
+            if self.full_every and index["selective_runs"] + 1 >= self.full_every:
+                index["selective_runs"] = 0
+                self._save(path, index)
+                return Selection(True, f"periodic full run (every {self.full_every} runs)", changed, source=source)
+            parsed = self._update_index(repo_path, index)
+            index["selective_runs"] += 1
+            self._save(path, index)
+        logger.info(f"Test selection: Import index has {len(index['files'])} files ({parsed} parsed this run)")
+
+        tests = _affected_tests(index["files"], relevant, language)
+        commands = language.commands(stack, sorted(tests), self.shards) if tests else []
+        return Selection(False, "changed files", changed, tests, commands, source)
+
+def _affected_tests(files, changed, language):
+    """Test units reached from the changed files by following imports backwards, with the reason."""
+    graph = language.graph(files)  # unit -> units it depends on
+    dependents = {}
+    for unit, deps in graph.items():
+        for dep in deps:
+            dependents.setdefault(dep, set()).add(unit)
+
+    test_units = {_unit(p) for p in files if is_test_file(p)}
+    origin = {}  # unit -> (changed file it was reached from, unit it imports on the way)
+    queue = deque()
+    for path in changed:
+        unit = _unit(path)
+        if unit not in origin:
+            origin[unit] = (path, None)
+            queue.append(unit)
+    while queue:
+        unit = queue.popleft()
+        for dependent in dependents.get(unit, ()):
+            if dependent not in origin:
+                origin[dependent] = (origin[unit][0], unit)
+                queue.append(dependent)
+
+    tests = {}
+    for unit, (source, via) in origin.items():
+        if unit not in test_units:
+            continue
+        if via is None:
+            tests[unit] = "changed"
+        elif via == _unit(source):
+            tests[unit] = f"imports `{source}`"
+        else:
+            tests[unit] = f"depends on `{source}` (via `{via}`)"
+    return tests
+
+def _shard(items, count):
+    count = max(1, min(count, len(items)))
+    return [items[i::count] for i in range(count)]
+
+class _Python:
+    @staticmethod
+    def graph(files):
+        modules = {}
+        for path in files:
+            if not path.endswith(".py"):
+                continue
+            parts = path[:-3].split('/')
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            # Importable from the root and from a src/ or lib/ layout
+            for start in range(0, min(2, len(parts))):
+                if start and parts[0] not in ("src", "lib"):
+                    break
+                modules.setdefault('.'.join(parts[start:]), path)
+        return {path: {modules[m] for m in data[1] if m in modules and modules[m] != path}
+                for path, data in files.items() if path.endswith(".py")}
+
+    @staticmethod
+    def commands(stack, tests, shards):
+        base = stack.test_commands[0] if stack.test_commands else "python -m pytest -q"
+        return [f"{base} {' '.join(shlex.quote(t) for t in group)}" for group in _shard(tests, shards)]
+
+class _Node:
+    @staticmethod
+    def graph(files):
+        graph = {}
+        for path, data in files.items():
+            if not path.endswith(JS_EXTENSIONS):
+                continue
+            deps = set()
+            for spec in data[1]:
+                candidates = [spec] + [spec + ext for ext in JS_EXTENSIONS] + \
+                             [f"{spec}/index{ext}" for ext in JS_EXTENSIONS]
+                deps.update(c for c in candidates if c in files)
+            graph[path] = deps
+        return graph
+
+    @staticmethod
+    def commands(stack, tests, shards):
+        base = stack.test_commands[0] if stack.test_commands else "npm test"
+        return [f"{base} -- {' '.join(shlex.quote(t) for t in group)}" for group in _shard(tests, shards)]
+
+class _Go:
+    @staticmethod
+    def graph(files):
+        units = {_unit(p) for p in files if p.endswith(".go")} - {"."}
+        graph = {}
+        for path, data in files.items():
+            if not path.endswith(".go"):
+                continue
+            deps = graph.setdefault(_unit(path), set())
+            for imported in data[1]:
+                # Module-local import paths end with the package's directory in the tree
+                deps.update(u for u in units if imported == u or imported.endswith("/" + u))
+        for unit, deps in graph.items():
+            deps.discard(unit)
+        return graph
+
+    @staticmethod
+    def commands(stack, tests, shards):
+        packages = ["./" + t if t != "." else "." for t in tests]
+        return [f"go test {' '.join(group)}" for group in _shard(packages, shards)]
+
+class _Java:
+    @staticmethod
+    def _class_name(path, data):
+        name = os.path.splitext(os.path.basename(path))[0]
+        return f"{data[1]['package']}.{name}" if data[1]["package"] else name
+
+    @staticmethod
+    def graph(files):
+        classes = {}
+        for path, data in files.items():
+            if path.endswith((".java", ".kt")):
+                classes[_Java._class_name(path, data)] = path
+        graph = {}
+        for path, data in files.items():
+            if not path.endswith((".java", ".kt")):
+                continue
+            info = data[1]
+            packages = [info["package"]] + [i[:-2] for i in info["imports"] if i.endswith(".*")]
+            deps = {classes[i] for i in info["imports"] if i in classes}
+            for ref in info["refs"]:
+                for package in packages:
+                    target = classes.get(f"{package}.{ref}" if package else ref)
+                    if target:
+                        deps.add(target)
+            deps.discard(path)
+            graph[path] = deps
+        return graph
+
+    @staticmethod
+    def commands(stack, tests, shards):
+        # Maven and Gradle share the build directory, so test classes are not sharded
+        names = [os.path.splitext(os.path.basename(t))[0] for t in tests]
+        if stack.name == "Java (Maven)":
+            return [f"mvn -B test -Dtest={','.join(names)} -Dsurefire.failIfNoSpecifiedTests=false"]
+        gradle = stack.test_commands[0].split()[0] if stack.test_commands else "gradle"
+        return [f"{gradle} test " + ' '.join(f"--tests '*.{n}'" for n in names)]
+
+_LANGUAGES = {
+    "Python": _Python,
+    "Node.js": _Node,
+    "Go": _Go,
+    "Java (Maven)": _Java,
+    "Java (Gradle)": _Java,
+}
@@ -17,6 +17,8 @@ class TesterAgent(autogen.AssistantAgent):
            - Print "Status Code: ..." and "Response: ..." for API tests.
            - Print "✅ [Test Name] Passed" or "❌ Failed" explicitly.
         
+        To see how the code works, use `search_code(query)` instead of printing whole files.
+        
         You MUST call the `run_shell_command` function to execute the commands.
         Do NOT just list the commands. Execute them.
         
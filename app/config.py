@@ -35,3 +35,172 @@ class Config:
     OPENAI_API_KEY = get_secret('OPENAI_API_KEY', '')
     GEMINI_API_KEY = get_secret('GEMINI_API_KEY', '')
     DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 't')
+
+    # Job queue: number of pipelines run concurrently, and how many may wait
+    # before webhooks are rejected with 429.
+    WORKER_POOL_SIZE = int(os.getenv('WORKER_POOL_SIZE', '2'))
+    JOB_QUEUE_MAX_SIZE = int(os.getenv('JOB_QUEUE_MAX_SIZE', '50'))
+    JOB_QUEUE_RETRY_AFTER = int(os.getenv('JOB_QUEUE_RETRY_AFTER', '60'))
+    # Only the gunicorn worker holding this lock runs the pool (one per host)
+    JOB_QUEUE_LOCK_PATH = os.getenv('JOB_QUEUE_LOCK_PATH', '/tmp/ai-ci-cache/job-queue.lock')
+
+    # Persistent bare-mirror cache for clones. Every REPO_CACHE_EVICT_INTERVAL
+    # seconds a background pass evicts mirrors LRU once the cache grows past
+    # REPO_CACHE_MAX_BYTES, and repacks (git gc) each mirror every
+    # REPO_CACHE_GC_INTERVAL seconds (0 disables).
+    REPO_CACHE_ENABLED = os.getenv('REPO_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    REPO_CACHE_DIR = os.getenv('REPO_CACHE_DIR', '/tmp/ai-ci-cache/repos')
+    REPO_CACHE_MAX_BYTES = int(os.getenv('REPO_CACHE_MAX_BYTES', str(10 * 1024 ** 3)))
+    REPO_CACHE_GC_INTERVAL = int(os.getenv('REPO_CACHE_GC_INTERVAL', str(24 * 3600)))
+    REPO_CACHE_EVICT_INTERVAL = int(os.getenv('REPO_CACHE_EVICT_INTERVAL', '600'))
+
+    # Repository structure summary for the agents' prompt, cut to this many
+    # tokens. Tree listings are cached by git tree hash in REPO_INDEX_PATH.
+    REPO_STRUCTURE_TOKEN_BUDGET = int(os.getenv('REPO_STRUCTURE_TOKEN_BUDGET', '1500'))
+    REPO_INDEX_PATH = os.getenv('REPO_INDEX_PATH', '/tmp/ai-ci-cache/repo_index.sqlite3')
+    REPO_INDEX_MAX_BYTES = int(os.getenv('REPO_INDEX_MAX_BYTES', str(256 * 1024 ** 2)))
+
+    # Code search for the agents (`search_code` tool). The checked-out code is
+    # split into chunks of about CODE_INDEX_CHUNK_LINES lines and indexed per
+    # repository in CODE_INDEX_DIR (BM25, no network); between commits only
+    # changed files are indexed again. With CODE_INDEX_EMBEDDING_MODEL (a local
+    # sentence-transformers model name or path) and chromadb installed, chunks
+    # are also embedded and both rankings are merged.
+    CODE_INDEX_ENABLED = os.getenv('CODE_INDEX_ENABLED', 'True').lower() in ('true', '1', 't')
+    CODE_INDEX_DIR = os.getenv('CODE_INDEX_DIR', '/tmp/ai-ci-cache/code-index')
+    CODE_INDEX_CHUNK_LINES = int(os.getenv('CODE_INDEX_CHUNK_LINES', '60'))
+    CODE_INDEX_MAX_FILE_BYTES = int(os.getenv('CODE_INDEX_MAX_FILE_BYTES', str(512 * 1024)))
+    CODE_INDEX_EMBEDDING_MODEL = os.getenv('CODE_INDEX_EMBEDDING_MODEL', '')
+    CODE_SEARCH_TOP_K = int(os.getenv('CODE_SEARCH_TOP_K', '5'))
+
+    # Job log sink: lines are buffered and inserted in batches of
+    # LOG_BATCH_SIZE or every LOG_FLUSH_INTERVAL_MS, whichever comes first.
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '200'))
+    LOG_FLUSH_INTERVAL_MS = int(os.getenv('LOG_FLUSH_INTERVAL_MS', '250'))
+    LOG_QUEUE_MAX_SIZE = int(os.getenv('LOG_QUEUE_MAX_SIZE', '10000'))
+
+    # Database. Any SQLAlchemy URL; use postgresql://... to run several
+    # gunicorn workers against one store. Pool settings apply to PostgreSQL.
+    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///ci.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+    # Identify the stack from manifest files and only ask the LLM Scanner when ambiguous
+    STACK_DETECTION_ENABLED = os.getenv('STACK_DETECTION_ENABLED', 'True').lower() in ('true', '1', 't')
+
+    # Fast mode: for detected stacks, run build/test directly and only start the
+    # agent GroupChat when a step fails or no tests exist.
+    FAST_MODE_ENABLED = os.getenv('FAST_MODE_ENABLED', 'True').lower() in ('true', '1', 't')
+    FAST_MODE_STEP_TIMEOUT = int(os.getenv('FAST_MODE_STEP_TIMEOUT', '900'))
+    # Write the green-path report with one Reporter call (False: template, zero calls)
+    FAST_MODE_LLM_REPORT = os.getenv('FAST_MODE_LLM_REPORT', 'True').lower() in ('true', '1', 't')
+
+    # Agent GroupChat speakers are picked by rules from the task list; the LLM
+    # selector is only asked in unexpected states. A failing stage gets at most
+    # SPEAKER_MAX_DEBUG_ROUNDS Debugger turns before the chat moves on.
+    SPEAKER_SELECTION_RULES = os.getenv('SPEAKER_SELECTION_RULES', 'True').lower() in ('true', '1', 't')
+    SPEAKER_MAX_DEBUG_ROUNDS = int(os.getenv('SPEAKER_MAX_DEBUG_ROUNDS', '3'))
+
+    # Model routing: Scanner, Reporter and the GroupChat's speaker selection use
+    # LLM_MODEL_FAST; Builder, Tester and Debugger use LLM_MODEL. After
+    # DEBUGGER_ESCALATE_AFTER Debugger fixes in a row that left the stage failing,
+    # the Debugger switches to LLM_MODEL_STRONG (until a stage passes). A request
+    # that times out (LLM_REQUEST_TIMEOUT seconds) or fails moves on to the next
+    # model of LLM_MODEL_FALLBACKS. LLM_FAST_BASE_URL
+    # and LLM_FAST_API_KEY point the fast tier at another OpenAI-compatible
+    # endpoint, e.g. a local model server.
+    LLM_BASE_URL = os.getenv('LLM_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta/openai/')
+    LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    LLM_MODEL_FAST = os.getenv('LLM_MODEL_FAST', 'gemini-2.5-flash-lite')
+    LLM_MODEL_STRONG = os.getenv('LLM_MODEL_STRONG', 'gemini-2.5-pro')
+    LLM_MODEL_FALLBACKS = [m.strip() for m in os.getenv('LLM_MODEL_FALLBACKS', 'gemini-2.0-flash').split(',') if m.strip()]
+    LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '120'))
+    LLM_FAST_BASE_URL = os.getenv('LLM_FAST_BASE_URL', '')
+    LLM_FAST_API_KEY = os.getenv('LLM_FAST_API_KEY', '')
+    DEBUGGER_ESCALATE_AFTER = int(os.getenv('DEBUGGER_ESCALATE_AFTER', '2'))
+
+    # LLM gateway shared by all jobs: one pooled HTTP client per endpoint.
+    # Requests and tokens per minute are limited with token buckets (0 means
+    # unlimited) and at most LLM_MAX_CONCURRENT requests are in flight; waiting
+    # requests are served round-robin across jobs. 429 and 5xx responses are
+    # retried up to LLM_MAX_RETRIES times with jittered exponential backoff.
+    # Limits are per host (one process runs the jobs); split the provider's
+    # quota between hosts when running several.
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '300'))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '1000000'))
+    LLM_MAX_CONCURRENT = int(os.getenv('LLM_MAX_CONCURRENT', '8'))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '1.0'))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '60'))
+
+    # LLM response cache for temperature-0 calls, keyed by model, temperature and messages
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '/tmp/ai-ci-cache/llm_cache.sqlite3')
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(1024 ** 3)))
+
+    # Token budget for the chat history an agent sends per LLM call. Older tool
+    # outputs are summarized or stubbed to fit; the newest CONTEXT_KEEP_RECENT
+    # messages are sent as is. Full outputs are kept under ARTIFACTS_DIR/<job id>.
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '24000'))
+    CONTEXT_KEEP_RECENT = int(os.getenv('CONTEXT_KEEP_RECENT', '4'))
+    ARTIFACTS_DIR = os.getenv('ARTIFACTS_DIR', '/tmp/ai-ci-artifacts')
+    ARTIFACTS_KEEP_JOBS = int(os.getenv('ARTIFACTS_KEEP_JOBS', '200'))
+
+    # Sandbox output capture: only the first/last lines and error lines of a
+    # command's output are kept in memory and returned to the agents; the full
+    # output is written under ARTIFACTS_DIR. At most SANDBOX_LIVE_LOG_LINES
+    # lines per command are copied to the job log while it runs.
+    SANDBOX_OUTPUT_HEAD_LINES = int(os.getenv('SANDBOX_OUTPUT_HEAD_LINES', '50'))
+    SANDBOX_OUTPUT_TAIL_LINES = int(os.getenv('SANDBOX_OUTPUT_TAIL_LINES', '150'))
+    SANDBOX_OUTPUT_ERROR_LINES = int(os.getenv('SANDBOX_OUTPUT_ERROR_LINES', '50'))
+    SANDBOX_LIVE_LOG_LINES = int(os.getenv('SANDBOX_LIVE_LOG_LINES', '2000'))
+
+    # Run agent commands in Docker. Each job gets one container (commands use
+    # docker exec); SANDBOX_WARM_POOL_SIZE containers per SANDBOX_WARM_IMAGES
+    # image are kept started so jobs do not wait for container creation (only
+    # in Docker-outside-of-Docker mode, see ContainerPool).
+    SANDBOX_USE_DOCKER = os.getenv('SANDBOX_USE_DOCKER', 'False').lower() in ('true', '1', 't')
+    SANDBOX_WARM_IMAGES = [i.strip() for i in os.getenv('SANDBOX_WARM_IMAGES', 'python:3.11,maven:3.8-openjdk-17,node:18').split(',') if i.strip()]
+    SANDBOX_WARM_POOL_SIZE = int(os.getenv('SANDBOX_WARM_POOL_SIZE', '1'))
+    # Images pulled in the background at startup (the images stack detection picks)
+    SANDBOX_PREPULL_IMAGES = [i.strip() for i in os.getenv(
+        'SANDBOX_PREPULL_IMAGES',
+        'python:3.11,maven:3.8-openjdk-17,node:18,gradle:8-jdk17,golang:1.22,rust:1.79',
+    ).split(',') if i.strip()]
+
+    # Shared package caches (pip, Maven, npm, Gradle, Go, Cargo) mounted into
+    # Docker sandboxes as named volumes; each is trimmed to DEP_CACHE_MAX_BYTES
+    # every DEP_CACHE_EVICT_INTERVAL seconds, in a DEP_CACHE_HELPER_IMAGE container.
+    DEP_CACHE_ENABLED = os.getenv('DEP_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    DEP_CACHE_MAX_BYTES = int(os.getenv('DEP_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+    DEP_CACHE_LOCK_DIR = os.getenv('DEP_CACHE_LOCK_DIR', '/tmp/ai-ci-cache/deps')
+    DEP_CACHE_EVICT_INTERVAL = int(os.getenv('DEP_CACHE_EVICT_INTERVAL', '600'))
+    DEP_CACHE_HELPER_IMAGE = os.getenv('DEP_CACHE_HELPER_IMAGE', 'debian:bookworm-slim')
+
+    # Sandbox command timeouts are learned per repository from past durations
+    # (defaults per image family until there is history), clamped to this range.
+    SANDBOX_TIMEOUT_MIN = int(os.getenv('SANDBOX_TIMEOUT_MIN', '30'))
+    SANDBOX_TIMEOUT_MAX = int(os.getenv('SANDBOX_TIMEOUT_MAX', '3600'))
+    # Per-container limits (Docker mode). By default each job gets an equal share
+    # of the host CPUs across WORKER_POOL_SIZE concurrent jobs.
+    SANDBOX_CPUS = float(os.getenv('SANDBOX_CPUS', str(max(1, (os.cpu_count() or 1) // max(WORKER_POOL_SIZE, 1)))))
+    SANDBOX_MEMORY = os.getenv('SANDBOX_MEMORY', '4g')
+    SANDBOX_PIDS_LIMIT = int(os.getenv('SANDBOX_PIDS_LIMIT', '1024'))
+    # Without Docker, optionally apply SANDBOX_MEMORY (data segment) and CPU seconds
+    # (timeout x SANDBOX_CPUS) as per-process ulimits of each command. Off by default.
+    SANDBOX_LOCAL_LIMITS = os.getenv('SANDBOX_LOCAL_LIMITS', 'false').lower() == 'true'
+    # At most this many commands of one run_shell_commands_parallel call (or the
+    # fast-mode test stage) run at the same time in a job's sandbox.
+    SANDBOX_PARALLEL_MAX = int(os.getenv('SANDBOX_PARALLEL_MAX', str(max(2, min(4, int(SANDBOX_CPUS))))))
+
+    # Change-aware test selection: only tests reached through imports from the
+    # pushed changes run. Every TEST_SELECTION_FULL_EVERY-th selective run of a
+    # repository (and pushes with "[ci full]" in the head commit message) run all
+    # tests. Selected tests are split into TEST_SHARDS commands run in parallel.
+    TEST_SELECTION_ENABLED = os.getenv('TEST_SELECTION_ENABLED', 'True').lower() in ('true', '1', 't')
+    TEST_SELECTION_FULL_EVERY = int(os.getenv('TEST_SELECTION_FULL_EVERY', '10'))
+    TEST_INDEX_DIR = os.getenv('TEST_INDEX_DIR', '/tmp/ai-ci-cache/test-index')
+    TEST_SHARDS = int(os.getenv('TEST_SHARDS', '1'))
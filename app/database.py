@@ -0,0 +1,89 @@
+import os
+import logging
+from sqlalchemy import event
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# Arbitrary constant used as the PostgreSQL advisory lock key while migrating
+MIGRATION_LOCK_ID = 74210193
+
+def database_url(url=None):
+    """
+    Returns the SQLAlchemy URL from Config.
+    Heroku/Render style 'postgres://' URLs are rewritten to 'postgresql://'.
+    """
+    url = url or Config.DATABASE_URL
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured backend."""
+    url = database_url(url)
+    if url.startswith('sqlite'):
+        # Writers wait for the lock instead of failing with 'database is locked'
+        return {
+            "connect_args": {"timeout": Config.SQLITE_BUSY_TIMEOUT_MS / 1000.0},
+        }
+    return {
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def configure_engine(engine):
+    """Per-connection tuning. For SQLite: WAL journal, synchronous=NORMAL and a busy timeout."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.close()
+
+def _alembic_config(connection):
+    from alembic.config import Config as AlembicConfig
+    cfg = AlembicConfig()
+    cfg.set_main_option('script_location', MIGRATIONS_DIR)
+    cfg.attributes['connection'] = connection
+    return cfg
+
+def upgrade_database(db):
+    """
+    Brings the schema up to the latest migration. Must run inside an app context.
+
+    Databases created before migrations existed (by db.create_all) are
+    patched with upgrade_schema() and stamped at head instead of re-created.
+    On PostgreSQL an advisory lock serializes concurrent gunicorn workers.
+    """
+    from alembic import command
+    from app.models import upgrade_schema
+
+    engine = db.engine
+    with engine.connect() as connection:
+        if engine.dialect.name == 'postgresql':
+            connection.execute(db.text(f"SELECT pg_advisory_lock({MIGRATION_LOCK_ID})"))
+        try:
+            cfg = _alembic_config(connection)
+            inspector = db.inspect(connection)
+            if inspector.has_table('job') and not inspector.has_table('alembic_version'):
+                logger.info("Database: Existing schema without migration history, stamping head.")
+                connection.commit()
+                db.create_all()
+                upgrade_schema()
+                command.stamp(cfg, 'head')
+            else:
+                command.upgrade(cfg, 'head')
+            connection.commit()
+        finally:
+            if engine.dialect.name == 'postgresql':
+                connection.execute(db.text(f"SELECT pg_advisory_unlock({MIGRATION_LOCK_ID})"))
+                connection.commit()
@@ -0,0 +1,166 @@
+import os
+import fcntl
+import socket
+import threading
+import logging
+from app.models import db, Job
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Durable job queue backed by the Job table.
+    Webhooks insert rows with status 'queued'; a fixed pool of worker threads
+    claims them oldest-first, flips them to 'running' and runs the pipeline.
+    Because the queue lives in the database, queued jobs survive a restart.
+
+    Only one process per host runs the workers: with `lock_path`, start()
+    takes an exclusive flock on it, and the other gunicorn workers only
+    enqueue (checking every `poll_interval` whether they should take over),
+    so at most `size` pipelines run on the host. The process that gets the
+    lock puts jobs left 'running' on this host by a crashed process back to
+    'queued'.
+    """
+    def __init__(self, app, task, size=2, max_queued=50, poll_interval=5.0, lock_path=None, on_start=None):
+        self.app = app
+        self.task = task
+        self.size = max(1, size)
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+        self.lock_path = lock_path
+        self.on_start = on_start  # called in the process that runs the workers, before they start
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}:{os.getpid()}"
+        self._lock_file = None
+        self._wakeup = threading.Condition()
+        self._claim_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._workers = []
+        self._standby = None
+
+    @property
+    def is_runner(self):
+        """Whether this process runs the worker pool."""
+        return bool(self._workers)
+
+    def _try_lock(self):
+        if not self.lock_path:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file  # held for the life of the process
+        return True
+
+    def start(self):
+        """
+        Starts the worker pool if no other process on this host runs it; otherwise
+        waits in the background to take over. Jobs left 'queued' by a previous
+        process are picked up first.
+        """
+        if self._workers or self._standby:
+            return
+        if self._try_lock():
+            self._start_workers()
+            return
+        logger.info("JobQueue: Another process runs the workers; this one only enqueues.")
+        self._standby = threading.Thread(target=self._standby_loop, name="ci-queue-standby", daemon=True)
+        self._standby.start()
+
+    def _standby_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            if self._try_lock():
+                logger.info("JobQueue: Taking over the workers.")
+                self._start_workers()
+                return
+
+    def requeue_stale(self):
+        """
+        Puts jobs left 'running' on this host back to 'queued'. Only called while
+        holding the host lock, so no live process on this host is running them.
+        """
+        with self.app.app_context():
+            stale = (Job.query.filter(Job.status == "running",
+                                      db.or_(Job.claimed_by.is_(None), Job.claimed_by.like(f"{self.host}:%")))
+                     .update({"status": "queued", "claimed_by": None}, synchronize_session=False))
+            db.session.commit()
+        if stale:
+            logger.warning(f"JobQueue: Requeued {stale} job(s) left running by a process that stopped.")
+        return stale
+
+    def _start_workers(self):
+        self.requeue_stale()
+        with self.app.app_context():
+            pending = Job.query.filter_by(status="queued").count()
+        if pending:
+            logger.info(f"JobQueue: Resuming {pending} queued job(s) from a previous run.")
+        if self.on_start:
+            self.on_start()
+
+        for i in range(self.size):
+            worker = threading.Thread(target=self._worker_loop, name=f"ci-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"JobQueue: Started {self.size} worker(s).")
+
+    def stop(self):
+        """Signals workers to exit once their current job finishes."""
+        self._stop.set()
+        self.notify()
+
+    def notify(self):
+        """Wakes idle workers after a new job has been committed."""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def depth(self):
+        """Number of jobs waiting for a worker."""
+        return Job.query.filter_by(status="queued").count()
+
+    def is_full(self):
+        return self.max_queued > 0 and self.depth() >= self.max_queued
+
+    def _claim_next(self):
+        """
+        Atomically moves the oldest queued job to 'running'.
+        The conditional UPDATE makes the claim safe across processes sharing the database.
+        Returns the pipeline arguments, or None if nothing is queued.
+        """
+        with self._claim_lock, self.app.app_context():
+            while True:
+                job = (Job.query.filter_by(status="queued")
+                       .order_by(Job.created_at, Job.id)
+                       .first())
+                if not job:
+                    return None
+
+                claimed = (Job.query.filter_by(id=job.id, status="queued")
+                           .update({"status": "running", "claimed_by": self.owner}, synchronize_session=False))
+                db.session.commit()
+                if claimed:
+                    return (job.repo_url, job.commit_sha, job.pusher, job.branch, job.id)
+                # Another process won the race for this row; try the next one.
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job_args = self._claim_next()
+            except Exception as e:
+                logger.error(f"JobQueue: Failed to claim job: {e}")
+                job_args = None
+
+            if job_args is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.poll_interval)
+                continue
+
+            job_id = job_args[-1]
+            logger.info(f"[{job_id}] JobQueue: Claimed by {threading.current_thread().name}")
+            try:
+                self.task(*job_args)
+            except Exception as e:
+                logger.error(f"[{job_id}] JobQueue: Worker crashed: {e}")
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict, deque
+
+class _JobBuffer:
+    """Ring buffer of the most recent committed log lines of one job."""
+    def __init__(self, size):
+        self.lines = deque(maxlen=size)
+        self.evicted_upto = 0  # highest log id that fell out of the buffer
+        self.closed = False
+
+class LogBroker:
+    """
+    In-memory fan-out of committed job log lines to live subscribers (SSE).
+
+    The LogWriter publishes each batch after it is committed, so every line
+    carries its database id and clients can switch between the stream and
+    `GET /api/jobs/<id>/logs?after_id=` without gaps or duplicates.
+    Only the last `buffer_size` lines per job and `max_jobs` jobs are kept;
+    readers that fall behind are told to backfill from the database.
+    """
+    def __init__(self, buffer_size=2000, max_jobs=100):
+        self.buffer_size = buffer_size
+        self.max_jobs = max_jobs
+        self._buffers = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _buffer(self, job_id):
+        buf = self._buffers.get(job_id)
+        if buf is None:
+            buf = self._buffers[job_id] = _JobBuffer(self.buffer_size)
+            if len(self._buffers) > self.max_jobs:
+                self._drop_oldest()
+        return buf
+
+    def _drop_oldest(self):
+        # Prefer finished jobs; their lines are all in the database anyway
+        for job_id, buf in self._buffers.items():
+            if buf.closed:
+                del self._buffers[job_id]
+                return
+        self._buffers.popitem(last=False)
+
+    def publish(self, job_id, lines):
+        """Appends committed lines (dicts with an 'id') and wakes subscribers."""
+        with self._cond:
+            buf = self._buffer(job_id)
+            for line in lines:
+                if len(buf.lines) == buf.lines.maxlen:
+                    buf.evicted_upto = buf.lines[0]["id"]
+                buf.lines.append(line)
+            self._cond.notify_all()
+
+    def close(self, job_id):
+        """Marks a job as finished so streams end once they have drained it."""
+        with self._cond:
+            if job_id in self._buffers:
+                self._buffers[job_id].closed = True
+            self._cond.notify_all()
+
+    def wait(self, job_id, after_id, timeout):
+        """
+        Waits up to timeout seconds for lines newer than after_id.
+        Returns None if the job is not live in this process, otherwise
+        (lines, missed, closed) where `missed` means lines after after_id
+        were already evicted and must be read from the database.
+        """
+        with self._cond:
+            buf = self._buffers.get(job_id)
+            if buf is None:
+                return None
+            if not buf.closed and not (buf.lines and buf.lines[-1]["id"] > after_id):
+                self._cond.wait(timeout)
+                buf = self._buffers.get(job_id)
+                if buf is None:
+                    return None
+            missed = after_id < buf.evicted_upto
+            lines = [line for line in buf.lines if line["id"] > after_id]
+            return lines, missed, buf.closed
+
+# Process-wide broker fed by app.log_writer.log_writer
+log_broker = LogBroker()
@@ -0,0 +1,166 @@
+import queue
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from app.models import db, Log
+from app.log_stream import log_broker
+
+logger = logging.getLogger(__name__)
+
+class _Barrier:
+    """Queue marker: the writer sets the event once everything enqueued before it is committed."""
+    def __init__(self):
+        self.event = threading.Event()
+
+class LogWriter:
+    """
+    Asynchronous, batched sink for job log lines.
+
+    Pipeline threads only enqueue records. A single writer thread drains the
+    queue and inserts them with one executemany per batch (every
+    `batch_size` records or `flush_interval_ms`, whichever comes first) on
+    its own connection, so log volume never contends with the scoped session
+    used for Job updates. When the queue is full new records are dropped
+    (and counted) rather than blocking the pipeline.
+    """
+    def __init__(self, app=None):
+        self._queue = None
+        self._engine = None
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('LOG_FLUSH_INTERVAL_MS', 250) / 1000.0
+        self._queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_MAX_SIZE', 10000))
+        with app.app_context():
+            self._engine = db.engine
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def write(self, job_id, content, timestamp=None):
+        """Enqueues one log line. Never blocks; returns False if the line was dropped."""
+        if self._queue is None:
+            return False
+        row = {"job_id": job_id, "content": content, "timestamp": timestamp or datetime.utcnow()}
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout=10):
+        """Blocks until every line enqueued so far is committed (or timeout seconds pass)."""
+        if self._queue is None:
+            return True
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        return barrier.event.wait(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize() if self._queue else 0
+        return stats
+
+    def _insert(self, rows):
+        table = Log.__table__
+        try:
+            with self._engine.begin() as conn:
+                if self._engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+                    # Still one batched INSERT, but hands back the ids for live subscribers
+                    result = conn.execute(
+                        table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+                    )
+                    ids = result.scalars().all()
+                else:
+                    conn.execute(table.insert(), rows)
+                    ids = None
+            self._count("written", len(rows))
+            self._count("batches")
+        except Exception as e:
+            self._count("dropped", len(rows))
+            logger.error(f"LogWriter: Failed to write {len(rows)} log lines: {e}")
+            return
+
+        if ids:
+            by_job = {}
+            for row, log_id in zip(rows, ids):
+                by_job.setdefault(row["job_id"], []).append({
+                    "id": log_id,
+                    "job_id": row["job_id"],
+                    "content": row["content"],
+                    "timestamp": row["timestamp"].isoformat(),
+                })
+            for job_id, lines in by_job.items():
+                log_broker.publish(job_id, lines)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            rows, barriers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, _Barrier):
+                    barriers.append(item)
+                    break
+                rows.append(item)
+                if len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if rows:
+                self._insert(rows)
+            for barrier in barriers:
+                barrier.event.set()
+
+class JobLogHandler(logging.Handler):
+    """
+    Logging handler that forwards records for one job to the shared LogWriter.
+    Only records emitted from the thread that created it (and threads that
+    joined with follow()) are kept, so several jobs can attach handlers to
+    the same logger without mixing their lines.
+    """
+    def __init__(self, job_id, writer=None):
+        super().__init__()
+        self.job_id = job_id
+        self.writer = writer or log_writer
+        self.thread_ids = {threading.get_ident()}
+
+    @contextmanager
+    def follow(self):
+        """Also keeps records from the current thread while the block runs (job helper threads)."""
+        ident = threading.get_ident()
+        self.thread_ids.add(ident)
+        try:
+            yield
+        finally:
+            self.thread_ids.discard(ident)
+
+    def emit(self, record):
+        if record.thread not in self.thread_ids:
+            return
+        try:
+            self.writer.write(self.job_id, self.format(record), datetime.utcfromtimestamp(record.created))
+        except Exception:
+            self.handleError(record)
+
+# Process-wide writer, bound to the Flask app in app/main.py (like `db`)
+log_writer = LogWriter()
@@ -1,15 +1,30 @@
 import os
-import threading
+import re
+import json
+import time
+import base64
 import logging
-from flask import Flask, request, jsonify, abort
+from datetime import datetime
+from flask import Flask, Response, request, jsonify, abort, stream_with_context, send_from_directory
 from flask_cors import CORS
+from sqlalchemy.orm import defer
 
 # --- IMPORTS ---
 from security.hmac_check import verify_signature
-from app.utils import clone_repository, cleanup_repository, get_repo_structure
+from app.utils import clone_repository, cleanup_repository, get_repo_structure, repo_cache
 from agents.orchestrator import CIOrchestrator
+from agents.test_selection import PushedChange
+from agents.llm_gateway import llm_gateway
+from agents.llm_cache import LLMResponseCache
 from app.config import Config
-from app.models import db, Job, Log, Settings, Repository
+from app.models import (db, Job, Log, Settings, Repository, CLONE_STRATEGIES, TEST_SELECTION_MODES,
+                        JOB_FINISHED_STATUSES, normalize_repo_url)
+from app.database import database_url, engine_options, configure_engine, upgrade_database
+from app.job_queue import JobQueue
+from app.log_writer import log_writer
+from app.log_stream import log_broker
+from app.result_cache import config_version, tree_hash, find_reusable_job, reused_report
+from sqlalchemy.exc import IntegrityError
 import secrets
 
 # --- CONFIGURATION ---
@@ -24,15 +39,17 @@ app = Flask(__name__)
 # Serve static files from 'dist' folder (Frontend)
 app = Flask(__name__, static_folder='../dist', static_url_path='/')
 app.config.from_object(Config)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ci.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 CORS(app) # Enable CORS for all routes (S3 frontend needs this)
 
 db.init_app(app)
 
-# Create tables
+# Create / migrate tables
 with app.app_context():
-    db.create_all()
+    configure_engine(db.engine)
+    upgrade_database(db)
     
     # Migrate from .env if first time
     settings = Settings.query.first()
@@ -46,14 +63,32 @@ with app.app_context():
         db.session.add(settings)
         db.session.commit()
 
-# Initialize Orchestrator
+log_writer.init_app(app)
+
+# Initialize Orchestrator. It owns the per-host resources (LLM gateway rate
+# limits, warm containers, image pulls), so it is only built in the process that
+# runs the job workers (JobQueue on_start); the other gunicorn workers serve the API.
 from agents.orchestrator import CIOrchestrator
-orchestrator = CIOrchestrator()
+orchestrator = None
+
+def start_orchestrator():
+    global orchestrator
+    orchestrator = CIOrchestrator()
+    if repo_cache:
+        repo_cache.start(Config.REPO_CACHE_EVICT_INTERVAL)
+
+def llm_response_cache():
+    """The LLM response cache. It lives on disk, so processes without the orchestrator open it too."""
+    if orchestrator:
+        return orchestrator.llm_cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    return LLMResponseCache(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_BYTES)
 
 def run_pipeline_task(repo_url, commit_sha, pusher_name, branch, job_id):
     """
     THE CORE WORKFLOW.
-    This function runs in a background thread.
+    This function runs on a JobQueue worker thread.
     It orchestrates the AutoGen Agents to test the code.
     """
     with app.app_context():
@@ -61,26 +96,73 @@ def run_pipeline_task(repo_url, commit_sha, pusher_name, branch, job_id):
         
         # Update Job Status to Running
         job = Job.query.get(job_id)
+        repo_settings = Repository.for_url(repo_url)
+        change = None
         if job:
             job.status = "running"
+            job.config_version = config_version(repo_settings, orchestrator.router.describe())
+            change = PushedChange(job.before_sha, commit_sha, job.get_changed_files(),
+                                  "requested in the commit message" if job.full_tests else None)
             db.session.commit()
 
         local_path = None
         report_content = "Process Failed."
 
         try:
-            # STEP 0: PREPARE
-            local_path = clone_repository(repo_url, commit_sha)
-            logger.info(f"[{job_id}] Repo cloned to temporary sandbox.")
+            # STEP 0: PREPARE (the same commit may already have been tested: then no checkout is needed)
+            original = find_reusable_job(job) if job else None
+            if original:
+                reuse_result(job, original, original.tree_sha or commit_sha)
+                return
+
+            clone_stats = {}
+            local_path = clone_repository(
+                repo_url,
+                commit_sha,
+                stats=clone_stats,
+                strategy=repo_settings.clone_strategy if repo_settings and repo_settings.clone_strategy else "full",
+                sparse_paths=repo_settings.get_sparse_paths() if repo_settings else None,
+            )
+            logger.info(
+                f"[{job_id}] Repo cloned to temporary sandbox "
+                f"({clone_stats.get('strategy')}, cache_hit={clone_stats.get('cache_hit')}, "
+                f"{clone_stats.get('clone_seconds')}s, "
+                f"{clone_stats.get('bytes_fetched', 0) / (1024 * 1024):.1f} MiB fetched)."
+            )
+
+            # Identical content (re-push, merge without changes, same SHA on another branch)
+            if job:
+                job.tree_sha = tree_hash(local_path)
+                db.session.commit()
+                original = find_reusable_job(job, job.tree_sha)
+                if original:
+                    reuse_result(job, original, job.tree_sha)
+                    return
+
+            if change and repo_settings and repo_settings.test_selection == "full":
+                change.full_reason = "repository is set to always run all tests"
 
             # STEP 1: GET STRUCTURE
-            structure = get_repo_structure(local_path)
-            logger.info(f"[{job_id}] File structure analyzed.")
+            structure_stats = {}
+            structure = get_repo_structure(local_path, stats=structure_stats)
+            logger.info(
+                f"[{job_id}] File structure analyzed ({structure_stats.get('files_shown', '-')} of "
+                f"{structure_stats.get('files', '-')} files shown, {structure_stats.get('tokens')} tokens, "
+                f"cache_hit={structure_stats.get('cache_hit')}, "
+                f"{structure_stats.get('trees_listed', 0)} trees listed, {structure_stats.get('seconds')}s)."
+            )
 
             # STEP 2: RUN ORCHESTRATOR
             logger.info(f"[{job_id}] invoking AutoGen Orchestrator...")
             # Pass job_id for live logging
-            report_content = orchestrator.run(local_path, structure, job_id=job_id)
+            report_content = orchestrator.run(
+                local_path,
+                structure,
+                job_id=job_id,
+                repo_url=repo_url,
+                change=change,
+                use_llm_cache=repo_settings.llm_cache_enabled is not False if repo_settings else True,
+            )
             
             logger.info(f"[{job_id}] Orchestrator finished.")
             logger.info(f"[{job_id}] Report content length: {len(report_content) if report_content else 0}")
@@ -90,6 +172,7 @@ def run_pipeline_task(repo_url, commit_sha, pusher_name, branch, job_id):
             if job:
                 job.status = "success"
                 job.report_content = report_content if report_content else "Report generation failed or not found."
+                job.test_scope = "selected" if change and change.selection and not change.selection.full else "full"
                 db.session.commit()
             
         except Exception as e:
@@ -106,7 +189,71 @@ def run_pipeline_task(repo_url, commit_sha, pusher_name, branch, job_id):
             if local_path:
                 cleanup_repository(local_path)
             logger.info(f"[{job_id}] Cleanup complete.")
+            # End live log streams for this job
+            log_broker.close(job_id)
+
+def reuse_result(job, original, tree_sha):
+    """Finishes `job` with the report of `original`, which tested the same tree."""
+    logger.info(f"[{job.id}] ♻️ Tree {tree_sha[:12]} already tested by job {original.id}, reusing its result.")
+    job.status = "success"
+    job.tree_sha = tree_sha
+    job.test_scope = original.test_scope
+    job.reused_from = original.id
+    job.report_content = reused_report(original, tree_sha)
+    db.session.commit()
+
+# Bounded worker pool fed from the Job table (replaces thread-per-webhook)
+job_queue = JobQueue(
+    app,
+    run_pipeline_task,
+    size=Config.WORKER_POOL_SIZE,
+    max_queued=Config.JOB_QUEUE_MAX_SIZE,
+    lock_path=Config.JOB_QUEUE_LOCK_PATH,
+    on_start=start_orchestrator,
+)
+job_queue.start()
+
+
+JOB_ID_ATTEMPTS = 5
+
+def next_job_id(commit_sha):
+    """`<sha7>` for a commit's first job, then `<sha7>-2`, `<sha7>-3`, ..."""
+    prefix = commit_sha[:7]
+    taken = {row.id for row in Job.query.with_entities(Job.id).filter(
+        db.or_(Job.id == prefix, Job.id.like(f"{prefix}-%")))}
+    if prefix not in taken:
+        return prefix
+    n = 2
+    while f"{prefix}-{n}" in taken:
+        n += 1
+    return f"{prefix}-{n}"
+
+def duplicate_delivery(job):
+    logger.info(f"[{job.id}] Duplicate webhook delivery {job.delivery_id}, not queueing again.")
+    return jsonify({
+        "status": "duplicate",
+        "job_id": job.id,
+        "msg": "This delivery was already received."
+    }), 200
+
+# "[ci full]" / "[full ci]" in the head commit message runs every test
+FULL_TESTS_MARKER = re.compile(r"\[(ci full|full ci)\]", re.IGNORECASE)
+# GitHub lists at most this many commits in a push payload
+PUSH_PAYLOAD_MAX_COMMITS = 20
 
+def pushed_files(commits):
+    """
+    Files touched by the pushed commits as "<status>\t<path>" lines (A/M/D),
+    or None if the payload may not list them all.
+    """
+    if not commits or len(commits) >= PUSH_PAYLOAD_MAX_COMMITS:
+        return None
+    files = {}
+    for commit in commits:
+        for status, key in (("A", "added"), ("M", "modified"), ("D", "removed")):
+            for path in commit.get(key) or []:
+                files[path] = status
+    return '\n'.join(f"{status}\t{path}" for path, status in files.items())
 
 @app.route('/webhook', methods=['POST'])
 def handle_webhook():
@@ -138,6 +285,9 @@ def handle_webhook():
         parsed_pusher = payload.get('pusher', {}).get('name', 'Unknown')
         ref = payload.get('ref', 'refs/heads/main')
         branch = ref.split('/')[-1]
+        before_sha = payload.get('before')
+        head_message = (payload.get('head_commit') or {}).get('message') or ''
+        changed_files = pushed_files(payload.get('commits'))
 
         if not repo_url or not commit_sha:
              return jsonify({"error": "Missing repository url or commit sha"}), 400
@@ -146,24 +296,48 @@ def handle_webhook():
         logger.error(f"Payload missing key: {e}")
         abort(400, description=f"Missing field: {e}")
 
-    # Create Job Record
-    job_id = commit_sha[:7]
-    new_job = Job(
-        id=job_id,
-        repo_url=repo_url,
-        commit_sha=commit_sha,
-        pusher=parsed_pusher,
-        branch=branch
-    )
-    db.session.add(new_job)
-    db.session.commit()
-
-    # 4. TRIGGER ASYNC PIPELINE
-    thread = threading.Thread(
-        target=run_pipeline_task, 
-        args=(repo_url, commit_sha, parsed_pusher, branch, job_id)
-    )
-    thread.start()
+    # GitHub redelivers with the same delivery id: answer with the job it already created
+    delivery_id = request.headers.get('X-GitHub-Delivery')
+    if delivery_id:
+        existing = Job.query.filter_by(delivery_id=delivery_id).first()
+        if existing:
+            return duplicate_delivery(existing)
+
+    # Backpressure: refuse new work while the queue is full
+    if job_queue.is_full():
+        logger.warning(f"Job queue full ({job_queue.depth()} queued). Rejecting push {commit_sha[:7]}.")
+        response = jsonify({"error": "Job queue is full, retry later"})
+        response.headers['Retry-After'] = str(Config.JOB_QUEUE_RETRY_AFTER)
+        return response, 429
+
+    # Create Job Record. The short SHA is the id of a commit's first job; re-pushes
+    # get a suffix. Concurrent inserts of the same id or delivery are retried/deduplicated.
+    for attempt in range(JOB_ID_ATTEMPTS):
+        job_id = next_job_id(commit_sha)
+        db.session.add(Job(
+            id=job_id,
+            repo_url=repo_url,
+            commit_sha=commit_sha,
+            pusher=parsed_pusher,
+            branch=branch,
+            before_sha=before_sha,
+            changed_files=changed_files,
+            full_tests=bool(FULL_TESTS_MARKER.search(head_message)),
+            delivery_id=delivery_id,
+        ))
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            existing = Job.query.filter_by(delivery_id=delivery_id).first() if delivery_id else None
+            if existing:
+                return duplicate_delivery(existing)
+    else:
+        return jsonify({"error": "Could not allocate a job id, retry later"}), 503
+
+    # 4. TRIGGER ASYNC PIPELINE (a worker claims it from the queue)
+    job_queue.notify()
 
     return jsonify({
         "status": "queued", 
@@ -227,11 +401,56 @@ def repositories():
         github_url=data['github_url'],
         webhook_id=data.get('webhook_id')
     )
+    error = apply_clone_settings(repo, data)
+    if error:
+        return jsonify({"error": error}), 400
     db.session.add(repo)
     db.session.commit()
     
     return jsonify(repo.to_dict()), 201
 
+def apply_clone_settings(repo, data):
+    """Copies clone_strategy/sparse_paths from a request body. Returns an error message or None."""
+    if 'clone_strategy' in data:
+        if data['clone_strategy'] not in CLONE_STRATEGIES:
+            return f"clone_strategy must be one of {', '.join(CLONE_STRATEGIES)}"
+        repo.clone_strategy = data['clone_strategy']
+    if 'sparse_paths' in data:
+        paths = data['sparse_paths'] or []
+        if isinstance(paths, str):
+            paths = paths.splitlines()
+        repo.sparse_paths = '\n'.join(p.strip() for p in paths if p.strip())
+    if repo.clone_strategy == "sparse" and not repo.get_sparse_paths():
+        return "sparse_paths is required for the sparse clone strategy"
+    return None
+
+@app.route('/api/repositories/<int:repo_id>', methods=['PUT'])
+def update_repository(repo_id):
+    """Update repository clone, LLM cache and test selection settings"""
+    repo = Repository.query.get_or_404(repo_id)
+    data = request.json or {}
+    error = apply_clone_settings(repo, data)
+    if error:
+        return jsonify({"error": error}), 400
+    if 'llm_cache_enabled' in data:
+        repo.llm_cache_enabled = bool(data['llm_cache_enabled'])
+    if 'test_selection' in data:
+        if data['test_selection'] not in TEST_SELECTION_MODES:
+            return jsonify({"error": f"test_selection must be one of {', '.join(TEST_SELECTION_MODES)}"}), 400
+        repo.test_selection = data['test_selection']
+    db.session.commit()
+    return jsonify(repo.to_dict())
+
+@app.route('/api/repositories/<int:repo_id>/llm-cache', methods=['DELETE'])
+def invalidate_llm_cache(repo_id):
+    """Drop all cached LLM responses of a repository"""
+    repo = Repository.query.get_or_404(repo_id)
+    llm_cache = llm_response_cache()
+    if not llm_cache:
+        return jsonify({"success": True, "removed": 0})
+    removed = llm_cache.invalidate(normalize_repo_url(repo.github_url))
+    return jsonify({"success": True, "removed": removed})
+
 @app.route('/api/repositories/<int:repo_id>', methods=['DELETE'])
 def delete_repository(repo_id):
     """Remove repository"""
@@ -257,10 +476,53 @@ def webhook_url():
 
 # --- EXISTING ENDPOINTS ---
 
+JOBS_PAGE_SIZE = 50
+JOBS_PAGE_MAX = 200
+LOGS_PAGE_SIZE = 1000
+LOGS_PAGE_MAX = 5000
+
+def encode_cursor(created_at, job_id):
+    """Opaque keyset cursor for the jobs list."""
+    raw = json.dumps([created_at.isoformat(), job_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), job_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 @app.route('/api/jobs', methods=['GET'])
 def get_jobs():
-    jobs = Job.query.order_by(Job.created_at.desc()).limit(50).all()
-    return jsonify([j.to_dict() for j in jobs])
+    """
+    Newest jobs first, keyset-paginated.
+    ?limit= page size, ?before= the X-Next-Cursor of the previous page,
+    ?fields=report_content to include the full report in each row.
+    """
+    limit = min(max(request.args.get('limit', JOBS_PAGE_SIZE, type=int), 1), JOBS_PAGE_MAX)
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+
+    query = Job.query
+    if 'report_content' not in fields:
+        query = query.options(defer(Job.report_content))
+
+    before = request.args.get('before')
+    if before:
+        try:
+            created_at, last_id = decode_cursor(before)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = query.filter(db.or_(
+            Job.created_at < created_at,
+            db.and_(Job.created_at == created_at, Job.id < last_id),
+        ))
+
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit).all()
+    response = jsonify([j.to_summary(fields) for j in jobs])
+    if len(jobs) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(jobs[-1].created_at, jobs[-1].id)
+    return response
 
 @app.route('/api/jobs/<job_id>', methods=['GET'])
 def get_job_detail(job_id):
@@ -269,8 +531,106 @@ def get_job_detail(job_id):
 
 @app.route('/api/jobs/<job_id>/logs', methods=['GET'])
 def get_job_logs(job_id):
-    logs = Log.query.filter_by(job_id=job_id).order_by(Log.timestamp).all()
-    return jsonify([l.to_dict() for l in logs])
+    """
+    Job logs in insertion order. Pass ?after_id=<last seen id> to fetch only new lines.
+    At most ?limit= lines are returned; X-Next-Cursor is set when more may follow.
+    """
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(max(request.args.get('limit', LOGS_PAGE_SIZE, type=int), 1), LOGS_PAGE_MAX)
+    logs = (Log.query.filter(Log.job_id == job_id, Log.id > after_id)
+            .order_by(Log.id).limit(limit).all())
+    response = jsonify([l.to_dict() for l in logs])
+    if len(logs) == limit:
+        response.headers['X-Next-Cursor'] = str(logs[-1].id)
+    return response
+
+SSE_KEEPALIVE_SECONDS = 15
+SSE_POLL_SECONDS = 1
+
+def _sse_event(log):
+    return f"id: {log['id']}\ndata: {json.dumps(log)}\n\n"
+
+@app.route('/api/jobs/<job_id>/logs/stream', methods=['GET'])
+def stream_job_logs(job_id):
+    """
+    Server-Sent Events stream of a job's log lines.
+    Lines are pushed from the in-memory LogBroker while the job runs in this
+    process; otherwise the database is polled. Resumes from ?after_id= or the
+    Last-Event-ID header and ends with an 'end' event once the job finishes.
+    """
+    Job.query.get_or_404(job_id)
+    cursor = request.args.get('after_id', type=int)
+    if cursor is None:
+        cursor = request.headers.get('Last-Event-ID', 0, type=int)
+
+    def read_db(after_id):
+        logs = (Log.query.filter(Log.job_id == job_id, Log.id > after_id)
+                .order_by(Log.id).all())
+        rows = [l.to_dict() for l in logs]
+        # End the read transaction so the next poll sees new rows and a fresh Job status
+        db.session.rollback()
+        return rows
+
+    def generate(cursor):
+        last_sent = time.monotonic()
+        pending = read_db(cursor)
+        while True:
+            for log in pending:
+                if log['id'] > cursor:
+                    cursor = log['id']
+                    yield _sse_event(log)
+                    last_sent = time.monotonic()
+
+            live = log_broker.wait(job_id, cursor, timeout=SSE_KEEPALIVE_SECONDS)
+            if live is None:
+                # Job is not running in this process: fall back to polling the database
+                pending = read_db(cursor)
+                if not pending:
+                    job = db.session.get(Job, job_id)
+                    finished = job is None or job.status in JOB_FINISHED_STATUSES
+                    db.session.rollback()
+                    if finished:
+                        break
+                    time.sleep(SSE_POLL_SECONDS)
+            else:
+                lines, missed, closed = live
+                pending = read_db(cursor) if missed else lines
+                if closed and not pending:
+                    break
+
+            if not pending and time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+        yield "event: end\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate(cursor)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/api/jobs/<job_id>/artifacts/<name>', methods=['GET'])
+def get_job_artifact(job_id, name):
+    """Raw files kept for a job, e.g. full tool outputs compacted out of the agents' context."""
+    Job.query.get_or_404(job_id)
+    return send_from_directory(os.path.join(Config.ARTIFACTS_DIR, job_id), name, mimetype='text/plain')
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """
+    Internal counters for monitoring. The gateway, container pool and image
+    counters only exist in the process running the jobs ("runner": true).
+    """
+    llm_cache = llm_response_cache()
+    return jsonify({
+        "job_queue": {"queued": job_queue.depth(), "workers": job_queue.size, "runner": job_queue.is_runner},
+        "log_writer": log_writer.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "llm_gateway": llm_gateway.stats() if orchestrator else None,
+        "container_pool": orchestrator.container_pool.stats() if orchestrator and orchestrator.container_pool else None,
+        "images": orchestrator.image_manager.stats() if orchestrator and orchestrator.image_manager else None,
+    })
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
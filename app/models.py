@@ -46,6 +46,25 @@ class Settings(db.Model):
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
 
+# How clone_repository fetches a repository:
+#   full    - whole history (served from the mirror cache when enabled)
+#   shallow - --depth=1 fetch of exactly the pushed SHA
+#   partial - --filter=blob:none clone, blobs fetched lazily on checkout
+#   sparse  - partial clone that only checks out `sparse_paths`
+CLONE_STRATEGIES = ("full", "shallow", "partial", "sparse")
+
+# Which tests a push runs:
+#   changed - only tests affected by the pushed changes (agents.test_selection)
+#   full    - always the whole suite
+TEST_SELECTION_MODES = ("changed", "full")
+
+def normalize_repo_url(url):
+    """Canonical form used to match webhook clone URLs against connected repositories."""
+    url = (url or "").strip().rstrip('/').lower()
+    if url.endswith('.git'):
+        url = url[:-4]
+    return url
+
 class Repository(db.Model):
     """Connected GitHub repositories"""
     id = db.Column(db.Integer, primary_key=True)
@@ -54,6 +73,22 @@ class Repository(db.Model):
     webhook_id = db.Column(db.String(100))  # GitHub webhook ID
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    clone_strategy = db.Column(db.String(20), default="full")  # one of CLONE_STRATEGIES
+    sparse_paths = db.Column(db.Text)  # newline-separated paths for the 'sparse' strategy
+    llm_cache_enabled = db.Column(db.Boolean, default=True)  # serve repeated LLM calls from the response cache
+    test_selection = db.Column(db.String(20), default="changed")  # one of TEST_SELECTION_MODES
+
+    @classmethod
+    def for_url(cls, repo_url):
+        """Returns the active Repository matching a clone URL, or None."""
+        target = normalize_repo_url(repo_url)
+        for repo in cls.query.filter_by(active=True).all():
+            if normalize_repo_url(repo.github_url) == target:
+                return repo
+        return None
+
+    def get_sparse_paths(self):
+        return [p.strip() for p in (self.sparse_paths or "").splitlines() if p.strip()]
 
     def to_dict(self):
         return {
@@ -62,10 +97,29 @@ class Repository(db.Model):
             "github_url": self.github_url,
             "webhook_id": self.webhook_id,
             "active": self.active,
+            "clone_strategy": self.clone_strategy or "full",
+            "sparse_paths": self.get_sparse_paths(),
+            "llm_cache_enabled": self.llm_cache_enabled is not False,
+            "test_selection": self.test_selection or "changed",
             "created_at": self.created_at.isoformat()
         }
 
+# Job statuses after which no more log lines are written
+JOB_FINISHED_STATUSES = ("success", "failed")
+
 class Job(db.Model):
+    __table_args__ = (
+        # Keyset pagination of the jobs list (newest first)
+        db.Index('ix_job_created_at_id', 'created_at', 'id'),
+        # JobQueue claims and queue depth
+        db.Index('ix_job_status_created_at', 'status', 'created_at'),
+        # Result cache lookups (app.result_cache)
+        db.Index('ix_job_tree_sha', 'tree_sha', 'config_version'),
+        db.Index('ix_job_commit_sha', 'commit_sha'),
+        # One job per webhook delivery; redeliveries are answered with the existing job
+        db.Index('ux_job_delivery_id', 'delivery_id', unique=True),
+    )
+
     id = db.Column(db.String(50), primary_key=True)
     repo_url = db.Column(db.String(200), nullable=False)
     commit_sha = db.Column(db.String(100), nullable=False)
@@ -74,9 +128,22 @@ class Job(db.Model):
     status = db.Column(db.String(20), default="queued") # queued, running, success, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     report_content = db.Column(db.Text, nullable=True)
+    before_sha = db.Column(db.String(100))  # branch head before the push (webhook `before`)
+    changed_files = db.Column(db.Text)  # "<status>\t<path>" lines listed in the push, NULL if incomplete
+    full_tests = db.Column(db.Boolean, default=False)  # full test run requested for this push
+    delivery_id = db.Column(db.String(100))  # X-GitHub-Delivery of the webhook that created the job
+    tree_sha = db.Column(db.String(64))  # git tree hash of the checkout
+    config_version = db.Column(db.String(32))  # app.result_cache.config_version() when the job ran
+    test_scope = db.Column(db.String(20))  # "full" or "selected" (only the tests affected by the push)
+    reused_from = db.Column(db.String(50))  # job whose result was reused for this tree
+    claimed_by = db.Column(db.String(100))  # "<host>:<pid>" of the JobQueue process running the job
 
-    def to_dict(self):
-        return {
+    # Fields left out of list responses unless requested with ?fields=
+    OPTIONAL_FIELDS = ("report_content",)
+
+    def to_summary(self, fields=()):
+        """Lightweight representation for job lists; `fields` adds OPTIONAL_FIELDS."""
+        data = {
             "id": self.id,
             "repo_url": self.repo_url,
             "commit_sha": self.commit_sha,
@@ -84,10 +151,28 @@ class Job(db.Model):
             "branch": self.branch,
             "status": self.status,
             "created_at": self.created_at.isoformat(),
-            "report_content": self.report_content
+            "tree_sha": self.tree_sha,
+            "reused_from": self.reused_from,
         }
+        for field in fields:
+            if field in self.OPTIONAL_FIELDS:
+                data[field] = getattr(self, field)
+        return data
+
+    def get_changed_files(self):
+        if self.changed_files is None:
+            return None
+        return [tuple(line.split('\t', 1)) for line in self.changed_files.splitlines() if '\t' in line]
+
+    def to_dict(self):
+        return self.to_summary(fields=self.OPTIONAL_FIELDS)
 
 class Log(db.Model):
+    __table_args__ = (
+        # Per-job reads in insertion order and after_id cursors
+        db.Index('ix_log_job_id_id', 'job_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     job_id = db.Column(db.String(50), db.ForeignKey('job.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -95,7 +180,46 @@ class Log(db.Model):
 
     def to_dict(self):
         return {
+            "id": self.id,
             "job_id": self.job_id,
             "content": self.content,
             "timestamp": self.timestamp.isoformat()
         }
+
+
+class CommandStat(db.Model):
+    """Duration history of one kind of sandbox command on one repository (for adaptive timeouts)."""
+    __table_args__ = (
+        db.UniqueConstraint('repo_url', 'command_key', name='uq_command_stat_repo_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    repo_url = db.Column(db.String(500), nullable=False)  # normalize_repo_url() form
+    command_key = db.Column(db.String(200), nullable=False)
+    runs = db.Column(db.Integer, default=0)
+    avg_seconds = db.Column(db.Float, default=0.0)
+    max_seconds = db.Column(db.Float, default=0.0)  # recent maximum, decays as faster runs come in
+    last_timed_out = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def upgrade_schema():
+    """
+    Adds columns and indexes that were introduced after the tables were first created.
+    db.create_all() only creates missing tables, it never alters existing ones.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
@@ -0,0 +1,211 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from git import Repo, GitCommandError
+
+logger = logging.getLogger(__name__)
+
+def object_bytes(path):
+    """Size of a repository's object store as git reports it (`git count-objects -v`), without walking it."""
+    try:
+        output = Repo(path).git.count_objects('-v')
+    except (GitCommandError, OSError, ValueError) as e:
+        logger.debug(f"RepoCache: count-objects failed for {path}: {e}")
+        return 0
+    sizes = dict(line.split(': ', 1) for line in output.splitlines() if ': ' in line)
+    return sum(int(sizes.get(name, 0)) for name in ("size", "size-pack", "size-garbage")) * 1024
+
+class RepoCache:
+    """
+    Persistent cache of bare repository mirrors.
+
+    Each repository is cloned once into `<root>/<key>.git` and kept up to date
+    with incremental `git fetch`. Jobs get a local clone of the mirror: object
+    files are hard-linked (copied if the checkout is on another filesystem), so
+    the checkout is self-contained and git works in it inside a sandbox that
+    only mounts the checkout.
+
+    Locking (flock, so it also works across gunicorn workers):
+      - `<key>.lease`: held shared by every job using the mirror, taken
+        exclusively (non-blocking) by eviction, so a mirror is never removed
+        while a job still reads objects from it.
+      - `<key>.fetch`: held exclusively while fetching, so concurrent jobs on
+        the same repository never run two fetches into one mirror.
+    Auto-gc is disabled in mirrors to keep it out of the fetch; instead evict()
+    repacks each mirror at most every `gc_interval` seconds. Measuring, gc and
+    eviction stay off the jobs' path: start() runs evict() every `interval`
+    seconds in a background thread.
+    """
+    def __init__(self, root, max_bytes, gc_interval=24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._leases = {}
+        self._leases_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def start(self, interval):
+        """Runs evict() every `interval` seconds in a background thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.warning(f"RepoCache: Eviction pass failed: {e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def _key(self, repo_url):
+        name = repo_url.rstrip('/').split('/')[-1]
+        if name.endswith('.git'):
+            name = name[:-4]
+        digest = hashlib.sha256(repo_url.encode()).hexdigest()[:12]
+        return f"{name}-{digest}"
+
+    def _lock_file(self, path, mode):
+        fd = open(path, 'a')
+        fcntl.flock(fd, mode)
+        return fd
+
+    def _has_commit(self, repo, commit_sha):
+        try:
+            repo.git.cat_file('-e', f"{commit_sha}^{{commit}}")
+            return True
+        except GitCommandError:
+            return False
+
+    def _update_mirror(self, repo_url, mirror_path, commit_sha):
+        """Creates or refreshes the mirror so it contains commit_sha. Returns True on a cache hit."""
+        if not os.path.exists(mirror_path):
+            logger.info(f"RepoCache: Creating mirror of {repo_url}...")
+            repo = Repo.clone_from(repo_url, mirror_path, bare=True)
+            repo.git.config('remote.origin.fetch', '+refs/heads/*:refs/heads/*')
+            repo.git.config('gc.auto', '0')
+            cache_hit = False
+        else:
+            repo = Repo(mirror_path)
+            cache_hit = self._has_commit(repo, commit_sha)
+            if not cache_hit:
+                logger.info(f"RepoCache: Fetching new commits for {repo_url}...")
+                repo.git.fetch('--prune', '--tags', 'origin')
+
+        if not self._has_commit(repo, commit_sha):
+            # Commit is not reachable from any branch (force-push, deleted branch): fetch it directly
+            repo.git.fetch('origin', commit_sha)
+        return cache_hit
+
+    def materialize(self, repo_url, commit_sha, local_path, stats=None):
+        """
+        Checks out commit_sha of repo_url into local_path, backed by the mirror.
+        The mirror stays leased until release(local_path) is called.
+        """
+        key = self._key(repo_url)
+        mirror_path = os.path.join(self.root, f"{key}.git")
+        start = time.monotonic()
+
+        lease = self._lock_file(os.path.join(self.root, f"{key}.lease"), fcntl.LOCK_SH)
+        try:
+            fetch_lock = self._lock_file(os.path.join(self.root, f"{key}.fetch"), fcntl.LOCK_EX)
+            try:
+                size_before = object_bytes(mirror_path) if os.path.exists(mirror_path) else 0
+                cache_hit = self._update_mirror(repo_url, mirror_path, commit_sha)
+                bytes_fetched = max(0, object_bytes(mirror_path) - size_before)
+            finally:
+                fetch_lock.close()
+
+            # Mark as recently used for LRU eviction
+            os.utime(mirror_path, None)
+
+            # --local hard-links the objects: no alternates pointing into the cache
+            repo = Repo.clone_from(mirror_path, local_path, local=True, no_checkout=True)
+            repo.git.remote('set-url', 'origin', repo_url)
+            repo.git.checkout(commit_sha)
+        except Exception:
+            lease.close()
+            raise
+
+        with self._leases_lock:
+            self._leases[local_path] = lease
+
+        if stats is not None:
+            stats.update({
+                "strategy": "mirror",
+                "cache_hit": cache_hit,
+                "clone_seconds": round(time.monotonic() - start, 2),
+                "bytes_fetched": bytes_fetched,
+            })
+        return local_path
+
+    def release(self, local_path):
+        """Drops the lease taken by materialize(); eviction happens in the background pass."""
+        with self._leases_lock:
+            lease = self._leases.pop(local_path, None)
+        if lease:
+            lease.close()
+
+    def _gc(self, path):
+        """Repacks a mirror if the last gc is older than gc_interval. Skipped while it is leased (fetch or clone in progress)."""
+        key = os.path.basename(path)[:-4]
+        marker = os.path.join(self.root, f"{key}.gc")
+        try:
+            if time.time() - os.path.getmtime(marker) < self.gc_interval:
+                return
+        except OSError:
+            pass
+        lease = open(os.path.join(self.root, f"{key}.lease"), 'a')
+        try:
+            fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lease.close()
+            return
+        try:
+            start = time.monotonic()
+            # Checkouts hold hard links to the objects they use, so pruning cannot break them
+            Repo(path).git.gc('--quiet', '--prune=now')
+            with open(marker, 'a'):
+                os.utime(marker, None)
+            logger.info(f"RepoCache: Repacked {key} in {time.monotonic() - start:.1f}s")
+        except GitCommandError as e:
+            logger.warning(f"RepoCache: gc of {key} failed: {e}")
+        finally:
+            lease.close()
+
+    def evict(self):
+        """
+        Repacks mirrors due for gc, then removes least recently used mirrors until
+        the cache fits in max_bytes. Leased mirrors are not removed.
+        """
+        evict_lock = self._lock_file(os.path.join(self.root, ".evict"), fcntl.LOCK_EX)
+        try:
+            mirrors = []
+            for entry in os.scandir(self.root):
+                if entry.is_dir() and entry.name.endswith('.git'):
+                    if self.gc_interval > 0:
+                        self._gc(entry.path)
+                    mirrors.append((entry.stat().st_mtime, entry.path, object_bytes(entry.path)))
+            if self.max_bytes <= 0:
+                return
+            total = sum(m[2] for m in mirrors)
+
+            for mtime, path, size in sorted(mirrors):
+                if total <= self.max_bytes:
+                    break
+                key = os.path.basename(path)[:-4]
+                lease = open(os.path.join(self.root, f"{key}.lease"), 'a')
+                try:
+                    fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    lease.close()
+                    continue
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                    total -= size
+                    logger.info(f"RepoCache: Evicted {key} ({size // (1024 * 1024)} MiB)")
+                finally:
+                    lease.close()
+        finally:
+            evict_lock.close()
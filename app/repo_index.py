@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import fnmatch
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from git import Repo, InvalidGitRepositoryError, NoSuchPathError, GitCommandError
+from agents.context_compactor import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Directories shown only as a file count: dependencies, build output, tool state
+PRUNED_DIRS = {
+    ".git", "node_modules", "bower_components", "vendor", "third_party", "venv", ".venv", "env",
+    "site-packages", "__pycache__", ".mypy_cache", ".pytest_cache", ".tox", ".nox", "dist", "build",
+    "target", "out", ".gradle", ".idea", ".vscode", ".next", ".nuxt", "coverage", ".terraform",
+}
+MANIFESTS = {
+    "package.json", "pom.xml", "build.gradle", "build.gradle.kts", "settings.gradle", "settings.gradle.kts",
+    "go.mod", "Cargo.toml", "pyproject.toml", "setup.py", "setup.cfg", "requirements.txt", "Pipfile",
+    "Gemfile", "composer.json", "Makefile", "CMakeLists.txt", "Dockerfile", "docker-compose.yml",
+    "tsconfig.json", "tox.ini", "pytest.ini",
+}
+ENTRY_POINTS = {"main", "app", "index", "server", "manage", "__main__", "cli", "wsgi", "asgi", "application"}
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".java", ".kt", ".rs", ".rb", ".php", ".cs", ".c", ".cc",
+    ".cpp", ".h", ".hpp", ".swift", ".scala", ".sh",
+}
+CONFIG_EXTENSIONS = {".yml", ".yaml", ".toml", ".ini", ".cfg", ".json", ".xml", ".properties", ".env"}
+
+DIR_FILE_LIMIT = 15  # files listed per directory before the rest is summarized
+DIR_SUBDIR_LIMIT = 40  # subdirectories listed per directory
+INCREMENTAL_TREE_LIMIT = 64  # uncached trees listed one by one before switching to one recursive listing
+
+def _files(n):
+    return f"{n} file" if n == 1 else f"{n} files"
+
+def file_score(path):
+    """Relevance of a file for understanding how to build and test the repository."""
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    depth = path.count('/')
+    if name in MANIFESTS or name.startswith("requirements") and ext == ".txt":
+        score = 100
+    elif name.lower().startswith("readme"):
+        score = 80
+    elif stem in ENTRY_POINTS and ext in SOURCE_EXTENSIONS:
+        score = 70
+    elif stem.startswith("test_") or stem.endswith(("_test", ".test", ".spec", "Test", "Tests")) or \
+            "/test" in f"/{os.path.dirname(path)}":
+        score = 50
+    elif ext in SOURCE_EXTENSIONS:
+        score = 40
+    elif ext in CONFIG_EXTENSIONS or name.startswith('.'):
+        score = 30
+    else:
+        score = 10
+    return score - 5 * depth
+
+class RepoIndexer:
+    """
+    Size-bounded summary of a repository's file tree for the agents' prompt.
+
+    Directory listings come from git tree objects, so ignored files never show
+    up. Each listing is stored by its tree hash in SQLite (`path`), together
+    with the recursive file count of the subtree: between commits only trees
+    whose hash changed are listed again, and a tree seen before is summarized
+    without touching git at all. Vendored and build directories are collapsed
+    into counts, files are ranked (manifests, README, entry points, tests,
+    sources) and the least relevant ones are left out until the rendered
+    summary fits the token budget. Directories that are not git checkouts are
+    walked on disk, honoring the root .gitignore.
+    """
+    VERSION = 1  # bump when cached listings must not be reused
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.VERSION:
+                # Listings written by an older version may be wrong: start over
+                conn.execute("DROP TABLE IF EXISTS trees")
+                conn.execute("DROP TABLE IF EXISTS summaries")
+                conn.execute(f"PRAGMA user_version = {self.VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trees ("
+                " sha TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_trees_last_used ON trees (last_used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # --- Tree listings ---
+
+    def _cached(self, conn, shas):
+        nodes = {}
+        shas = list(shas)
+        for i in range(0, len(shas), 500):
+            chunk = shas[i:i + 500]
+            rows = conn.execute(
+                f"SELECT sha, value FROM trees WHERE sha IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            nodes.update((sha, json.loads(value)) for sha, value in rows)
+        return nodes
+
+    @staticmethod
+    def _parse_ls_tree(output):
+        """Lines of `git ls-tree -l` as (type, sha, size, path)."""
+        for line in output.splitlines():
+            meta, _, path = line.partition('\t')
+            parts = meta.split()
+            if len(parts) == 4:
+                yield parts[1], parts[2], int(parts[3]) if parts[3].isdigit() else 0, path
+
+    def _list_tree(self, repo, sha):
+        node = {"files": [], "dirs": []}
+        for kind, child, size, name in self._parse_ls_tree(repo.git.ls_tree('-l', sha)):
+            if kind == "tree":
+                node["dirs"].append([name, child])
+            elif kind == "blob":
+                node["files"].append([name, size])
+        return node
+
+    def _list_recursive(self, repo, root_sha):
+        """
+        All trees below root_sha from one `git ls-tree -r -t`. Identical subtrees
+        share a sha: each tree is filled from the first path it appears at only.
+        """
+        shas = {"": root_sha}
+        owners = {root_sha: ""}  # tree sha -> the path its listing is taken from
+        nodes = {root_sha: {"files": [], "dirs": []}}
+        for kind, child, size, path in self._parse_ls_tree(repo.git.ls_tree('-r', '-t', '-l', root_sha)):
+            parent, name = os.path.split(path)
+            parent_sha = shas.get(parent)
+            parent_node = nodes.get(parent_sha) if owners.get(parent_sha) == parent else None
+            if kind == "tree":
+                shas[path] = child
+                if child not in owners:
+                    owners[child] = path
+                    nodes[child] = {"files": [], "dirs": []}
+                if parent_node is not None:
+                    parent_node["dirs"].append([name, child])
+            elif kind == "blob" and parent_node is not None:
+                parent_node["files"].append([name, size])
+        return nodes
+
+    def _load_nodes(self, repo, root_sha, stats):
+        """Listings of every tree below root_sha, from the cache where possible."""
+        with self._lock, self._connect() as conn:
+            nodes, listed, pending = {}, {}, [root_sha]
+            while pending:
+                cached = self._cached(conn, [s for s in pending if s not in nodes])
+                next_pending = []
+                for sha in pending:
+                    if sha in nodes:
+                        continue
+                    node = cached.get(sha)
+                    if node is None:
+                        if len(listed) >= INCREMENTAL_TREE_LIMIT:
+                            break
+                        node = listed[sha] = self._list_tree(repo, sha)
+                    nodes[sha] = node
+                    next_pending.extend(child for _, child in node["dirs"])
+                else:
+                    pending = next_pending
+                    continue
+                # Too many new trees to list one by one: list everything at once
+                full = self._list_recursive(repo, root_sha)
+                listed = {sha: node for sha, node in full.items() if sha not in nodes or sha in listed}
+                nodes.update(full)
+                break
+
+            self._count_files(nodes, root_sha)
+            now = time.time()
+            conn.executemany("UPDATE trees SET last_used = ? WHERE sha = ?",
+                             [(now, sha) for sha in nodes if sha not in listed])
+            conn.executemany(
+                "INSERT OR REPLACE INTO trees (sha, value, size, last_used) VALUES (?, ?, ?, ?)",
+                [(sha, value, len(value), now) for sha, value in
+                 ((sha, json.dumps(nodes[sha])) for sha in listed)],
+            )
+            self._evict(conn)
+        stats.update({"trees": len(nodes), "trees_listed": len(listed)})
+        return nodes
+
+    @staticmethod
+    def _count_files(nodes, sha):
+        node = nodes[sha]
+        if "count" not in node:
+            node["count"] = len(node["files"]) + sum(RepoIndexer._count_files(nodes, c) for _, c in node["dirs"])
+        return node["count"]
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM trees").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for sha, size in conn.execute("SELECT sha, size FROM trees ORDER BY last_used").fetchall():
+            conn.execute("DELETE FROM trees WHERE sha = ?", (sha,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        conn.execute("DELETE FROM summaries WHERE last_used < ?", (time.time() - 7 * 86400,))
+
+    def _walk(self, root_dir):
+        """Listings of a plain directory (no git), skipping .gitignore'd paths and pruned directories."""
+        patterns = []
+        try:
+            with open(os.path.join(root_dir, ".gitignore")) as f:
+                patterns = [p.strip().rstrip('/') for p in f if p.strip() and not p.startswith(('#', '!'))]
+        except OSError:
+            pass
+
+        def ignored(rel):
+            name = os.path.basename(rel)
+            return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel, p.lstrip('/')) for p in patterns)
+
+        nodes = {}
+        for root, dirs, files in os.walk(root_dir):
+            rel = os.path.relpath(root, root_dir)
+            rel = "" if rel == "." else rel
+            node = nodes.setdefault(rel, {"files": [], "dirs": []})
+            kept = []
+            for d in sorted(dirs):
+                path = os.path.join(rel, d)
+                if ignored(path) or d == ".git":
+                    continue
+                node["dirs"].append([d, path])
+                if d in PRUNED_DIRS:
+                    nodes[path] = {"files": [], "dirs": [], "count": _count_on_disk(os.path.join(root, d))}
+                else:
+                    kept.append(d)
+            dirs[:] = kept
+            for f in sorted(files):
+                path = os.path.join(rel, f)
+                if not ignored(path):
+                    try:
+                        size = os.lstat(os.path.join(root, f)).st_size
+                    except OSError:
+                        size = 0
+                    node["files"].append([f, size])
+        self._count_files(nodes, "")
+        return nodes, ""
+
+    # --- Rendering ---
+
+    def summarize(self, root_dir, budget=1500, stats=None):
+        """Summary of the repository at root_dir in at most `budget` tokens. Fills `stats` if given."""
+        stats = stats if stats is not None else {}
+        start = time.monotonic()
+        root_sha = None
+        try:
+            repo = Repo(root_dir)
+            root_sha = repo.git.rev_parse('HEAD^{tree}')
+        except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError, ValueError):
+            repo = None
+
+        key = f"{root_sha}:{budget}"
+        if root_sha:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT value FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            if row:
+                stats.update({"cache_hit": True, "tokens": count_tokens(row[0]),
+                              "seconds": round(time.monotonic() - start, 3)})
+                return row[0]
+            nodes, root = self._load_nodes(repo, root_sha, stats), root_sha
+        else:
+            nodes, root = self._walk(root_dir)
+
+        text = self._render_within(nodes, root, os.path.basename(root_dir.rstrip('/')), budget, stats)
+        if root_sha:
+            with self._lock, self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO summaries (key, value, last_used) VALUES (?, ?, ?)",
+                             (key, text, time.time()))
+        stats.update({"cache_hit": False, "tokens": count_tokens(text),
+                      "seconds": round(time.monotonic() - start, 3)})
+        return text
+
+    def _render_within(self, nodes, root, name, budget, stats):
+        ranked = []
+
+        def collect(node_id, prefix):
+            node = nodes[node_id]
+            for file_name, _ in node["files"]:
+                path = prefix + file_name
+                ranked.append((file_score(path), path))
+            for dir_name, child in node["dirs"]:
+                if dir_name not in PRUNED_DIRS and child in nodes:
+                    collect(child, f"{prefix}{dir_name}/")
+
+        collect(root, "")
+        ranked.sort(key=lambda item: (-item[0], item[1]))
+        total_files = nodes[root]["count"]
+
+        keep = min(len(ranked), budget // 3)  # a listed file costs a few tokens
+        while True:
+            shown = set(self._cap_per_dir([path for _, path in ranked[:keep]]))
+            header = (f"{name}/ ({_files(total_files)}; showing the {len(shown)} most relevant, "
+                      f"other files and directories as counts)")
+            lines = [header]
+            self._render(nodes, root, "", shown, 1, lines)
+            text = "\n".join(lines)
+            if count_tokens(text) <= budget or keep == 0:
+                break
+            keep = int(keep * 0.7)
+        if count_tokens(text) > budget:
+            # Even the bare directory outline is too long
+            text = text[:budget * 4].rsplit("\n", 1)[0] + "\n... (truncated to the token budget)"
+        stats.update({"files": total_files, "files_shown": len(shown)})
+        return text
+
+    @staticmethod
+    def _cap_per_dir(paths):
+        per_dir = Counter()
+        for path in paths:
+            directory = os.path.dirname(path)
+            if per_dir[directory] < DIR_FILE_LIMIT:
+                per_dir[directory] += 1
+                yield path
+
+    def _render(self, nodes, node_id, prefix, shown, depth, lines):
+        node = nodes[node_id]
+        indent = "    " * depth
+        subdirs = sorted(node["dirs"])
+        for i, (dir_name, child) in enumerate(subdirs):
+            if i == DIR_SUBDIR_LIMIT:
+                rest = sum(nodes[c]["count"] for _, c in subdirs[i:] if c in nodes)
+                lines.append(f"{indent}... {len(subdirs) - i} more directories ({_files(rest)})")
+                break
+            child_node = nodes.get(child)
+            count = child_node["count"] if child_node else 0
+            path = f"{prefix}{dir_name}/"
+            if dir_name in PRUNED_DIRS:
+                lines.append(f"{indent}{dir_name}/ ({_files(count)}, not expanded)")
+            elif child_node and any(s.startswith(path) for s in shown):
+                lines.append(f"{indent}{dir_name}/")
+                self._render(nodes, child, path, shown, depth + 1, lines)
+            else:
+                lines.append(f"{indent}{dir_name}/ ({_files(count)})")
+
+        hidden = Counter()
+        for file_name, _ in sorted(node["files"]):
+            if prefix + file_name in shown:
+                lines.append(f"{indent}{file_name}")
+            else:
+                hidden[os.path.splitext(file_name)[1] or file_name] += 1
+        if hidden:
+            kinds = ", ".join(f"{ext} {n}" for ext, n in hidden.most_common(4))
+            lines.append(f"{indent}... {sum(hidden.values())} more ({kinds})")
+
+def _count_on_disk(path):
+    return sum(len(files) for _, _, files in os.walk(path))
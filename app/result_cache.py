@@ -0,0 +1,69 @@
+import json
+import hashlib
+import logging
+from git import Repo
+from app.config import Config
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Bump when a change to the pipeline itself should invalidate earlier results
+PIPELINE_VERSION = 1
+
+# Settings that change what a pipeline run checks or reports
+RESULT_SETTINGS = (
+    "STACK_DETECTION_ENABLED", "FAST_MODE_ENABLED", "FAST_MODE_STEP_TIMEOUT", "FAST_MODE_LLM_REPORT",
+    "SANDBOX_USE_DOCKER", "SANDBOX_MEMORY", "SANDBOX_TIMEOUT_MAX", "TEST_SELECTION_ENABLED",
+    "DEBUGGER_ESCALATE_AFTER",
+)
+
+def config_version(repo_settings=None, models=()):
+    """
+    Short hash of everything besides the code that decides a run's result:
+    the pipeline version, RESULT_SETTINGS, the LLM models and the repository's
+    clone settings (a sparse checkout tests less of the tree).
+    """
+    data = {
+        "pipeline": PIPELINE_VERSION,
+        "settings": {name: getattr(Config, name) for name in RESULT_SETTINGS},
+        "models": list(models),
+    }
+    if repo_settings:
+        data["clone"] = [repo_settings.clone_strategy or "full", repo_settings.get_sparse_paths()]
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+def tree_hash(local_path):
+    """Git tree hash of the checked out commit: equal for identical content, whatever the commit."""
+    return Repo(local_path).git.rev_parse('HEAD^{tree}')
+
+def find_reusable_job(job, tree_sha=None):
+    """
+    Latest successful job whose result holds for `job`: same tree (or, before
+    checkout, same commit) and config version. A result from selected tests only
+    is reused for the same push range, never for a run that asks for all tests.
+    """
+    query = Job.query.filter(
+        Job.id != job.id,
+        Job.status == "success",
+        Job.config_version == job.config_version,
+        Job.reused_from.is_(None),
+    )
+    if tree_sha:
+        query = query.filter(Job.tree_sha == tree_sha)
+    else:
+        query = query.filter(Job.commit_sha == job.commit_sha)
+    for candidate in query.order_by(Job.created_at.desc()).limit(20):
+        if candidate.test_scope != "selected":
+            return candidate
+        if not job.full_tests and candidate.before_sha == job.before_sha and candidate.commit_sha == job.commit_sha:
+            return candidate
+    return None
+
+def reused_report(original, tree_sha):
+    """Report of a job served from `original`'s result."""
+    return (
+        f"> ♻️ **Result reused** from job [`{original.id}`](/api/jobs/{original.id}) "
+        f"(commit `{original.commit_sha[:7]}`, {original.created_at.strftime('%Y-%m-%d %H:%M')} UTC): "
+        f"the tree `{tree_sha[:12]}` was already tested with the same pipeline configuration.\n\n"
+        + (original.report_content or "")
+    )
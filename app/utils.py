@@ -1,17 +1,55 @@
 import os
+import time
 import shutil
 import uuid
 import logging
 from git import Repo # Requires: pip install GitPython
+from app.config import Config
+from app.repo_cache import RepoCache, object_bytes
+from app.repo_index import RepoIndexer
 
 logger = logging.getLogger(__name__)
 
 SANDBOX_ROOT = "/tmp/ai-ci-sandbox"
 
-def clone_repository(repo_url, commit_sha):
+# Shared bare-mirror cache (None when disabled)
+repo_cache = RepoCache(Config.REPO_CACHE_DIR, Config.REPO_CACHE_MAX_BYTES, Config.REPO_CACHE_GC_INTERVAL) if Config.REPO_CACHE_ENABLED else None
+
+# Tree listings and structure summaries, cached by git tree hash
+repo_indexer = RepoIndexer(Config.REPO_INDEX_PATH, Config.REPO_INDEX_MAX_BYTES)
+
+def _checkout_full(repo_url, commit_sha, local_path):
+    # Note: In production, consider adding authentication (e.g., SSH keys or Tokens)
+    # to the repo_url if the repo is private.
+    repo = Repo.clone_from(repo_url, local_path)
+    repo.git.checkout(commit_sha)
+
+def _checkout_shallow(repo_url, commit_sha, local_path):
+    """Fetches only the pushed commit, without history."""
+    repo = Repo.init(local_path)
+    repo.create_remote('origin', repo_url)
+    repo.git.fetch('--depth=1', 'origin', commit_sha)
+    repo.git.checkout('--detach', 'FETCH_HEAD')
+
+def _checkout_partial(repo_url, commit_sha, local_path):
+    """Full commit history, but blobs are only downloaded for the checked out tree."""
+    repo = Repo.clone_from(repo_url, local_path, filter='blob:none', no_checkout=True)
+    repo.git.checkout(commit_sha)
+
+def _checkout_sparse(repo_url, commit_sha, local_path, sparse_paths):
+    """Partial clone that only materializes the configured paths."""
+    repo = Repo.clone_from(repo_url, local_path, filter='blob:none', no_checkout=True, sparse=True)
+    if sparse_paths:
+        repo.git.sparse_checkout('set', *sparse_paths)
+    repo.git.checkout(commit_sha)
+
+def clone_repository(repo_url, commit_sha, stats=None, strategy="full", sparse_paths=None):
     """
     Clones the user's repository to a secure temporary directory.
     Checks out the specific commit SHA to ensure we test exactly what was pushed.
+    `strategy` is one of app.models.CLONE_STRATEGIES; 'full' is served from the
+    mirror cache when it is enabled.
+    If `stats` is a dict it is filled with clone timing and bytes fetched.
     """
     # Create a unique path for this job to prevent collisions
     job_uuid = str(uuid.uuid4())[:8]
@@ -22,15 +60,38 @@ def clone_repository(repo_url, commit_sha):
         if os.path.exists(local_path):
             shutil.rmtree(local_path)
             
-        logger.info(f"Utils: Cloning {repo_url} to {local_path}...")
-        
-        # Clone the repo
-        # Note: In production, consider adding authentication (e.g., SSH keys or Tokens)
-        # to the repo_url if the repo is private.
-        repo = Repo.clone_from(repo_url, local_path)
-        
-        # Checkout specific commit
-        repo.git.checkout(commit_sha)
+        if strategy == "full" and repo_cache:
+            logger.info(f"Utils: Materializing {repo_url} from mirror cache to {local_path}...")
+            repo_cache.materialize(repo_url, commit_sha, local_path, stats=stats)
+            logger.info(f"Utils: Successfully checked out {commit_sha}")
+            return local_path
+
+        logger.info(f"Utils: Cloning {repo_url} to {local_path} (strategy: {strategy})...")
+        start = time.monotonic()
+
+        if strategy == "shallow":
+            try:
+                _checkout_shallow(repo_url, commit_sha, local_path)
+            except Exception as e:
+                # Some servers refuse fetching an arbitrary SHA; fall back to a full clone
+                logger.warning(f"Utils: Shallow fetch of {commit_sha} failed ({e}), falling back to full clone")
+                shutil.rmtree(local_path, ignore_errors=True)
+                strategy = "full"
+                _checkout_full(repo_url, commit_sha, local_path)
+        elif strategy == "partial":
+            _checkout_partial(repo_url, commit_sha, local_path)
+        elif strategy == "sparse":
+            _checkout_sparse(repo_url, commit_sha, local_path, sparse_paths)
+        else:
+            _checkout_full(repo_url, commit_sha, local_path)
+
+        if stats is not None:
+            stats.update({
+                "strategy": strategy,
+                "cache_hit": False,
+                "clone_seconds": round(time.monotonic() - start, 2),
+                "bytes_fetched": object_bytes(local_path),
+            })
         
         logger.info(f"Utils: Successfully checked out {commit_sha}")
         return local_path
@@ -45,6 +106,8 @@ def cleanup_repository(local_path):
     """
     Securely removes the code after testing to save space and maintain privacy.
     """
+    if repo_cache:
+        repo_cache.release(local_path)
     if local_path and os.path.exists(local_path):
         try:
             shutil.rmtree(local_path)
@@ -52,16 +115,11 @@ def cleanup_repository(local_path):
         except Exception as e:
             logger.error(f"Utils: Cleanup failed: {e}")
 
-def get_repo_structure(root_dir):
+def get_repo_structure(root_dir, stats=None):
     """
-    Returns a string representation of the file structure.
+    Returns a summary of the file structure for the agents' prompt: ignored and
+    vendored directories collapsed, most relevant files first, at most
+    REPO_STRUCTURE_TOKEN_BUDGET tokens. If `stats` is a dict it is filled with
+    cache and size details.
     """
-    structure = []
-    for root, dirs, files in os.walk(root_dir):
-        level = root.replace(root_dir, '').count(os.sep)
-        indent = ' ' * 4 * (level)
-        structure.append(f"{indent}{os.path.basename(root)}/")
-        subindent = ' ' * 4 * (level + 1)
-        for f in files:
-            structure.append(f"{subindent}{f}")
-    return '\n'.join(structure)
\ No newline at end of file
+    return repo_indexer.summarize(root_dir, budget=Config.REPO_STRUCTURE_TOKEN_BUDGET, stats=stats)
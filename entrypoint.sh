@@ -3,8 +3,11 @@ set -e
 
 # Default to port 8080 if not set
 PORT=${PORT:-8080}
+# More than one worker needs a shared database (DATABASE_URL=postgresql://...)
+WORKERS=${WEB_CONCURRENCY:-1}
 
 echo "Starting Private AI-CI on port $PORT..."
 
 # Run Gunicorn with the dynamic port
-exec gunicorn -w 1 -b 0.0.0.0:$PORT app.main:app --timeout 600
+# gthread workers so long-lived log streams (SSE) do not block other requests
+exec gunicorn -w $WORKERS -k gthread --threads 16 -b 0.0.0.0:$PORT app.main:app --timeout 600
@@ -25,6 +25,7 @@ interface JobDetail {
 }
 
 interface LogEntry {
+    id: number;
     job_id: string;
     content: string;
     timestamp: string;
@@ -77,21 +78,17 @@ function JobPageContent() {
         return () => clearInterval(interval);
     }, [id]);
 
-    // Poll for Logs
+    // Stream Logs (SSE). EventSource reconnects with Last-Event-ID, so no lines are repeated.
     useEffect(() => {
-        const fetchLogs = async () => {
-            try {
-                const res = await fetch(`/api/jobs/${id}/logs`);
-                if (res.ok) {
-                    setLogs(await res.json());
-                }
-            } catch (err) {
-                console.error(err);
-            }
+        setLogs([]);
+        const source = new EventSource(`/api/jobs/${id}/logs/stream`);
+        source.onmessage = (event) => {
+            const entry: LogEntry = JSON.parse(event.data);
+            setLogs((prev) => [...prev, entry]);
         };
-        fetchLogs();
-        const interval = setInterval(fetchLogs, 2000);
-        return () => clearInterval(interval);
+        source.addEventListener("end", () => source.close());
+        source.onerror = (err) => console.error(err);
+        return () => source.close();
     }, [id]);
 
     if (!job) {
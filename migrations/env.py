@@ -0,0 +1,53 @@
+import os
+import sys
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import database_url
+from app.models import db
+
+target_metadata = db.metadata
+
+if context.config.config_file_name and context.config.attributes.get('connection') is None:
+    fileConfig(context.config.config_file_name)
+
+def run_migrations_offline():
+    """Emit SQL to stdout instead of executing it (`alembic upgrade head --sql`)."""
+    context.configure(
+        url=database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=database_url().startswith('sqlite'),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # app.database.upgrade_database() hands us the app's connection;
+    # the alembic CLI falls back to a fresh engine from Config.
+    connection = context.config.attributes.get('connection')
+    if connection is not None:
+        _run(connection)
+        return
+
+    engine = create_engine(database_url())
+    with engine.connect() as connection:
+        _run(connection)
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite cannot ALTER most things in place; batch mode recreates tables
+        render_as_batch=connection.dialect.name == 'sqlite',
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,73 @@
+"""Initial schema: settings, repository, job, log
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'settings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('gemini_api_key_encrypted', sa.Text(), nullable=True),
+        sa.Column('github_webhook_secret', sa.String(length=200), nullable=True),
+        sa.Column('setup_completed', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'repository',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('github_url', sa.String(length=500), nullable=False),
+        sa.Column('webhook_id', sa.String(length=100), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('clone_strategy', sa.String(length=20), nullable=True),
+        sa.Column('sparse_paths', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'job',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('repo_url', sa.String(length=200), nullable=False),
+        sa.Column('commit_sha', sa.String(length=100), nullable=False),
+        sa.Column('pusher', sa.String(length=100), nullable=True),
+        sa.Column('branch', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('report_content', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_job_created_at_id', 'job', ['created_at', 'id'])
+    op.create_index('ix_job_status_created_at', 'job', ['status', 'created_at'])
+    op.create_table(
+        'log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=50), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['job.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_log_job_id_id', 'log', ['job_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_log_job_id_id', table_name='log')
+    op.drop_table('log')
+    op.drop_index('ix_job_status_created_at', table_name='job')
+    op.drop_index('ix_job_created_at_id', table_name='job')
+    op.drop_table('job')
+    op.drop_table('repository')
+    op.drop_table('settings')
@@ -0,0 +1,24 @@
+"""Per-repository LLM response cache switch
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('repository') as batch_op:
+        batch_op.add_column(sa.Column('llm_cache_enabled', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('repository') as batch_op:
+        batch_op.drop_column('llm_cache_enabled')
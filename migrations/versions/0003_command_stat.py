@@ -0,0 +1,34 @@
+"""Sandbox command duration history for adaptive timeouts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'command_stat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('repo_url', sa.String(length=500), nullable=False),
+        sa.Column('command_key', sa.String(length=200), nullable=False),
+        sa.Column('runs', sa.Integer(), nullable=True),
+        sa.Column('avg_seconds', sa.Float(), nullable=True),
+        sa.Column('max_seconds', sa.Float(), nullable=True),
+        sa.Column('last_timed_out', sa.Boolean(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('repo_url', 'command_key', name='uq_command_stat_repo_key'),
+    )
+
+
+def downgrade():
+    op.drop_table('command_stat')
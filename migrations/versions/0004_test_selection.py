@@ -0,0 +1,32 @@
+"""Push ranges for change-aware test selection
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('before_sha', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('changed_files', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('full_tests', sa.Boolean(), nullable=True))
+    with op.batch_alter_table('repository') as batch_op:
+        batch_op.add_column(sa.Column('test_selection', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('repository') as batch_op:
+        batch_op.drop_column('test_selection')
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('full_tests')
+        batch_op.drop_column('changed_files')
+        batch_op.drop_column('before_sha')
@@ -0,0 +1,38 @@
+"""Result cache keyed by tree hash, webhook delivery deduplication
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('delivery_id', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('tree_sha', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('config_version', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('test_scope', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('reused_from', sa.String(length=50), nullable=True))
+    op.create_index('ix_job_tree_sha', 'job', ['tree_sha', 'config_version'])
+    op.create_index('ix_job_commit_sha', 'job', ['commit_sha'])
+    op.create_index('ux_job_delivery_id', 'job', ['delivery_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_job_delivery_id', table_name='job')
+    op.drop_index('ix_job_commit_sha', table_name='job')
+    op.drop_index('ix_job_tree_sha', table_name='job')
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('reused_from')
+        batch_op.drop_column('test_scope')
+        batch_op.drop_column('config_version')
+        batch_op.drop_column('tree_sha')
+        batch_op.drop_column('delivery_id')
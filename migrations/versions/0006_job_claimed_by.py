@@ -0,0 +1,24 @@
+"""Record which process claimed a running job
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('claimed_by', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('claimed_by')
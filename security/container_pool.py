@@ -0,0 +1,124 @@
+import os
+import time
+import uuid
+import atexit
+import logging
+import threading
+from security.sandbox import start_container, remove_container, mount_args
+
+logger = logging.getLogger(__name__)
+
+class ContainerPool:
+    """
+    Pre-started sandbox containers for common images, so a job's first
+    command does not wait for container creation.
+
+    A warm container is only handed to a job whose own container would mount
+    exactly the same thing. That is the case in Docker-outside-of-Docker mode,
+    where every container mounts the shared workspace volume. On a plain host
+    each job container mounts only its own checkout, so a warm container
+    (started before the checkout exists) would have to mount all of `root` and
+    expose other jobs' checkouts: the pool stays off there.
+
+    Each warm container is handed to a single job, never returned:
+    Sandbox.close() removes it and the pool starts a replacement in the
+    background. Containers older than half their max age are not handed out.
+    """
+    LABEL = "ai-ci.sandbox=warm"
+
+    def __init__(self, root, images, size=1, max_age=4 * 3600, dep_cache=None, image_manager=None, limits=()):
+        self.root = os.path.abspath(root)
+        self.limits = list(limits)  # docker run resource limits, as for Sandbox
+        self.dep_cache = dep_cache  # DependencyCache whose volumes warm containers mount
+        self.image_manager = image_manager  # ImageManager to wait on before starting containers
+        self.images = list(images)
+        self.size = size
+        self.max_age = max_age
+        self._idle = {image: [] for image in self.images}  # image -> [(name, host_root, container_root, started)]
+        self._lock = threading.Lock()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.mount = mount_args(self.root)[0]
+        # What the container of a job checkout below root mounts
+        self.enabled = mount_args(os.path.join(self.root, "job"))[0] == self.mount
+
+    def start(self):
+        """Warms up `size` containers per image in a background thread."""
+        if not self.enabled:
+            logger.info("ContainerPool: Job containers mount only their own checkout here; not warming containers")
+            return
+        os.makedirs(self.root, exist_ok=True)
+        atexit.register(self.shutdown)
+        for image in self.images:
+            self._refill_async(image)
+
+    def _refill_async(self, image):
+        threading.Thread(target=self._refill, args=(image,), daemon=True).start()
+
+    def _refill(self, image):
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle[image]) >= self.size:
+                    return
+            if self.image_manager and not self.image_manager.wait(image):
+                logger.warning(f"ContainerPool: {image} is not available, not warming it")
+                return
+            name = f"ai-ci-warm-{uuid.uuid4().hex[:12]}"
+            try:
+                extra = self.limits + (self.dep_cache.docker_args(image) if self.dep_cache else [])
+                host_root, container_root = start_container(
+                    image, name, self.root, self.max_age, labels=[self.LABEL], extra_args=extra
+                )
+            except RuntimeError as e:
+                logger.warning(f"ContainerPool: Could not warm {image}: {e}")
+                return
+            with self._lock:
+                if self._closed:
+                    remove_container(name)
+                    return
+                self._idle[image].append((name, host_root, container_root, time.monotonic()))
+            logger.info(f"ContainerPool: Warm container {name} ready for {image}")
+
+    def acquire(self, image, work_dir):
+        """
+        Takes a warm container for `image` that can see `work_dir`.
+        Returns (name, host_root, container_root) or None.
+        """
+        if not self.enabled or image not in self._idle or not work_dir or \
+                mount_args(work_dir)[0] != self.mount:
+            self.misses += 1
+            return None
+        stale = []
+        found = None
+        with self._lock:
+            idle = self._idle[image]
+            while idle and found is None:
+                name, host_root, container_root, started = idle.pop(0)
+                if time.monotonic() - started > self.max_age / 2:
+                    stale.append(name)
+                else:
+                    found = (name, host_root, container_root)
+        for name in stale:
+            remove_container(name)
+        self._refill_async(image)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def stats(self):
+        with self._lock:
+            idle = {image: len(names) for image, names in self._idle.items()}
+        return {"enabled": self.enabled, "idle": idle, "hits": self.hits, "misses": self.misses}
+
+    def shutdown(self):
+        """Removes all idle warm containers."""
+        with self._lock:
+            self._closed = True
+            names = [entry[0] for entries in self._idle.values() for entry in entries]
+            for entries in self._idle.values():
+                entries.clear()
+        for name in names:
+            remove_container(name)
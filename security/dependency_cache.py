@@ -0,0 +1,196 @@
+import os
+import re
+import time
+import fcntl
+import logging
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+_SIZE_UNITS = {"B": 1, "KB": 1000, "kB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+
+def _parse_size(text):
+    match = re.match(r"([\d.]+)\s*([kKMG]?B)", text or "")
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _SIZE_UNITS.get(match.group(2), 1))
+
+def _mb(size):
+    return f"{size / 1024 ** 2:.1f} MB"
+
+class Ecosystem:
+    """
+    A package manager cache: which images use it, where it is mounted, the
+    environment pointing the tool at it, and output patterns that mark a
+    cache hit or a download (with an optional size group).
+    """
+    def __init__(self, name, image_pattern, path, env, hit=None, miss=None):
+        self.name = name
+        self.image_pattern = re.compile(image_pattern)
+        self.path = path
+        self.env = env
+        self.hit = re.compile(hit) if hit else None
+        self.miss = re.compile(miss) if miss else None
+
+# pip, npm (cacache), Gradle, Go and Cargo lock their caches themselves.
+# Maven >= 3.9 does with the file-lock sync context set below; older Maven
+# only writes through temp files, which is safe for the artifacts themselves.
+ECOSYSTEMS = [
+    Ecosystem("pip", r"python", "/cache/pip", {"PIP_CACHE_DIR": "/cache/pip"},
+              hit=r"Using cached \S+ \(([^)]+)\)", miss=r"Downloading \S+ \(([^)]+)\)"),
+    Ecosystem("maven", r"maven", "/cache/m2",
+              {"MAVEN_OPTS": "-Dmaven.repo.local=/cache/m2 "
+                             "-Daether.syncContext.named.factory=file-lock "
+                             "-Daether.syncContext.named.nameMapper=file-gav"},
+              miss=r"Downloaded from \S+: \S+ \(([^,)]+)"),
+    Ecosystem("npm", r"node", "/cache/npm", {"npm_config_cache": "/cache/npm"}),
+    Ecosystem("gradle", r"gradle", "/cache/gradle", {"GRADLE_USER_HOME": "/cache/gradle"},
+              miss=r"Download (https?://\S+)"),
+    Ecosystem("go", r"golang", "/cache/gomod", {"GOMODCACHE": "/cache/gomod"},
+              miss=r"go: downloading "),
+    Ecosystem("cargo", r"rust", "/usr/local/cargo/registry", {},
+              miss=r"Downloaded \S+ v"),
+]
+
+class DependencyCache:
+    """
+    Shared per-ecosystem package caches for sandbox containers.
+
+    Each ecosystem is a named Docker volume (`<volume_prefix><name>`) mounted
+    into every container whose image uses it. Jobs hold a shared flock on
+    `<lock_dir>/<name>.lock` while the volume is mounted; eviction (oldest
+    accessed files first, once the volume is over `max_bytes`) only runs
+    when it can take that lock exclusively, i.e. no job is using the cache.
+
+    Measuring and trimming a volume walks all of it, so it is kept off the
+    jobs' path: start() runs evict() every `interval` seconds in a background
+    thread, in a throwaway `helper_image` container that mounts the volume.
+    """
+    def __init__(self, lock_dir, max_bytes, volume_prefix="ai-ci-deps-", helper_image="debian:bookworm-slim"):
+        self.lock_dir = lock_dir
+        self.max_bytes = max_bytes
+        self.volume_prefix = volume_prefix
+        self.helper_image = helper_image
+        self.sizes = {}  # ecosystem name -> volume size in bytes at the last eviction pass
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def start(self, interval):
+        """Runs evict() every `interval` seconds in a background thread."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.warning(f"DependencyCache: Eviction pass failed: {e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def evict(self):
+        """Measures each cache volume not in use and trims it to 90% of max_bytes if it is over."""
+        for ecosystem in ECOSYSTEMS:
+            volume = f"{self.volume_prefix}{ecosystem.name}"
+            exists = subprocess.run(["docker", "volume", "inspect", volume], capture_output=True)
+            if exists.returncode != 0:
+                continue
+            fd = open(os.path.join(self.lock_dir, f"{ecosystem.name}.lock"), 'a')
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fd.close()
+                continue  # a job is using the cache; the next pass will try again
+            try:
+                self._trim(ecosystem, volume)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                fd.close()
+
+    def _trim(self, ecosystem, volume):
+        target = int(self.max_bytes * 0.9)
+        # Prints the size before trimming, then deletes the oldest accessed files past the target
+        script = (
+            f"size=$(( $(du -sk /cache | cut -f1) * 1024 )); echo $size; "
+            f"if [ $size -gt {self.max_bytes} ]; then "
+            f"find /cache -type f -printf '%A@ %s %p\\n' | sort -n | "
+            f"awk -v over=$(( size - {target} )) 'over > 0 {{ print substr($0, index($0, $3)); over -= $2 }}' | "
+            f"xargs -r -d '\\n' rm -f; fi"
+        )
+        result = subprocess.run(
+            ["docker", "run", "--rm", "-v", f"{volume}:/cache", self.helper_image, "sh", "-c", script],
+            capture_output=True, text=True,
+        )
+        try:
+            size = int(result.stdout.split()[0])
+        except (IndexError, ValueError):
+            logger.warning(f"DependencyCache: Could not measure {volume}: {result.stderr.strip()}")
+            return
+        self.sizes[ecosystem.name] = size
+        if size > self.max_bytes:
+            logger.info(f"DependencyCache: Trimmed the {ecosystem.name} cache from {_mb(size)} to ~{_mb(target)}")
+
+    def ecosystem_for(self, image):
+        for ecosystem in ECOSYSTEMS:
+            if ecosystem.image_pattern.search(image.split('/')[-1]):
+                return ecosystem
+        return None
+
+    def docker_args(self, image):
+        """Extra `docker run` arguments mounting the cache for `image` (empty if none applies)."""
+        ecosystem = self.ecosystem_for(image)
+        if ecosystem is None:
+            return []
+        args = ["-v", f"{self.volume_prefix}{ecosystem.name}:{ecosystem.path}"]
+        for key, value in ecosystem.env.items():
+            args.extend(["-e", f"{key}={value}"])
+        return args
+
+    def session(self, image, container):
+        """Starts using the cache from `container`. Returns a CacheSession, or None if no cache applies."""
+        ecosystem = self.ecosystem_for(image)
+        if ecosystem is None:
+            return None
+        return CacheSession(self, ecosystem, container)
+
+class CacheSession:
+    """One container's use of an ecosystem cache: holds the lease and counts hits and downloads."""
+    def __init__(self, cache, ecosystem, container):
+        self.cache = cache
+        self.ecosystem = ecosystem
+        self.container = container
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self._lease = open(os.path.join(cache.lock_dir, f"{ecosystem.name}.lock"), 'a')
+        fcntl.flock(self._lease, fcntl.LOCK_SH)
+
+    def observe(self, line):
+        """Counts cache hits and downloads reported in one line of command output."""
+        eco = self.ecosystem
+        if eco.hit:
+            match = eco.hit.search(line)
+            if match:
+                self.hits += 1
+                self.bytes_saved += _parse_size(match.group(1)) if match.groups() else 0
+                return
+        if eco.miss:
+            match = eco.miss.search(line)
+            if match:
+                self.misses += 1
+                self.bytes_downloaded += _parse_size(match.group(1)) if match.groups() else 0
+
+    def finish(self):
+        """Releases the lease; eviction happens in the cache's background pass."""
+        fcntl.flock(self._lease, fcntl.LOCK_UN)
+        self._lease.close()
+
+    def summary(self):
+        text = f"{self.ecosystem.name} cache: {self.hits} hits, {self.misses} downloads"
+        if self.bytes_saved:
+            text += f", ~{_mb(self.bytes_saved)} served from cache"
+        if self.bytes_downloaded:
+            text += f", ~{_mb(self.bytes_downloaded)} downloaded"
+        size = self.cache.sizes.get(self.ecosystem.name)
+        if size is not None:
+            text += f", volume {_mb(size)}"
+        return text
@@ -0,0 +1,94 @@
+import time
+import logging
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ImageManager:
+    """
+    Keeps sandbox images available on the Docker host.
+
+    Images are pulled in background threads: a configured set at startup
+    and any image a job asks for as soon as it is requested, so the pull
+    overlaps with the rest of the job instead of blocking a tool call.
+    Which images are local is tracked in memory (checked once with
+    `docker image inspect`, then updated after each pull).
+    """
+    def __init__(self):
+        self._local = set()
+        self._pulls = {}  # image -> threading.Event set when its pull has finished
+        self._errors = {}  # image -> last pull error
+        self._lock = threading.Lock()
+        self.pulled = 0
+        self.pull_seconds = 0.0
+
+    def start(self, images):
+        """Pre-pulls `images` in the background."""
+        for image in images:
+            self.request(image)
+
+    def is_local(self, image):
+        with self._lock:
+            return image in self._local
+
+    def request(self, image):
+        """Makes sure `image` is, or is being, pulled. Returns immediately."""
+        with self._lock:
+            if image in self._local or image in self._pulls:
+                return
+            done = self._pulls[image] = threading.Event()
+        threading.Thread(target=self._pull, args=(image, done), daemon=True).start()
+
+    def _pull(self, image, done):
+        try:
+            if subprocess.run(["docker", "image", "inspect", image], capture_output=True).returncode == 0:
+                with self._lock:
+                    self._local.add(image)
+                return
+            logger.info(f"ImageManager: Pulling {image}...")
+            start = time.monotonic()
+            result = subprocess.run(["docker", "pull", "-q", image], capture_output=True, text=True)
+            seconds = time.monotonic() - start
+            with self._lock:
+                if result.returncode == 0:
+                    self._local.add(image)
+                    self._errors.pop(image, None)
+                    self.pulled += 1
+                    self.pull_seconds += seconds
+                else:
+                    self._errors[image] = result.stderr.strip()
+            if result.returncode == 0:
+                logger.info(f"ImageManager: Pulled {image} in {seconds:.1f}s")
+            else:
+                logger.warning(f"ImageManager: Pull of {image} failed: {result.stderr.strip()}")
+        finally:
+            with self._lock:
+                self._pulls.pop(image, None)
+            done.set()
+
+    def wait(self, image, timeout=None):
+        """
+        Blocks until `image` is local (requesting it if needed).
+        Returns True if it is, False if the pull failed or timed out.
+        """
+        self.request(image)
+        with self._lock:
+            done = self._pulls.get(image)
+        if done is not None:
+            done.wait(timeout)
+        return self.is_local(image)
+
+    def error(self, image):
+        with self._lock:
+            return self._errors.get(image)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "local": sorted(self._local),
+                "pulling": sorted(self._pulls),
+                "failed": sorted(self._errors),
+                "pulled": self.pulled,
+                "pull_seconds": round(self.pull_seconds, 1),
+            }
@@ -0,0 +1,91 @@
+import re
+from collections import deque
+
+ERROR_LINE = re.compile(r"error|exception|traceback|failed|failure|fatal|assert", re.IGNORECASE)
+
+class OutputCapture:
+    """
+    Bounded capture of a command's output, fed one line at a time.
+
+    Keeps the first `head` lines, the last `tail` lines and up to
+    `max_errors` error-looking lines in between; everything else is only
+    counted (and written to `spool`, a binary file object, if given).
+    Memory use stays fixed however much the command prints.
+    """
+    def __init__(self, head=50, tail=150, max_errors=50, max_line=2000, spool=None):
+        self.head = head
+        self.max_errors = max_errors
+        self.max_line = max_line
+        self.spool = spool
+        self.head_lines = []
+        self.tail_lines = deque(maxlen=tail)  # (line number, text)
+        self.error_lines = []  # (line number, text) seen after the head
+        self.total_bytes = 0
+        self.total_lines = 0
+        self._partial = b""  # start of a line that has not ended yet
+        self._partial_cut = 0  # bytes of it not kept
+
+    def feed(self, raw):
+        """
+        Adds raw output (bytes) as read line by line. A line longer than the
+        reader's buffer arrives in pieces; pieces without a newline are held
+        until the line ends. Returns the completed line decoded, without the
+        newline, or None while the line is incomplete.
+        """
+        self.total_bytes += len(raw)
+        if self.spool is not None:
+            self.spool.write(raw)
+        if not raw.endswith(b"\n"):
+            keep = max(0, self.max_line * 4 - len(self._partial))
+            self._partial += raw[:keep]
+            self._partial_cut += max(0, len(raw) - keep)
+            return None
+        if self._partial:
+            raw, self._partial = self._partial + raw, b""
+        return self._add(raw)
+
+    def flush(self):
+        """Adds the last line if the output did not end with a newline. Returns it like feed()."""
+        if not self._partial and not self._partial_cut:
+            return None
+        raw, self._partial = self._partial, b""
+        return self._add(raw)
+
+    def _add(self, raw):
+        self.total_lines += 1
+        cut, self._partial_cut = self._partial_cut, 0
+        line = raw.decode(errors="replace").rstrip("\r\n")
+        if len(line) > self.max_line or cut:
+            line = line[:self.max_line] + f"... [{len(line) - self.max_line + cut} chars cut]"
+
+        if len(self.head_lines) < self.head:
+            self.head_lines.append(line)
+            return line
+        if not self.tail_lines.maxlen:
+            self._keep_error(self.total_lines, line)
+            return line
+        if len(self.tail_lines) == self.tail_lines.maxlen:
+            self._keep_error(*self.tail_lines[0])
+        self.tail_lines.append((self.total_lines, line))
+        return line
+
+    def _keep_error(self, number, line):
+        """Keeps a line leaving the output (not in the head or tail) if it looks like an error."""
+        if len(self.error_lines) < self.max_errors and ERROR_LINE.search(line):
+            self.error_lines.append((number, line))
+
+    @property
+    def omitted(self):
+        return self.total_lines - len(self.head_lines) - len(self.tail_lines)
+
+    def text(self):
+        """The kept lines, with a marker (and the error lines) where output was left out."""
+        parts = list(self.head_lines)
+        if self.omitted:
+            parts.append(f"... [{self.omitted} lines omitted] ...")
+            if self.error_lines:
+                parts.append(f"[{len(self.error_lines)} error lines from the omitted part]")
+                parts.extend(f"{number}: {line}" for number, line in self.error_lines)
+                parts.append("[...]")
+        parts.extend(line for _, line in self.tail_lines)
+        return "\n".join(parts)
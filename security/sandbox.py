@@ -1,65 +1,379 @@
 import subprocess
 import os
+import uuid
+import time
+import math
+import signal
+import resource
+import threading
+import itertools
+from security.output_capture import OutputCapture
+
+def mount_args(host_path):
+    """
+    docker -v/-w arguments to make `host_path` visible in a container.
+    Returns (args, host_root, container_root): paths under host_root are
+    found under container_root inside the container.
+    """
+    # Check if running in Docker-outside-of-Docker mode
+    dood_mode = os.getenv("DOCKER_CONTAINER_MODE") == "true"
+    shared_vol = os.getenv("SHARED_VOL_NAME")
+    workspace_base = os.getenv("WORKSPACE_BASE", "/workspace_data")
+
+    if dood_mode and shared_vol and host_path.startswith(workspace_base):
+        # We are in a container, writing to a mounted volume.
+        # The Host Docker Engine only knows the volume name, not the path inside our container.
+        # So we mount the named volume to /workspace_mount in the sibling container.
+        return ["-v", f"{shared_vol}:/workspace_mount"], workspace_base, "/workspace_mount"
+    # Standard host mode
+    return ["-v", f"{os.path.abspath(host_path)}:/workspace"], os.path.abspath(host_path), "/workspace"
+
+def container_path(work_dir, host_root, container_root):
+    """Path of host `work_dir` inside a container that mounts host_root at container_root."""
+    rel = os.path.relpath(os.path.abspath(work_dir), host_root)
+    return container_root if rel == "." else f"{container_root}/{rel}"
+
+def start_container(image, name, host_path, max_age, labels=(), extra_args=()):
+    """
+    Starts a detached container that idles for `max_age` seconds (then exits
+    and is removed), with `host_path` mounted. Returns (host_root, container_root).
+    Raises RuntimeError if docker fails.
+    """
+    args, host_root, container_root = mount_args(host_path)
+    # --init reaps the processes of commands killed on timeout
+    cmd = ["docker", "run", "-d", "--rm", "--init", "--name", name]
+    for label in labels:
+        cmd.extend(["--label", label])
+    cmd.extend(args)
+    cmd.extend(extra_args)
+    cmd.extend([image, "sleep", str(int(max_age))])
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"docker run {image} failed: {result.stderr.strip()}")
+    return host_root, container_root
+
+def resource_args(cpus=None, memory=None, pids_limit=None):
+    """docker run limits: CPUs (fractional), memory (e.g. '4g', swap disabled) and max processes."""
+    args = []
+    if cpus:
+        args.extend(["--cpus", str(cpus)])
+    if memory:
+        args.extend(["--memory", str(memory), "--memory-swap", str(memory)])
+    if pids_limit:
+        args.extend(["--pids-limit", str(int(pids_limit))])
+    return args
+
+_BYTE_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+def parse_bytes(text):
+    """Docker-style size ('512m', '4g', '1024') in bytes."""
+    text = str(text).strip().lower()
+    unit = text[-1] if text and text[-1] in _BYTE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * _BYTE_UNITS[unit])
+
+def rlimits(cpus=None, memory=None, timeout=None):
+    """
+    Soft limits for a local (non-Docker) command, as ulimit arguments
+    [(flag, value)]: `memory` of data segment (heap and anonymous mappings,
+    not reserved address space) and, with a timeout, `timeout * cpus` seconds
+    of CPU time. They are per process, so they bound a runaway command rather
+    than the command's total like a container's cgroup does. Values are
+    capped at the current hard limits, which are left alone.
+    """
+    wanted = []
+    if memory:
+        wanted.append(("-d", resource.RLIMIT_DATA, parse_bytes(memory) // 1024))  # ulimit counts KiB
+    if timeout and cpus:
+        wanted.append(("-t", resource.RLIMIT_CPU, math.ceil(timeout * float(cpus))))
+    limits = []
+    for flag, res, value in wanted:
+        hard = resource.getrlimit(res)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard // 1024 if flag == "-d" else hard)
+        limits.append((flag, value))
+    return limits
+
+def limited_command(command, limits):
+    """argv running `command` with sh under `limits` (see rlimits()), set by the shell before it starts."""
+    ulimits = " && ".join(f"ulimit -S {flag} {value}" for flag, value in limits)
+    return ["/bin/sh", "-c", f'{ulimits} && exec /bin/sh -c "$1"', "sh", command]
+
+def container_peak_memory(name):
+    """Peak memory use in bytes of a container's cgroup (v2 memory.peak, v1 max_usage), or None."""
+    result = subprocess.run(
+        ["docker", "exec", name, "sh", "-c",
+         "cat /sys/fs/cgroup/memory.peak 2>/dev/null || cat /sys/fs/cgroup/memory/memory.max_usage_in_bytes"],
+        capture_output=True, text=True,
+    )
+    try:
+        return int(result.stdout.split()[0])
+    except (IndexError, ValueError):
+        return None
+
+def session_rss(sid):
+    """Total resident memory in bytes of the processes in session `sid` (Linux /proc), or None."""
+    total = 0
+    page = os.sysconf("SC_PAGE_SIZE")
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[3]) == sid:  # field 6, session id
+                total += int(fields[21]) * page  # field 24, rss in pages
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+# Runs a command in a container, recording the pid of its shell so a timeout can kill just this command
+EXEC_WRAPPER = 'echo $$ > {pidfile}; sh -c "$1"; status=$?; rm -f {pidfile}; exit $status'
+
+# Kills the process whose pid is in {pidfile} and all its descendants (by walking /proc)
+KILL_TREE = (
+    "root=$(cat {pidfile} 2>/dev/null) || exit 0; "
+    "awk -v root=$root 'FNR == 1 {{ split(FILENAME, p, \"/\"); sub(/.*\\) /, \"\"); parent[p[3]] = $2 }} "
+    "END {{ kill[root] = 1; do {{ n = 0; for (pid in parent) if (!(pid in kill) && (parent[pid] in kill)) "
+    "{{ kill[pid] = 1; n++ }} }} while (n); for (pid in kill) print pid }}' /proc/[0-9]*/stat 2>/dev/null | "
+    "xargs -r kill -9 2>/dev/null; rm -f {pidfile}"
+)
+
+def kill_in_container(name, pidfile):
+    """Kills a command started with EXEC_WRAPPER, and everything it started, leaving the container running."""
+    try:
+        subprocess.run(["docker", "exec", name, "sh", "-c", KILL_TREE.format(pidfile=pidfile)],
+                       capture_output=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        pass
+
+def remove_container(name):
+    subprocess.run(["docker", "rm", "-f", name], capture_output=True)
+
+class CommandResult:
+    """Outcome of Sandbox.run(): exit code, the bounded output, size totals, time and memory."""
+    def __init__(self, exit_code, output, capture, log_path=None, seconds=0.0, peak_memory=None, timed_out=False,
+                 stderr=""):
+        self.exit_code = exit_code
+        self.output = output
+        self.stderr = stderr  # bounded stderr when it was captured separately, else "" (merged into output)
+        self.total_bytes = capture.total_bytes
+        self.total_lines = capture.total_lines
+        self.omitted_lines = capture.omitted
+        self.log_path = log_path
+        self.seconds = seconds
+        self.peak_memory = peak_memory  # bytes; for Docker the container's peak so far
+        self.timed_out = timed_out
 
 class Sandbox:
     """
     Wrapper for running commands in a secure container (e.g. gVisor or just isolated Docker).
+
+    In Docker mode a sandbox is a session: the first command starts one
+    container for the job (taken from `pool`, a ContainerPool, when it has
+    a warm one for the image) and every command runs in it with `docker exec`,
+    so state such as installed dependencies carries over between steps.
+    close() removes the container; changing the image replaces it.
+    With a `dep_cache` (DependencyCache) the image's package cache volume
+    is mounted and its use is summarized in `cache_summaries`.
+    With an `images` ImageManager, set_image() starts pulling the image in
+    the background and the container starts once the pull is done, before
+    any command timeout starts counting.
+    `limits` are extra docker run arguments (see resource_args) so concurrent
+    jobs cannot starve each other of CPU, memory or processes. Without Docker,
+    `local_limits` (rlimits() arguments: cpus, memory) are set as soft ulimits
+    by the shell running each command.
     """
-    def __init__(self, image="python:3.11-slim", use_docker=False):
+    CONTAINER_MAX_AGE = 4 * 3600  # safety net: idle containers exit on their own
+
+    def __init__(self, image="python:3.11-slim", use_docker=False, pool=None, dep_cache=None, images=None, limits=(),
+                 local_limits=None):
         self.image = image
+        self.limits = list(limits)
+        self.local_limits = local_limits or {}
         self.use_docker = use_docker
+        self.pool = pool
+        self.dep_cache = dep_cache
+        self.images = images
+        self.container = None  # (name, image, host_root, container_root) of the session container
+        self.cache_session = None  # DependencyCache session of the current container
+        self.cache_summaries = []  # one line per finished cache session
+        self._lock = threading.Lock()
 
     def set_image(self, image):
         """Sets the docker image to use."""
         self.image = image
+        if self.use_docker and self.images:
+            self.images.request(image)
+
+    def image_ready(self):
+        """False while the current image is still being pulled."""
+        return not (self.use_docker and self.images) or self.images.is_local(self.image)
+
+    def _session(self, work_dir):
+        """Returns the session container for the current image, starting it if needed."""
+        with self._lock:
+            if self.container and self.container[1] != self.image:
+                self._drop_container()
+            if self.container is None:
+                if self.images:
+                    self.images.wait(self.image)
+                warm = self.pool.acquire(self.image, work_dir) if self.pool else None
+                if warm:
+                    name, host_root, container_root = warm
+                else:
+                    name = f"ai-ci-{uuid.uuid4().hex[:12]}"
+                    extra = self.limits + (self.dep_cache.docker_args(self.image) if self.dep_cache else [])
+                    host_root, container_root = start_container(
+                        self.image, name, work_dir or os.getcwd(), self.CONTAINER_MAX_AGE, extra_args=extra
+                    )
+                self.container = (name, self.image, host_root, container_root)
+                if self.dep_cache:
+                    self.cache_session = self.dep_cache.session(self.image, name)
+            return self.container
+
+    def _drop_container(self):
+        """Ends the cache session and removes the session container. Caller holds self._lock."""
+        if self.cache_session:
+            self.cache_session.finish()
+            self.cache_summaries.append(self.cache_session.summary())
+            self.cache_session = None
+        remove_container(self.container[0])
+        self.container = None
+
+    def close(self):
+        """Tears down the session container, if any."""
+        with self._lock:
+            if self.container:
+                self._drop_container()
 
     def run_command(self, command, work_dir=None):
         """
         Runs a command. If use_docker is True, runs in container. Otherwise runs locally.
+        Returns (stdout, stderr), each bounded like run()'s output.
+        """
+        result = self.run(command, work_dir=work_dir, stderr_capture=OutputCapture())
+        return result.output, result.stderr
+
+    def run(self, command, work_dir=None, timeout=None, on_line=None, spool_path=None, capture=None,
+            stderr_capture=None):
         """
-        if not self.use_docker:
-            # Local execution
+        Runs a command and streams its output (stdout and stderr interleaved)
+        line by line into `capture` (an OutputCapture; default limits if None),
+        so memory stays bounded. Each line is passed to `on_line` as it arrives
+        and the full output is written to `spool_path` if given. With a
+        `stderr_capture`, stderr is kept apart in it instead (CommandResult.stderr).
+        A command killed after `timeout` seconds reports exit code 124, like timeout(1).
+        Returns a CommandResult.
+        """
+        capture = capture or OutputCapture()
+        spool = None
+        if spool_path:
+            try:
+                os.makedirs(os.path.dirname(spool_path), exist_ok=True)
+                spool = capture.spool = open(spool_path, "wb")
+            except OSError:
+                spool_path = None
+
+        container = None
+        if self.use_docker:
             try:
-                result = subprocess.run(
-                    command, 
-                    shell=True, 
-                    cwd=work_dir, 
-                    capture_output=True, 
-                    text=True
-                )
-                return result.stdout, result.stderr
-            except Exception as e:
-                return "", str(e)
-
-        # Docker execution
-        cmd = ["docker", "run", "--rm"]
-        
-        # Check if running in Docker-outside-of-Docker mode
-        dood_mode = os.getenv("DOCKER_CONTAINER_MODE") == "true"
-        shared_vol = os.getenv("SHARED_VOL_NAME")
-        workspace_base = os.getenv("WORKSPACE_BASE", "/workspace_data")
-
-        # Mount workspace
-        if work_dir:
-            if dood_mode and shared_vol and work_dir.startswith(workspace_base):
-                # We are in a container, writing to a mounted volume.
-                # The Host Docker Engine only knows the volume name, not the path inside our container.
-                # So we mount the named volume to /workspace_mount in the sibling container.
-                # And we set WORKDIR to the subdirectory.
-                
-                rel_path = os.path.relpath(work_dir, workspace_base)
-                # WORKDIR inside the sibling container
-                container_work_path = f"/workspace_mount/{rel_path}"
-                
-                cmd.extend(["-v", f"{shared_vol}:/workspace_mount", "-w", container_work_path])
-            elif os.path.exists(work_dir):
-                # Standard host mode
-                cmd.extend(["-v", f"{os.path.abspath(work_dir)}:/workspace", "-w", "/workspace"])
-            
-        cmd.extend([
-            self.image,
-            "sh", "-c", command
-        ])
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.stdout, result.stderr
+                container, _, host_root, container_root = self._session(work_dir)
+            except RuntimeError as e:
+                if spool:
+                    spool.close()
+                return CommandResult(1, str(e), capture, spool_path)
+            pidfile = f"/tmp/.ai-ci-{uuid.uuid4().hex[:12]}.pid"
+            args = ["docker", "exec", "-w", container_path(work_dir or host_root, host_root, container_root),
+                    container, "sh", "-c", EXEC_WRAPPER.format(pidfile=pidfile), "sh", command]
+        else:
+            # Limits are set by the shell that runs the command, not in this (multithreaded) process
+            limits = rlimits(**self.local_limits, timeout=timeout)
+            args = limited_command(command, limits) if limits else command
+
+        try:
+            proc = subprocess.Popen(
+                args,
+                shell=isinstance(args, str),
+                cwd=None if self.use_docker else work_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE if stderr_capture else subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except Exception as e:
+            if spool:
+                spool.close()
+            return CommandResult(1, str(e), capture, spool_path)
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            if container:
+                # Killing `docker exec` leaves the command running in the container; kill
+                # it there. The container and any commands running beside it stay up.
+                kill_in_container(container, pidfile)
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        start = time.monotonic()
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        peak = {"rss": None}
+        finished = threading.Event()
+        if not container:
+            # The command runs in its own session: sample the memory of all its processes
+            def sample():
+                while not finished.wait(0.5):
+                    rss = session_rss(proc.pid)
+                    if rss is not None and (peak["rss"] is None or rss > peak["rss"]):
+                        peak["rss"] = rss
+            threading.Thread(target=sample, daemon=True).start()
+        errors = None
+        if stderr_capture:
+            def read_stderr():
+                for raw in iter(lambda: proc.stderr.readline(65536), b""):
+                    stderr_capture.feed(raw)
+                stderr_capture.flush()
+            errors = threading.Thread(target=read_stderr, daemon=True)
+            errors.start()
+        try:
+            # None at the end flushes a last line without a newline
+            for raw in itertools.chain(iter(lambda: proc.stdout.readline(65536), b""), [None]):
+                line = capture.feed(raw) if raw is not None else capture.flush()
+                if line is None:
+                    continue
+                if self.cache_session:
+                    self.cache_session.observe(line)
+                if on_line:
+                    try:
+                        on_line(line)
+                    except Exception:
+                        pass
+            proc.wait()
+            if errors:
+                errors.join()
+        finally:
+            finished.set()
+            if timer:
+                timer.cancel()
+            proc.stdout.close()
+            if proc.stderr:
+                proc.stderr.close()
+            if spool:
+                spool.close()
+        seconds = round(time.monotonic() - start, 2)
+
+        stderr = stderr_capture.text() if stderr_capture else ""
+        if timed_out.is_set():
+            return CommandResult(124, capture.text() + f"\nCommand timed out after {timeout}s", capture, spool_path,
+                                 seconds=seconds, timed_out=True, stderr=stderr)
+        peak_memory = container_peak_memory(container) if container else peak["rss"]
+        return CommandResult(proc.returncode, capture.text(), capture, spool_path,
+                             seconds=seconds, peak_memory=peak_memory, stderr=stderr)
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import subprocess
+
+# Config is read at import time: point every path at a scratch directory first
+SCRATCH = tempfile.mkdtemp(prefix="ai-ci-tests-")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH, 'ci.db')}"
+os.environ["SANDBOX_USE_DOCKER"] = "false"
+for name, path in {
+    "JOB_QUEUE_LOCK_PATH": "job-queue.lock",
+    "REPO_CACHE_DIR": "repos",
+    "REPO_INDEX_PATH": "repo_index.sqlite3",
+    "CODE_INDEX_DIR": "code-index",
+    "LLM_CACHE_PATH": "llm_cache.sqlite3",
+    "ARTIFACTS_DIR": "artifacts",
+    "DEP_CACHE_LOCK_DIR": "deps",
+    "TEST_INDEX_DIR": "test-index",
+}.items():
+    os.environ[name] = os.path.join(SCRATCH, path)
+
+import pytest
+from flask import Flask
+from app.models import db
+from app.database import engine_options
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare Flask app with the models on a fresh SQLite database."""
+    app = Flask(__name__)
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+class GitRepo:
+    """A throwaway git repository with a helper to commit files."""
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.git("init", "-q", "-b", "main")
+
+    def git(self, *args):
+        result = subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                                cwd=self.path, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    def commit(self, files, message="change"):
+        """Writes {relative path: content} (None deletes) and commits. Returns the commit sha."""
+        for name, content in files.items():
+            path = os.path.join(self.path, name)
+            if content is None:
+                os.remove(path)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+        return self.git("rev-parse", "HEAD")
+
+@pytest.fixture
+def make_repo(tmp_path):
+    """Factory for GitRepos under tmp_path, by name."""
+    return lambda name: GitRepo(tmp_path / name)
+
+@pytest.fixture
+def git_repo(make_repo):
+    return make_repo("origin")
+
+@pytest.fixture
+def client():
+    """Test client of the real app (app.main) with the Job and Log tables emptied."""
+    from app.main import app as main_app
+    from app.models import Job, Log
+    with main_app.app_context():
+        Log.query.delete()
+        Job.query.delete()
+        db.session.commit()
+    return main_app.test_client()
+
+@pytest.fixture(scope="session")
+def llm_configs():
+    """llm_configs for AgentTeam, pointed at an endpoint that is never called."""
+    from agents.model_router import ModelRouter
+    return ModelRouter("test-key", "http://127.0.0.1:9/v1", "test-model", strong_model="strong-model").llm_configs()
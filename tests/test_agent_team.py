@@ -0,0 +1,50 @@
+import pytest
+from agents.team import AgentTeamPool, JobContext
+
+@pytest.fixture
+def pool(llm_configs):
+    return AgentTeamPool(llm_configs, size=1)
+
+def test_teams_are_reused_across_jobs(pool, tmp_path):
+    with pool.checkout(JobContext(str(tmp_path))) as first:
+        pass
+    with pool.checkout(JobContext(str(tmp_path))) as second:
+        pass
+    assert first is second
+    assert pool.created == 1
+
+def test_concurrent_jobs_get_their_own_team(pool, tmp_path):
+    with pool.checkout(JobContext(str(tmp_path))) as first:
+        with pool.checkout(JobContext(str(tmp_path))) as second:
+            assert first is not second
+    assert pool.created == 2
+
+def test_tools_act_on_the_bound_job(pool, tmp_path):
+    for name in ("one", "two"):
+        repo = tmp_path / name
+        repo.mkdir()
+        with pool.checkout(JobContext(str(repo))) as team:
+            assert team.write_file("/notes/job.txt", name).startswith("Successfully")
+            assert "Exit code: 0" in team.run_shell_command("cat notes/job.txt")
+            assert name in team.run_shell_command("cat notes/job.txt")
+    assert (tmp_path / "one" / "notes" / "job.txt").read_text() == "one"
+    assert (tmp_path / "two" / "notes" / "job.txt").read_text() == "two"
+
+def test_reset_clears_conversation_state(pool, tmp_path):
+    with pool.checkout(JobContext(str(tmp_path))) as team:
+        team.groupchat.messages.append({"role": "user", "content": "hi", "name": "Admin"})
+        team.exclude(team.scanner)
+        team.debugger.client = team.debugger_escalated_client
+    assert team.context is None
+    assert team.groupchat.messages == []
+    assert team.scanner in team.groupchat.agents
+    assert team.debugger.client is team.debugger_default_client
+
+def test_team_that_fails_to_reset_is_dropped(pool, tmp_path, monkeypatch):
+    def reset():
+        raise RuntimeError("stuck")
+
+    with pool.checkout(JobContext(str(tmp_path))) as broken:
+        monkeypatch.setattr(broken, "reset", reset)
+    with pool.checkout(JobContext(str(tmp_path))) as team:
+        assert team is not broken
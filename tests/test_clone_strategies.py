@@ -0,0 +1,68 @@
+import os
+import pytest
+from git import Repo
+from app import utils
+
+@pytest.fixture
+def origin(git_repo):
+    git_repo.commit({"src/app.py": "print(1)\n", "docs/guide.md": "# Guide\n"}, "first")
+    git_repo.commit({"src/app.py": "print(2)\n"}, "second")
+    git_repo.git("config", "uploadpack.allowFilter", "true")
+    git_repo.git("config", "uploadpack.allowAnySHA1InWant", "true")
+    git_repo.url = f"file://{git_repo.path}"
+    return git_repo
+
+@pytest.fixture
+def sandbox_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "SANDBOX_ROOT", str(tmp_path / "sandbox"))
+    monkeypatch.setattr(utils, "repo_cache", None)
+
+def test_shallow_fetches_only_the_pushed_commit(origin, tmp_path):
+    sha = origin.git("rev-parse", "HEAD~1")
+    path = str(tmp_path / "shallow")
+    utils._checkout_shallow(origin.url, sha, path)
+    repo = Repo(path)
+    assert repo.head.commit.hexsha == sha
+    assert repo.git.rev_list("--count", "HEAD") == "1"
+
+def test_partial_clone_has_history_but_filters_blobs(origin, tmp_path):
+    path = str(tmp_path / "partial")
+    utils._checkout_partial(origin.url, origin.git("rev-parse", "HEAD"), path)
+    repo = Repo(path)
+    assert repo.git.rev_list("--count", "HEAD") == "2"
+    assert repo.git.config("remote.origin.partialclonefilter") == "blob:none"
+
+def test_sparse_checkout_materializes_only_the_configured_paths(origin, tmp_path):
+    path = str(tmp_path / "sparse")
+    utils._checkout_sparse(origin.url, origin.git("rev-parse", "HEAD"), path, ["src"])
+    assert os.path.exists(os.path.join(path, "src", "app.py"))
+    assert not os.path.exists(os.path.join(path, "docs"))
+
+def test_clone_repository_reports_stats(origin, sandbox_root):
+    stats = {}
+    path = utils.clone_repository(origin.url, origin.git("rev-parse", "HEAD"), stats=stats, strategy="shallow")
+    try:
+        assert stats["strategy"] == "shallow"
+        assert stats["cache_hit"] is False
+        assert stats["bytes_fetched"] > 0
+    finally:
+        utils.cleanup_repository(path)
+    assert not os.path.exists(path)
+
+def test_shallow_falls_back_to_a_full_clone(origin, sandbox_root, monkeypatch):
+    def refuse(*args):
+        raise RuntimeError("server does not allow fetching a SHA")
+    monkeypatch.setattr(utils, "_checkout_shallow", refuse)
+    stats = {}
+    sha = origin.git("rev-parse", "HEAD~1")
+    path = utils.clone_repository(origin.url, sha, stats=stats, strategy="shallow")
+    try:
+        assert stats["strategy"] == "full"
+        assert Repo(path).head.commit.hexsha == sha
+    finally:
+        utils.cleanup_repository(path)
+
+def test_failed_clone_leaves_nothing_behind(sandbox_root, tmp_path):
+    with pytest.raises(Exception):
+        utils.clone_repository(f"file://{tmp_path}/missing", "0" * 40)
+    assert not os.path.exists(utils.SANDBOX_ROOT) or not os.listdir(utils.SANDBOX_ROOT)
@@ -0,0 +1,77 @@
+import pytest
+from agents.code_index import CodeIndex, chunk_lines, terms, indexable
+
+URL = "https://github.com/example/demo"
+
+CLIENT = '''import time
+
+
+def fetch(url):
+    return request(url)
+
+
+@retry
+def fetch_with_backoff(url, attempts=3):
+    for attempt in range(attempts):
+        time.sleep(2 ** attempt)
+    return fetch(url)
+'''
+
+def test_terms_split_identifiers():
+    assert terms("parseHTTPResponse(max_retries=3)") == \
+        ["parsehttpresponse", "parse", "http", "response", "max_retries", "max", "retries", "3"]
+
+def test_chunks_start_at_definitions():
+    lines = CLIENT.splitlines()
+    assert chunk_lines(lines, 60) == [(1, 12)]
+    assert chunk_lines(lines, 5) == [(1, 3), (4, 7), (8, 12)]  # the decorator stays with its function
+
+def test_long_blocks_are_cut_into_overlapping_windows():
+    lines = ["def big():"] + [f"    x = {i}" for i in range(29)]
+    assert chunk_lines(lines, 12) == [(1, 12), (11, 22), (21, 30)]
+    assert chunk_lines(["", "   ", ""], 10) == []
+
+def test_vendored_and_generated_files_are_not_indexed():
+    assert indexable("src/app.py") and indexable("Dockerfile") and indexable("docs/guide.md")
+    assert not indexable("node_modules/lib/index.js")
+    assert not indexable("static/app.min.js") and not indexable("package-lock.json")
+    assert not indexable("assets/logo.png")
+
+@pytest.fixture
+def repo(git_repo):
+    git_repo.commit({
+        "client/http.py": CLIENT,
+        "app/models.py": "class User:\n    name = None\n\n\nclass Order:\n    total = 0\n",
+        "README.md": "# Demo\n\nA demo application.\n",
+    })
+    return git_repo
+
+def test_search_ranks_matching_chunks(repo, tmp_path):
+    search = CodeIndex(str(tmp_path / "index"), chunk_lines=6).open(repo.path, URL)
+    assert search.stats["files"] == 3 and search.stats["chunked"] == 3
+    hits = search.search("retry with backoff", top_k=3)
+    assert (hits[0].path, hits[0].start, hits[0].end) == ("client/http.py", 8, 12)
+    assert search.search("Order total")[0].path == "app/models.py"
+    assert search.search("???") == [] and search.search("nonexistentidentifier") == []
+    text = search.format("backoff", hits[:1])
+    assert text.startswith("Top 1 matches for 'backoff' (BM25):\n\n[1] client/http.py:8-12\n    8  @retry\n")
+
+def test_jobs_only_see_their_own_files(repo, tmp_path):
+    index = CodeIndex(str(tmp_path / "index"), chunk_lines=6)
+    old = repo.git("rev-parse", "HEAD")
+    repo.commit({"client/cache.py": "def cached_response(key):\n    return store[key]\n"})
+    newer = index.open(repo.path, URL)
+    assert newer.search("cached_response")[0].path == "client/cache.py"
+
+    repo.git("checkout", "-q", old)
+    older = index.open(repo.path, URL)
+    assert older.stats["chunked"] == 0  # every version is already indexed
+    assert older.search("cached_response") == []
+
+def test_rewritten_files_are_reindexed(repo, tmp_path):
+    search = CodeIndex(str(tmp_path / "index"), chunk_lines=6).open(repo.path, URL)
+    with open(f"{repo.path}/app/models.py", "w") as f:
+        f.write("class Invoice:\n    amount = 0\n")
+    search.refresh("app/models.py")
+    assert search.search("Invoice amount")[0].path == "app/models.py"
+    assert search.search("Order total") == []
@@ -0,0 +1,95 @@
+import signal
+import resource
+import pytest
+from agents.command_timeouts import TimeoutAdvisor, command_key, command_phase, strip_timeout
+from security.sandbox import Sandbox, parse_bytes, rlimits
+
+REPO = "https://github.com/example/app"
+
+def test_similar_commands_share_a_key():
+    assert strip_timeout("timeout --preserve-status 5s mvn test") == "mvn test"
+    assert command_key("timeout 5s pip install -r requirements.txt && python -m pytest -q tests/") == \
+        "pip install && python -m pytest"
+    assert command_key("cd app && npm ci") == "npm ci"
+    assert command_key("mvn -B -q test > out.log 2>&1") == command_key("mvn test") == "mvn test"
+    assert command_key('python -c "print(1)"') == "python"
+
+def test_commands_fall_into_phases():
+    assert command_phase("pip install -r requirements.txt") == "install"
+    assert command_phase("npm ci") == "install"
+    assert command_phase("python -m pytest -q") == "test"
+    assert command_phase("mvn -B package") == "build"
+    assert command_phase("ls -la") == "other"
+
+def test_timeouts_come_from_the_image_profile_without_history():
+    advisor = TimeoutAdvisor(REPO)  # no app context: profiles only
+    assert advisor.timeout_for("mvn -B package", "maven:3.9-eclipse-temurin-17") == (1200, "build profile")
+    assert advisor.timeout_for("mvn -B package", "ubuntu:22.04") == (600, "build profile")
+    assert advisor.timeout_for("ls", "python:3.11-slim") == (60, "other profile")
+
+def test_recorded_durations_drive_later_timeouts(app):
+    with app.app_context():
+        advisor = TimeoutAdvisor(REPO)
+        advisor.record("python -m pytest -q", 100)
+        advisor.record("python -m pytest -q tests/unit", 200, timed_out=True)
+        advisor.record("ls", 1)
+
+    with app.app_context():
+        later = TimeoutAdvisor(REPO)  # a later job reads the history back
+        seconds, reason = later.timeout_for("timeout 5s python -m pytest", "python:3.11-slim")
+        # avg 150, recent max 200: max(2 * 200, 3 * 150)
+        assert seconds == 450
+        assert reason == "history of 'python -m pytest': 2 runs, avg 150s, max 200s, timed out last time"
+        assert later.timeout_for("ls")[0] == 30  # never under SANDBOX_TIMEOUT_MIN
+        assert TimeoutAdvisor("https://github.com/example/other").timeout_for("python -m pytest -q")[1] == "test profile"
+
+def test_resource_limits_for_local_commands():
+    assert parse_bytes("512m") == 512 * 1024 ** 2
+    assert parse_bytes("4g") == 4 * 1024 ** 3
+    assert parse_bytes("1.5k") == 1536
+    assert parse_bytes(2048) == 2048
+    limits = rlimits(cpus=2, memory="1g", timeout=10.5)
+    data_hard, cpu_hard = (resource.getrlimit(r)[1] for r in (resource.RLIMIT_DATA, resource.RLIMIT_CPU))
+    assert limits == [
+        ("-d", 1024 ** 2 if data_hard == resource.RLIM_INFINITY else min(1024 ** 2, data_hard // 1024)),
+        ("-t", 21 if cpu_hard == resource.RLIM_INFINITY else min(21, cpu_hard)),
+    ]
+    assert rlimits(cpus=2) == []  # no CPU time limit without a timeout
+
+def test_local_limits_are_off_by_default(tmp_path):
+    from app.config import Config
+    assert not Config.SANDBOX_LOCAL_LIMITS
+    output = Sandbox().run("ulimit -S -d", work_dir=str(tmp_path)).output
+    assert output == str(resource.getrlimit(resource.RLIMIT_DATA)[0]).replace(str(resource.RLIM_INFINITY),
+                                                                               "unlimited")
+
+def test_local_commands_run_under_the_limits(tmp_path):
+    sandbox = Sandbox(local_limits={"memory": "256m"})
+    result = sandbox.run('python3 -c "b = bytearray(512 * 1024 * 1024)"', work_dir=str(tmp_path))
+    assert result.exit_code != 0 and "MemoryError" in result.output
+    assert sandbox.run('python3 -c "b = bytearray(16 * 1024 * 1024)"', work_dir=str(tmp_path)).exit_code == 0
+    # Reserving address space (as the JVM does for its heap) is not using memory
+    (tmp_path / "reserve.py").write_text(
+        "import ctypes\n"
+        "libc = ctypes.CDLL(None)\n"
+        "libc.mmap.restype = ctypes.c_void_p\n"
+        "# 8 GiB, PROT_NONE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE\n"
+        "address = libc.mmap(None, ctypes.c_size_t(8 << 30), 0, 0x4022, -1, 0)\n"
+        "raise SystemExit(address == ctypes.c_void_p(-1).value)\n"
+    )
+    assert sandbox.run("python3 reserve.py", work_dir=str(tmp_path)).exit_code == 0
+    # Soft limits only: the hard limits stay as they were
+    hard = resource.getrlimit(resource.RLIMIT_DATA)[1]
+    assert sandbox.run("ulimit -H -d", work_dir=str(tmp_path)).output == \
+        ("unlimited" if hard == resource.RLIM_INFINITY else str(hard // 1024))
+
+def test_cpu_time_is_limited_by_timeout_and_cpus(tmp_path):
+    sandbox = Sandbox(local_limits={"cpus": 0.5})
+    result = sandbox.run('python3 -c "while True: pass"', work_dir=str(tmp_path), timeout=3)
+    assert not result.timed_out and result.exit_code == 128 + signal.SIGXCPU
+
+def test_commands_are_killed_after_their_timeout(tmp_path):
+    result = Sandbox().run("echo started; sleep 30", work_dir=str(tmp_path), timeout=0.5)
+    assert result.exit_code == 124 and result.timed_out
+    assert result.seconds < 10
+    assert result.output.splitlines() == ["started", "Command timed out after 0.5s"]
@@ -0,0 +1,68 @@
+import itertools
+import pytest
+import security.container_pool as container_pool
+from security.container_pool import ContainerPool
+
+@pytest.fixture
+def docker(monkeypatch):
+    """Fake start_container/remove_container recording the containers started and removed."""
+    calls = {"started": [], "removed": []}
+    counter = itertools.count()
+
+    def start_container(image, name, host_path, max_age, labels=(), extra_args=()):
+        calls["started"].append((image, host_path, list(labels), list(extra_args)))
+        return container_pool.mount_args(host_path)[1:]
+
+    monkeypatch.setattr(container_pool, "start_container", start_container)
+    monkeypatch.setattr(container_pool, "remove_container", calls["removed"].append)
+    monkeypatch.setattr(container_pool.uuid, "uuid4", lambda: type("U", (), {"hex": f"{next(counter):012d}"})())
+    return calls
+
+def pool(root, **kwargs):
+    pool = ContainerPool(root, ["python:3.11-slim"], **kwargs)
+    pool._refill_async = pool._refill  # warm up synchronously
+    return pool
+
+def test_pool_is_off_when_jobs_mount_only_their_checkout(tmp_path, monkeypatch, docker):
+    monkeypatch.delenv("DOCKER_CONTAINER_MODE", raising=False)
+    host = pool(str(tmp_path / "jobs"))
+    host.start()
+    assert not host.enabled
+    assert docker["started"] == []
+    assert host.acquire("python:3.11-slim", str(tmp_path / "jobs" / "job-1")) is None
+    assert host.stats() == {"enabled": False, "idle": {"python:3.11-slim": 0}, "hits": 0, "misses": 1}
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOCKER_CONTAINER_MODE", "true")
+    monkeypatch.setenv("SHARED_VOL_NAME", "ai-ci-workspace")
+    monkeypatch.setenv("WORKSPACE_BASE", str(tmp_path))
+    return tmp_path
+
+def test_warm_containers_are_handed_out_once_and_replaced(workspace, docker):
+    shared = pool(str(workspace / "jobs"), size=1, limits=["--cpus", "2"])
+    shared.start()
+    assert shared.enabled
+    assert docker["started"] == [("python:3.11-slim", str(workspace / "jobs"), [ContainerPool.LABEL], ["--cpus", "2"])]
+
+    warm = shared.acquire("python:3.11-slim", str(workspace / "jobs" / "job-1"))
+    assert warm == ("ai-ci-warm-000000000000", str(workspace), "/workspace_mount")
+    assert len(docker["started"]) == 2  # replaced right away
+    assert shared.acquire("python:3.11-slim", str(workspace / "jobs" / "job-2")) == \
+        ("ai-ci-warm-000000000001", str(workspace), "/workspace_mount")
+    assert shared.acquire("node:20", str(workspace / "jobs" / "job-3")) is None
+    assert shared.stats()["hits"] == 2 and shared.stats()["misses"] == 1
+
+    shared.shutdown()
+    assert docker["removed"] == ["ai-ci-warm-000000000002"]
+
+def test_stale_containers_and_foreign_mounts_are_not_used(workspace, tmp_path_factory, docker):
+    shared = pool(str(workspace / "jobs"), max_age=10)
+    shared.start()
+    name, host_root, container_root, _ = shared._idle["python:3.11-slim"][0]
+    shared._idle["python:3.11-slim"][0] = (name, host_root, container_root, -100.0)
+    outside = str(tmp_path_factory.mktemp("elsewhere"))
+    assert shared.acquire("python:3.11-slim", outside) is None
+    assert shared.acquire("python:3.11-slim", str(workspace / "jobs" / "job-1")) is None
+    assert docker["removed"] == [name]
+    shared.shutdown()
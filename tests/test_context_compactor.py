@@ -0,0 +1,80 @@
+import os
+import pytest
+from agents.context_compactor import ContextCompactor, ToolOutputStore, summarize_output, message_tokens
+from agents.team import JobContext
+
+def build_log(n=400):
+    lines = [f"compiling module {i} of the project" for i in range(n)]
+    lines[n // 2] = "ERROR: cannot find symbol Foo in Bar.java"
+    return "\n".join(lines)
+
+def tool_message(text):
+    return {"role": "tool", "content": text, "tool_responses": [{"tool_call_id": "1", "role": "tool", "content": text}]}
+
+def history(recent=4):
+    messages = [{"role": "user", "name": "Admin", "content": "Tasks: build and test " + "please " * 300}]
+    messages.append({"role": "assistant", "name": "Builder", "content": None,
+                     "tool_calls": [{"id": "1", "function": {"name": "run_shell_command", "arguments": "{}"}}]})
+    messages.append(tool_message(build_log()))
+    messages.append({"role": "assistant", "name": "Builder", "content": "analysis " * 800})
+    messages.extend({"role": "assistant", "name": "Tester", "content": f"recent {i}"} for i in range(recent))
+    return messages
+
+def total(messages):
+    return sum(message_tokens(m) for m in messages)
+
+@pytest.fixture
+def context(tmp_path):
+    context = JobContext(str(tmp_path))
+    context.tool_outputs = ToolOutputStore(str(tmp_path / "artifacts"))
+    return context
+
+def compactor(budget, context):
+    compactor = ContextCompactor(budget, keep_recent=4, min_output_tokens=50)
+    compactor.context = context
+    return compactor
+
+def test_history_under_budget_is_sent_as_is(context):
+    messages = history()
+    assert compactor(10 ** 6, context).apply(messages) is messages
+
+def test_old_tool_outputs_are_summarized_first(context):
+    messages = history()
+    full = total(messages)
+    budget = full - message_tokens(messages[2]) + 400
+    compacted = compactor(budget, context).apply(messages, "Builder")
+    output = compacted[2]["tool_responses"][0]["content"]
+    assert "lines omitted, full output: tool-output-1" in output
+    assert "ERROR: cannot find symbol Foo" in output
+    assert compacted[3] == messages[3]  # long messages are only cut after all outputs are reduced
+    assert compacted[-4:] == messages[-4:]
+    # Only what is sent changes, never the stored history
+    assert messages[2]["tool_responses"][0]["content"] == build_log()
+    assert open(os.path.join(context.tool_outputs.directory, "tool-output-1.log")).read() == build_log()
+    assert context.context_stats["tokens_saved"] == full - total(compacted) > 0
+
+def test_tighter_budgets_stub_outputs_then_cut_messages(context):
+    messages = history()
+    stubbed = compactor(total(messages) - message_tokens(messages[2]) + 100, context).apply(messages)
+    assert stubbed[2]["content"] == "[tool output tool-output-1 omitted to fit the context budget]"
+    assert stubbed[3] == messages[3]
+    assert len(context.tool_outputs) == 1  # the stub points to the raw output, not to its summary
+
+    cut = compactor(300, context).apply(messages)
+    assert cut[3]["content"].endswith("[message truncated to fit the context budget]")
+    assert cut[0] == messages[0]  # the task message is never cut
+    assert len(cut) == len(messages)
+
+def test_summary_keeps_head_tail_and_errors():
+    summary = summarize_output(build_log(), "ref-1", head=2, tail=3)
+    lines = summary.splitlines()
+    assert lines[:2] == ["compiling module 0 of the project", "compiling module 1 of the project"]
+    assert lines[-1] == "compiling module 399 of the project"
+    assert "ERROR: cannot find symbol Foo in Bar.java" in lines
+    assert "full output: ref-1" in summary
+
+def test_outputs_are_stored_once(tmp_path):
+    store = ToolOutputStore(str(tmp_path))
+    assert store.put("same") == store.put("same") == "tool-output-1"
+    assert store.put("other") == "tool-output-2"
+    assert len(store) == 2
@@ -0,0 +1,52 @@
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+from app.models import db
+from app.database import database_url, engine_options, configure_engine, upgrade_database
+
+def test_heroku_style_postgres_urls_are_rewritten():
+    assert database_url("postgres://u:p@h/db") == "postgresql://u:p@h/db"
+    assert database_url("sqlite:///ci.db") == "sqlite:///ci.db"
+
+def test_engine_options_per_backend():
+    assert set(engine_options("sqlite:///ci.db")) == {"connect_args"}
+    options = engine_options("postgresql://u:p@h/db")
+    assert options["pool_pre_ping"] is True
+    assert "pool_size" in options and "max_overflow" in options
+
+@pytest.fixture
+def bare_app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'ci.db'}"
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_sqlite_connections_use_wal(bare_app):
+    with db.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+def model_columns():
+    return {name: {c.name for c in table.columns} for name, table in db.metadata.tables.items()}
+
+def schema_columns():
+    inspector = inspect(db.engine)
+    return {name: {c["name"] for c in inspector.get_columns(name)}
+            for name in inspector.get_table_names() if name != "alembic_version"}
+
+def test_migrations_build_the_models_schema(bare_app):
+    upgrade_database(db)
+    assert schema_columns() == model_columns()
+    # Running again is a no-op
+    upgrade_database(db)
+
+def test_schema_without_migration_history_is_stamped(bare_app):
+    db.create_all()
+    upgrade_database(db)
+    with db.engine.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    assert schema_columns() == model_columns()
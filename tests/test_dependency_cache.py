@@ -0,0 +1,80 @@
+import os
+import subprocess
+import pytest
+import security.dependency_cache as dependency_cache
+from security.dependency_cache import DependencyCache
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    """
+    Fake docker CLI: only the pip volume exists, at tmp_path/volume; helper
+    containers run their script locally against it.
+    """
+    volume = tmp_path / "volume"
+    volume.mkdir()
+    helpers = []
+    run = subprocess.run
+
+    def fake_run(cmd, **kwargs):
+        if cmd[:3] == ["docker", "volume", "inspect"]:
+            return subprocess.CompletedProcess(cmd, 0 if cmd[3] == "ai-ci-deps-pip" else 1, b"", b"")
+        assert cmd[:3] == ["docker", "run", "--rm"] and cmd[4] == "ai-ci-deps-pip:/cache"
+        helpers.append(cmd)
+        return run(["sh", "-c", cmd[-1].replace("/cache", str(volume))], **kwargs)
+
+    monkeypatch.setattr(dependency_cache.subprocess, "run", fake_run)
+    return volume, helpers
+
+def test_images_get_their_ecosystem_cache(tmp_path):
+    cache = DependencyCache(str(tmp_path / "locks"), 10 ** 9)
+    assert cache.docker_args("registry.example.com/library/python:3.11-slim") == [
+        "-v", "ai-ci-deps-pip:/cache/pip", "-e", "PIP_CACHE_DIR=/cache/pip"]
+    assert cache.ecosystem_for("maven:3.9-eclipse-temurin-17").name == "maven"
+    assert cache.ecosystem_for("gradle:8-jdk17").name == "gradle"
+    assert cache.docker_args("ubuntu:22.04") == []
+    assert cache.session("ubuntu:22.04", "c1") is None
+
+def test_session_counts_hits_and_downloads(tmp_path):
+    cache = DependencyCache(str(tmp_path / "locks"), 10 ** 9)
+    cache.sizes["pip"] = 3 * 1024 ** 2
+    session = cache.session("python:3.11-slim", "c1")
+    for line in [
+        "  Using cached requests-2.31.0-py3-none-any.whl (62 kB)",
+        "  Downloading numpy-1.26.4-cp311-cp311-manylinux.whl (18.2 MB)",
+        "Installing collected packages: requests, numpy",
+    ]:
+        session.observe(line)
+    session.finish()
+    assert (session.hits, session.misses) == (1, 1)
+    assert (session.bytes_saved, session.bytes_downloaded) == (62000, 18200000)
+    assert session.summary() == ("pip cache: 1 hits, 1 downloads, ~0.1 MB served from cache, "
+                                 "~17.4 MB downloaded, volume 3.0 MB")
+
+def test_eviction_removes_the_oldest_accessed_files(tmp_path, docker):
+    volume, helpers = docker
+    for i in range(10):
+        path = volume / f"pkg-{i}.whl"
+        path.write_bytes(b"x" * 100 * 1024)
+        os.utime(path, (1_000_000 + i, 1_000_000 + i))
+    cache = DependencyCache(str(tmp_path / "locks"), 500 * 1024)
+    cache.evict()
+    assert len(helpers) == 1
+    assert cache.sizes["pip"] > 500 * 1024
+    left = sorted(p.name for p in volume.iterdir())
+    assert "pkg-9.whl" in left and "pkg-0.whl" not in left
+    assert len(left) * 100 * 1024 <= cache.max_bytes * 0.9
+    assert left == [f"pkg-{i}.whl" for i in range(10 - len(left), 10)]
+
+    cache.evict()  # under the limit now: only measured
+    assert sorted(p.name for p in volume.iterdir()) == left
+    assert cache.sizes["pip"] <= cache.max_bytes
+
+def test_eviction_skips_caches_in_use(tmp_path, docker):
+    volume, helpers = docker
+    cache = DependencyCache(str(tmp_path / "locks"), 0)
+    session = cache.session("python:3.11-slim", "c1")
+    cache.evict()
+    assert helpers == [] and cache.sizes == {}
+    session.finish()
+    cache.evict()
+    assert len(helpers) == 1 and "pip" in cache.sizes
@@ -0,0 +1,66 @@
+import time
+import logging
+import pytest
+from agents import orchestrator as orchestrator_module
+from agents.orchestrator import CIOrchestrator
+from agents.stack_detector import Stack
+from agents.team import AgentTeamPool, JobContext
+from app.config import Config
+
+logger = logging.getLogger("test-fast-mode")
+
+@pytest.fixture
+def orchestrator():
+    # The fast-mode steps only use the job context, not the orchestrator's services
+    orch = CIOrchestrator.__new__(CIOrchestrator)
+    orch.test_selector = None
+    orch.code_index = None
+    return orch
+
+def context_with(tmp_path, build, test):
+    context = JobContext(str(tmp_path))
+    context.stack = Stack("Shell", "python:3.11", build, test, [])
+    return context
+
+def test_build_stops_at_the_first_failure(orchestrator, tmp_path):
+    context = context_with(tmp_path, ["true", "exit 3", "echo never"], ["echo tests"])
+    steps, passed = orchestrator._run_fast_steps(context, logger)
+    assert not passed
+    assert [(s["command"], s["exit_code"]) for s in steps] == [("true", 0), ("exit 3", 3)]
+
+def test_test_commands_run_in_parallel(orchestrator, tmp_path):
+    tests = ["sleep 0.6; echo one", "sleep 0.6; echo two", "sleep 0.6; echo three"]
+    context = context_with(tmp_path, ["true"], tests)
+    start = time.monotonic()
+    steps, passed = orchestrator._run_fast_steps(context, logger)
+    assert passed
+    assert time.monotonic() - start < 1.5
+    assert [s["command"] for s in steps if s["phase"] == "test"] == tests
+    assert "two" in steps[2]["output"]
+
+def test_one_failing_test_command_fails_the_run(orchestrator, tmp_path):
+    context = context_with(tmp_path, [], ["true", "false"])
+    steps, passed = orchestrator._run_fast_steps(context, logger)
+    assert not passed
+    assert [s["exit_code"] for s in steps] == [0, 1]
+
+def test_step_listing_keeps_the_end_of_long_outputs(orchestrator):
+    step = {"phase": "test", "command": "pytest", "exit_code": 1, "seconds": 2.0, "size": "x",
+            "output": "start " + "." * 100 + " the actual error"}
+    text = orchestrator._format_steps([step], limit=30)
+    assert "FAILED (exit code 1)" in text
+    assert "... (truncated)" in text and "the actual error" in text
+    assert "start" not in text
+
+def test_green_run_skips_the_groupchat(orchestrator, tmp_path, llm_configs, monkeypatch):
+    stack = Stack("Shell", "python:3.11", ["echo built"], ["echo tested"], ["Makefile"])
+    monkeypatch.setattr(orchestrator_module, "detect_stack", lambda path: (stack, "matched Makefile"))
+    monkeypatch.setattr(Config, "FAST_MODE_LLM_REPORT", False)
+    with AgentTeamPool(llm_configs).checkout(JobContext(str(tmp_path))) as team:
+        def no_chat(*args, **kwargs):
+            raise AssertionError("the GroupChat should not run")
+        monkeypatch.setattr(team.user_proxy, "initiate_chat", no_chat)
+        report = orchestrator._run_team(team, str(tmp_path), "", logger)
+    assert "✅ PASSED" in report
+    assert "fast mode (build and tests passed" in report
+    assert (tmp_path / "ci_report.md").read_text() == report
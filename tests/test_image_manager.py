@@ -0,0 +1,55 @@
+import threading
+import subprocess
+import pytest
+import security.image_manager as image_manager
+from security.image_manager import ImageManager
+from security.sandbox import Sandbox
+
+@pytest.fixture
+def docker(monkeypatch):
+    """Fake docker CLI: `python:3.11-slim` is local, pulls block until `release` is set, `missing:1` fails."""
+    state = {"pulls": [], "release": threading.Event()}
+
+    def fake_run(cmd, **kwargs):
+        image = cmd[-1]
+        if cmd[:3] == ["docker", "image", "inspect"]:
+            return subprocess.CompletedProcess(cmd, 0 if image == "python:3.11-slim" else 1, "", "")
+        state["pulls"].append(image)
+        state["release"].wait(5)
+        if image == "missing:1":
+            return subprocess.CompletedProcess(cmd, 1, "", "manifest for missing:1 not found")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    monkeypatch.setattr(image_manager.subprocess, "run", fake_run)
+    return state
+
+def test_local_images_are_not_pulled(docker):
+    images = ImageManager()
+    assert images.wait("python:3.11-slim", timeout=5)
+    assert docker["pulls"] == [] and images.pulled == 0
+
+def test_requested_images_are_pulled_once_in_the_background(docker):
+    images = ImageManager()
+    sandbox = Sandbox(use_docker=True, images=images)
+    sandbox.set_image("node:20")  # returns right away
+    images.request("node:20")
+    assert not sandbox.image_ready()
+    assert not images.wait("node:20", timeout=0.1)
+    assert images.stats()["pulling"] == ["node:20"]
+
+    docker["release"].set()
+    assert images.wait("node:20", timeout=5)
+    assert sandbox.image_ready()
+    assert docker["pulls"] == ["node:20"]
+    assert images.stats()["local"] == ["node:20"] and images.pulled == 1
+
+def test_failed_pulls_are_reported(docker):
+    docker["release"].set()
+    images = ImageManager()
+    images.start(["missing:1"])
+    assert not images.wait("missing:1", timeout=5)
+    assert images.error("missing:1") == "manifest for missing:1 not found"
+    assert images.stats()["failed"] == ["missing:1"]
+
+def test_local_sandboxes_do_not_wait_for_images():
+    assert Sandbox(use_docker=False, images=ImageManager()).image_ready()
@@ -0,0 +1,93 @@
+import threading
+from datetime import datetime, timedelta
+from app.models import db, Job
+from app.job_queue import JobQueue
+
+def add_jobs(app, count, status="queued", claimed_by=None):
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        for i in range(count):
+            db.session.add(Job(id=f"{status}-{i}", repo_url="https://github.com/o/r", commit_sha=f"{i:040x}",
+                               status=status, claimed_by=claimed_by, created_at=start + timedelta(seconds=i)))
+        db.session.commit()
+
+def test_claims_oldest_first(app):
+    add_jobs(app, 3)
+    queue = JobQueue(app, task=None)
+    assert [queue._claim_next()[-1] for _ in range(3)] == ["queued-0", "queued-1", "queued-2"]
+    assert queue._claim_next() is None
+    with app.app_context():
+        assert {job.claimed_by for job in Job.query.all()} == {queue.owner}
+
+def test_each_job_is_claimed_once_under_contention(app):
+    add_jobs(app, 40)
+    queues = [JobQueue(app, task=None) for _ in range(2)]
+    for i, queue in enumerate(queues):
+        queue.owner = f"host:{i}"  # as if in two processes
+    claimed = []
+    lock = threading.Lock()
+
+    def drain(queue):
+        while True:
+            job = queue._claim_next()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job[-1])
+
+    threads = [threading.Thread(target=drain, args=(q,)) for q in queues for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f"queued-{i}" for i in range(40))
+    with app.app_context():
+        assert Job.query.filter_by(status="queued").count() == 0
+
+def test_is_full(app):
+    add_jobs(app, 2)
+    with app.app_context():
+        assert JobQueue(app, task=None, max_queued=2).is_full()
+        assert not JobQueue(app, task=None, max_queued=3).is_full()
+        assert not JobQueue(app, task=None, max_queued=0).is_full()
+
+def test_only_one_queue_per_lock_runs_workers(app, tmp_path):
+    lock_path = str(tmp_path / "queue.lock")
+    first = JobQueue(app, task=None, lock_path=lock_path)
+    second = JobQueue(app, task=None, lock_path=lock_path)
+    assert first._try_lock()
+    assert not second._try_lock()
+    first._lock_file.close()
+    assert second._try_lock()
+
+def test_requeue_stale_only_touches_this_host(app):
+    queue = JobQueue(app, task=None)
+    add_jobs(app, 1, status="running", claimed_by=f"{queue.host}:1")
+    with app.app_context():
+        db.session.add(Job(id="other-host", repo_url="r", commit_sha="s", status="running", claimed_by="elsewhere:1"))
+        db.session.add(Job(id="unclaimed", repo_url="r", commit_sha="s", status="running"))
+        db.session.commit()
+    assert queue.requeue_stale() == 2
+    with app.app_context():
+        statuses = {job.id: job.status for job in Job.query.all()}
+    assert statuses == {"running-0": "queued", "unclaimed": "queued", "other-host": "running"}
+
+def test_workers_run_claimed_jobs(app):
+    add_jobs(app, 3)
+    done = []
+    finished = threading.Event()
+
+    def task(repo_url, commit_sha, pusher, branch, job_id):
+        done.append(job_id)
+        if len(done) == 3:
+            finished.set()
+
+    started = []
+    queue = JobQueue(app, task, size=2, poll_interval=0.1, on_start=lambda: started.append(True))
+    queue.start()
+    try:
+        assert finished.wait(10)
+    finally:
+        queue.stop()
+    assert started == [True]
+    assert sorted(done) == ["queued-0", "queued-1", "queued-2"]
@@ -0,0 +1,103 @@
+import json
+import pickle
+import sqlite3
+import pytest
+from openai.types.chat import ChatCompletion
+from agents.llm_cache import normalize_key, LLMResponseCache, JobLLMCache
+
+def request(content, temperature=0, model="m", **extra):
+    return json.dumps({"model": model, "temperature": temperature,
+                       "messages": [{"role": "user", "content": content}], **extra})
+
+def test_key_ignores_job_paths_and_whitespace():
+    one = normalize_key(request("Build /tmp/ai-ci-sandbox/aaaa  \n\n\n\nnow"), ["/tmp/ai-ci-sandbox/aaaa"])
+    two = normalize_key(request("Build /tmp/ai-ci-sandbox/bbbb\n\nnow\n"), ["/tmp/ai-ci-sandbox/bbbb"])
+    assert one == two
+
+def test_key_changes_with_model_messages_and_tools():
+    base = normalize_key(request("hi"))
+    assert normalize_key(request("hi", model="other")) != base
+    assert normalize_key(request("hello")) != base
+    assert normalize_key(request("hi", tools=[{"name": "run"}])) != base
+    # Fields outside the content address do not matter
+    assert normalize_key(request("hi", max_tokens=10)) == base
+
+def test_non_deterministic_or_invalid_requests_are_not_cached():
+    assert normalize_key(request("hi", temperature=0.7)) is None
+    assert normalize_key("not json") is None
+
+@pytest.fixture
+def store(tmp_path):
+    return LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_bytes=10 ** 6)
+
+def test_responses_are_scoped_by_repository(store):
+    store.set("github.com/o/a", "k", {"answer": 1})
+    assert store.get("github.com/o/a", "k") == {"answer": 1}
+    assert store.get("github.com/o/b", "k") is None
+    assert store.invalidate("github.com/o/a") == 1
+    assert store.get("github.com/o/a", "k") is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = LLMResponseCache(str(tmp_path / "llm.sqlite3"), max_bytes=2500)
+    store.set("r", "old", "x" * 1000)
+    store.set("r", "used", "x" * 1000)
+    assert store.get("r", "old")  # now more recent than "used"
+    store.set("r", "new", "x" * 1000)
+    assert store.get("r", "used") is None
+    assert store.get("r", "old") and store.get("r", "new")
+
+def test_job_view_counts_hits_and_misses(store):
+    job = JobLLMCache(store, "r", volatile=["/tmp/job-1"])
+    key = request("in /tmp/job-1")
+    assert job.get(key, "default") == "default"
+    job.set(key, "response")
+    # Another job of the same repository asking the same thing
+    other = JobLLMCache(store, "r", volatile=["/tmp/job-2"])
+    assert other.get(request("in /tmp/job-2")) == "response"
+    assert (job.hits, job.misses, other.hits) == (0, 1, 1)
+
+def completion(content):
+    response = ChatCompletion.model_validate({
+        "id": "c1", "created": 1, "model": "m", "object": "chat.completion",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+    })
+    response.cost = 0.25  # set by autogen before it caches the response
+    return response
+
+def test_completions_round_trip_as_json(store):
+    store.set("r", "k", completion("hi"))
+    value = sqlite3.connect(store.path).execute("SELECT value FROM responses").fetchone()[0]
+    assert json.loads(value)["chat_completion"]["choices"][0]["message"]["content"] == "hi"
+    cached = store.get("r", "k")
+    assert isinstance(cached, ChatCompletion)
+    assert cached.choices[0].message.content == "hi" and cached.cost == 0.25
+
+def test_unserialisable_values_are_not_cached(store):
+    store.set("r", "k", object())
+    assert store.get("r", "k") is None
+
+def test_pickled_entries_of_older_versions_are_dropped(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, repo TEXT NOT NULL, value BLOB NOT NULL,"
+                 " size INTEGER NOT NULL, last_used REAL NOT NULL)")
+    blob = pickle.dumps("old")
+    conn.execute("INSERT INTO responses VALUES ('r:k', 'r', ?, ?, 0)", (blob, len(blob)))
+    conn.commit()
+    conn.close()
+    store = LLMResponseCache(path, max_bytes=10 ** 6)
+    assert store.get("r", "k") is None
+    assert store.stats()["entries"] == 0
+
+def test_running_total_follows_every_write(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    store = LLMResponseCache(path, max_bytes=10 ** 6)
+    store.set("a", "k", "x" * 100)
+    store.set("a", "k", "x" * 300)  # replaced, not added
+    store.set("b", "k", "x" * 50)
+    # A second worker opening the same file shares the total
+    other = LLMResponseCache(path, max_bytes=10 ** 6)
+    other.invalidate("b")
+    actual = sqlite3.connect(path).execute("SELECT SUM(size) FROM responses").fetchone()[0]
+    assert store.stats()["bytes"] == actual == len(json.dumps({"value": "x" * 300}))
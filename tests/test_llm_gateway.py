@@ -0,0 +1,110 @@
+import copy
+import json
+import time
+import threading
+import pytest
+import agents.llm_gateway as llm_gateway
+from agents.llm_gateway import COMPLETION_ESTIMATE, Endpoint, LLMGateway, TokenBucket, estimate_tokens
+
+URL = "http://llm.example/v1"
+
+def test_token_bucket_refills_per_minute():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1) == pytest.approx(0.0)
+    bucket.take(90)  # more than estimated: later requests wait it off
+    assert bucket.wait_time(1000, now + 1) == pytest.approx(149.0)  # capped at one minute's worth
+    assert TokenBucket(0).wait_time(10 ** 9, now) == 0
+
+def test_request_tokens_are_estimated():
+    assert estimate_tokens({"messages": [], "max_tokens": 50}) == estimate_tokens({}) - COMPLETION_ESTIMATE + 50
+    assert estimate_tokens({"messages": [{"content": "word " * 400}]}) > estimate_tokens({}) + 300
+
+def test_jobs_are_admitted_round_robin():
+    endpoint = Endpoint(URL, 0, 0, max_concurrent=1)
+    endpoint.acquire("busy", 0)
+    admitted = []
+
+    def request(job):
+        endpoint.acquire(job, 0)
+        admitted.append(job)
+        endpoint.release(0, None, 0.0, 200)
+
+    threads = []
+    for job in ["a", "a", "a", "b"]:
+        queued = sum(len(q) for q in endpoint.waiting.values())
+        thread = threading.Thread(target=request, args=(job,))
+        thread.start()
+        threads.append(thread)
+        while sum(len(q) for q in endpoint.waiting.values()) == queued:
+            time.sleep(0.01)
+    assert endpoint.stats()["jobs_waiting"] == 2
+    endpoint.release(0, None, 0.0, 200)
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["a", "b", "a", "a"]
+    assert endpoint.stats()["requests"] == 5
+
+class Request:
+    def __init__(self, body):
+        self.content = json.dumps(body).encode()
+
+def respond(*responses):
+    responses = list(responses)
+    return lambda: responses.pop(0)
+
+class Response:
+    """The parts of an HTTP response the gateway reads."""
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = dict(headers or {}, **({"content-type": "application/json"} if body else {}))
+        self.body = body
+        self.closed = False
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        self.closed = True
+
+def ok(tokens=42):
+    return Response(200, body={"usage": {"total_tokens": tokens}})
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(llm_gateway.time, "sleep", sleeps.append)
+    return sleeps
+
+def test_throttled_requests_back_off_honoring_retry_after(sleeps):
+    gateway = LLMGateway(max_retries=3, backoff_base=0.01, backoff_max=60.0)
+    endpoint = gateway.http_client(URL).endpoint
+    send = respond(Response(429, headers={"retry-after": "0.3"}), Response(503), ok())
+    with gateway.job("job-1") as usage:
+        response = gateway.send(endpoint, send, Request({"model": "test-model", "messages": []}))
+    assert response.status_code == 200
+    assert sleeps[0] == 0.3  # Retry-After beats the first backoff step (5-10ms)
+    assert 0.01 <= sleeps[1] <= 0.02  # jittered second step
+    assert endpoint.paused_until > 0  # a 429 pauses the whole endpoint
+    assert usage["requests"] == 3 and usage["retries"] == 2 and usage["tokens"] == 42
+    assert usage["models"]["test-model"]["failures"] == 2
+    stats = endpoint.stats()
+    assert (stats["requests"], stats["retries"], stats["throttled"], stats["server_errors"]) == (3, 2, 1, 1)
+
+def test_retries_are_bounded(sleeps):
+    gateway = LLMGateway(max_retries=2, backoff_base=0.01, backoff_max=0.1)
+    endpoint = gateway.http_client(URL).endpoint
+    send = respond(*[Response(429, headers={"retry-after": "600"}) for _ in range(3)])
+    assert gateway.send(endpoint, send, Request({})).status_code == 429
+    assert sleeps == [0.1, 0.1]  # Retry-After is capped at backoff_max
+
+def test_endpoints_share_one_client_per_base_url():
+    gateway = LLMGateway()
+    client = gateway.http_client(URL)
+    assert gateway.http_client(URL) is client
+    assert copy.deepcopy({"http_client": client})["http_client"] is client  # autogen copies llm_config
+    assert gateway.http_client("http://other.example/v1") is not client
+    assert set(gateway.stats()) == {URL, "http://other.example/v1"}
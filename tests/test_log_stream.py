@@ -0,0 +1,76 @@
+import json
+from datetime import datetime
+from app.log_stream import LogBroker
+from app.models import db, Job, Log
+
+def lines(*ids):
+    return [{"id": i, "content": f"line {i}"} for i in ids]
+
+def test_wait_returns_lines_after_the_cursor():
+    broker = LogBroker()
+    broker.publish("job", lines(1, 2, 3))
+    got, missed, closed = broker.wait("job", 1, timeout=0)
+    assert [line["id"] for line in got] == [2, 3]
+    assert not missed and not closed
+
+def test_unknown_job_is_not_live():
+    assert LogBroker().wait("job", 0, timeout=0) is None
+
+def test_evicted_lines_are_reported_as_missed():
+    broker = LogBroker(buffer_size=2)
+    broker.publish("job", lines(1, 2, 3, 4))
+    got, missed, _ = broker.wait("job", 1, timeout=0)
+    assert missed
+    assert [line["id"] for line in got] == [3, 4]
+    assert not broker.wait("job", 3, timeout=0)[1]
+
+def test_close_ends_the_stream():
+    broker = LogBroker()
+    broker.publish("job", lines(1))
+    broker.close("job")
+    assert broker.wait("job", 1, timeout=5) == ([], False, True)
+
+def test_finished_jobs_are_dropped_first():
+    broker = LogBroker(max_jobs=2)
+    broker.publish("running", lines(1))
+    broker.publish("finished", lines(2))
+    broker.close("finished")
+    broker.publish("new", lines(3))
+    assert broker.wait("finished", 0, timeout=0) is None
+    assert broker.wait("running", 0, timeout=0) is not None
+
+def add_logs(count, status="success"):
+    from app.main import app
+    with app.app_context():
+        db.session.add(Job(id="job-1", repo_url="r", commit_sha="s", status=status))
+        db.session.add_all(Log(job_id="job-1", content=f"line {i}", timestamp=datetime.utcnow()) for i in range(count))
+        db.session.commit()
+        return [log.id for log in Log.query.order_by(Log.id)]
+
+def test_logs_api_pages_with_after_id(client):
+    ids = add_logs(5)
+    first = client.get("/api/jobs/job-1/logs?limit=3")
+    assert [log["id"] for log in first.json] == ids[:3]
+    cursor = first.headers["X-Next-Cursor"]
+    rest = client.get(f"/api/jobs/job-1/logs?limit=3&after_id={cursor}")
+    assert [log["id"] for log in rest.json] == ids[3:]
+    assert "X-Next-Cursor" not in rest.headers
+
+def events(response):
+    body = response.get_data(as_text=True)
+    return [chunk for chunk in body.split("\n\n") if chunk]
+
+def test_stream_of_a_finished_job_replays_the_database_and_ends(client):
+    ids = add_logs(3)
+    chunks = events(client.get("/api/jobs/job-1/logs/stream"))
+    assert chunks[-1] == "event: end\ndata: {}"
+    sent = [json.loads(chunk.split("data: ", 1)[1]) for chunk in chunks[:-1]]
+    assert [line["id"] for line in sent] == ids
+
+def test_stream_resumes_from_last_event_id(client):
+    ids = add_logs(3)
+    chunks = events(client.get("/api/jobs/job-1/logs/stream", headers={"Last-Event-ID": str(ids[0])}))
+    assert [chunk.split("\n")[0] for chunk in chunks[:-1]] == [f"id: {i}" for i in ids[1:]]
+
+def test_stream_of_a_missing_job_is_404(client):
+    assert client.get("/api/jobs/nope/logs/stream").status_code == 404
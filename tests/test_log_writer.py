@@ -0,0 +1,71 @@
+import queue
+import logging
+import threading
+import pytest
+from app.models import db, Job, Log
+from app import log_writer
+from app.log_writer import LogWriter, JobLogHandler
+from app.log_stream import LogBroker
+
+@pytest.fixture
+def writer(app):
+    app.config.update(LOG_BATCH_SIZE=100, LOG_FLUSH_INTERVAL_MS=50)
+    with app.app_context():
+        db.session.add(Job(id="job-1", repo_url="r", commit_sha="s"))
+        db.session.commit()
+    return LogWriter(app)
+
+def stored(app):
+    with app.app_context():
+        return [log.content for log in Log.query.filter_by(job_id="job-1").order_by(Log.id)]
+
+def test_lines_are_written_in_batches(app, writer):
+    for i in range(250):
+        assert writer.write("job-1", f"line {i}")
+    assert writer.flush()
+    assert stored(app) == [f"line {i}" for i in range(250)]
+    stats = writer.stats()
+    assert stats["written"] == 250 and stats["dropped"] == 0
+    assert 3 <= stats["batches"] < 250
+
+def test_committed_lines_are_published_with_their_ids(app, writer, monkeypatch):
+    broker = LogBroker()
+    monkeypatch.setattr(log_writer, "log_broker", broker)
+    writer.write("job-1", "hello")
+    writer.flush()
+    lines, missed, closed = broker.wait("job-1", 0, timeout=0)
+    assert [line["content"] for line in lines] == ["hello"]
+    with app.app_context():
+        assert lines[0]["id"] == Log.query.filter_by(job_id="job-1").one().id
+
+def test_full_queue_drops_instead_of_blocking():
+    writer = LogWriter()
+    writer._queue = queue.Queue(maxsize=1)  # no writer thread draining it
+    assert writer.write("job-1", "kept")
+    assert not writer.write("job-1", "dropped")
+    assert writer.stats()["dropped"] == 1
+
+def test_unbound_writer_drops_lines():
+    assert not LogWriter().write("job-1", "nowhere")
+
+def test_handler_keeps_only_its_job_threads(app, writer):
+    handler = JobLogHandler("job-1", writer=writer)
+    log = logging.getLogger("test-job-log")
+    log.setLevel(logging.INFO)
+    log.addHandler(handler)
+    try:
+        log.info("from the job thread")
+        other = threading.Thread(target=log.info, args=("from another job",))
+        other.start()
+        other.join()
+
+        def helper():
+            with handler.follow():
+                log.info("from a helper thread")
+        follower = threading.Thread(target=helper)
+        follower.start()
+        follower.join()
+    finally:
+        log.removeHandler(handler)
+    writer.flush()
+    assert stored(app) == ["from the job thread", "from a helper thread"]
@@ -0,0 +1,58 @@
+import pytest
+from agents.llm_gateway import llm_gateway
+from agents.model_router import ModelRouter, ROUTES
+from agents.team import AgentTeamPool, JobContext
+from app.config import Config
+
+MAIN = "http://llm.example/v1"
+LOCAL = "http://localhost:11434/v1"
+
+@pytest.fixture
+def router():
+    return ModelRouter("key", MAIN, "default-model", fast_model="small-model", strong_model="big-model",
+                       fallbacks=["backup-model", "default-model"], timeout=30,
+                       fast_base_url=LOCAL, fast_api_key="local-key")
+
+def test_tiers_put_their_model_before_the_fallbacks(router):
+    assert router.tiers == {
+        "fast": ["small-model", "default-model", "backup-model"],
+        "default": ["default-model", "backup-model"],
+        "strong": ["big-model", "default-model", "backup-model"],
+    }
+    assert router.describe() == ["fast:small-model>default-model>backup-model",
+                                 "default:default-model>backup-model",
+                                 "strong:big-model>default-model>backup-model"]
+    assert ModelRouter("key", MAIN, "only").tiers == {"fast": ["only"], "default": ["only"], "strong": ["only"]}
+
+def test_fast_tier_may_use_its_own_endpoint(router):
+    fast = router.config_list("fast")
+    assert [(e["model"], e["base_url"], e["api_key"]) for e in fast] == [
+        ("small-model", LOCAL, "local-key"), ("default-model", MAIN, "key"), ("backup-model", MAIN, "key"),
+    ]
+    assert fast[0]["http_client"] is llm_gateway.http_client(LOCAL)
+    assert all(e["max_retries"] == 0 and e["timeout"] == 30 for e in fast)
+
+def test_routes_pick_their_tier(router):
+    configs = router.llm_configs()
+    assert set(configs) == set(ROUTES)
+    assert configs["scanner"]["config_list"][0]["model"] == "small-model"
+    assert configs["builder"]["config_list"][0]["model"] == "default-model"
+    assert configs["debugger_escalated"]["config_list"][0]["model"] == "big-model"
+    assert configs["builder"]["temperature"] == 0 and configs["builder"]["cache_seed"] is None
+
+def test_debugger_escalates_after_failed_fixes_and_returns(llm_configs, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "DEBUGGER_ESCALATE_AFTER", 2)
+    context = JobContext(str(tmp_path))
+    with AgentTeamPool(llm_configs, size=1).checkout(context) as team:
+        selector, debugger = team.speaker_selector, team.debugger
+        selector.failed_fixes = 1
+        team._route_debugger([])
+        assert debugger.client is team.debugger_default_client
+        selector.failed_fixes = 2
+        team._route_debugger([])
+        assert debugger.client is team.debugger_escalated_client
+        assert context.notes == [("Model routing",
+                                  "Debugger escalated to `strong-model` after 2 fixes that did not make the stage pass")]
+        selector.failed_fixes = 0  # a stage passed
+        team._route_debugger([])
+        assert debugger.client is team.debugger_default_client
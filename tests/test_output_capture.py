@@ -0,0 +1,62 @@
+from security.output_capture import OutputCapture
+from security.sandbox import Sandbox
+
+def feed_lines(capture, lines):
+    for line in lines:
+        capture.feed(f"{line}\n".encode())
+
+def test_keeps_head_tail_and_errors_in_between():
+    capture = OutputCapture(head=2, tail=3, max_errors=1)
+    lines = [f"line {i}" for i in range(100)]
+    lines[10] = "ERROR: first"
+    lines[20] = "ERROR: second"
+    lines[98] = "ERROR: in the tail"
+    feed_lines(capture, lines)
+    assert capture.head_lines == ["line 0", "line 1"]
+    assert [line for _, line in capture.tail_lines] == ["line 97", "ERROR: in the tail", "line 99"]
+    assert capture.error_lines == [(11, "ERROR: first")]
+    assert capture.total_lines == 100 and capture.omitted == 95
+    assert capture.text().splitlines() == [
+        "line 0", "line 1", "... [95 lines omitted] ...",
+        "[1 error lines from the omitted part]", "11: ERROR: first", "[...]",
+        "line 97", "ERROR: in the tail", "line 99",
+    ]
+
+def test_errors_are_kept_without_a_tail():
+    capture = OutputCapture(head=1, tail=0)
+    feed_lines(capture, ["start", "ok", "Traceback (most recent call last):", "ok"])
+    assert capture.error_lines == [(3, "Traceback (most recent call last):")]
+    assert capture.omitted == 3
+
+def test_fragments_make_one_line_and_long_lines_are_cut(tmp_path):
+    with open(tmp_path / "spool.log", "wb") as spool:
+        capture = OutputCapture(max_line=10, spool=spool)
+        assert capture.feed(b"x" * 30) is None
+        assert capture.feed(b"x" * 30) is None
+        assert capture.feed(b"yy\n") == "x" * 10 + "... [52 chars cut]"
+        assert capture.feed(b"short\n") == "short"
+        assert capture.feed(b"no newline") is None
+        assert capture.flush() == "no newline"
+        assert capture.flush() is None
+    assert capture.total_lines == 3
+    assert capture.total_bytes == (tmp_path / "spool.log").stat().st_size == 79
+
+def test_sandbox_streams_output_into_the_capture(tmp_path):
+    seen = []
+    capture = OutputCapture(head=5, tail=5)
+    command = "for i in $(seq 1 1000); do echo line $i; done; echo 'fatal: broken' >&2; printf last"
+    result = Sandbox().run(command, work_dir=str(tmp_path), on_line=seen.append,
+                           spool_path=str(tmp_path / "out" / "spool.log"), capture=capture)
+    assert result.exit_code == 0
+    assert result.total_lines == len(seen) == 1002
+    assert seen[-2:] == ["fatal: broken", "last"]
+    assert result.omitted_lines == 992
+    assert result.output.splitlines()[-1] == "last"
+    assert (tmp_path / "out" / "spool.log").read_bytes().endswith(b"fatal: broken\nlast")
+
+def test_run_command_keeps_stdout_and_stderr_apart(tmp_path):
+    stdout, stderr = Sandbox().run_command("echo out; echo err >&2; printf tail >&2", work_dir=str(tmp_path))
+    assert stdout == "out"
+    assert stderr == "err\ntail"
+    result = Sandbox().run("echo out; echo err >&2", work_dir=str(tmp_path))
+    assert result.output.splitlines() == ["out", "err"] and result.stderr == ""
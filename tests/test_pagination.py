@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from app.main import encode_cursor, decode_cursor
+from app.models import db, Job
+
+def add_jobs(count):
+    from app.main import app
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        for i in range(count):
+            # Pairs of jobs share a timestamp, so the id has to break ties
+            db.session.add(Job(id=f"job-{i:02d}", repo_url="r", commit_sha="s", status="success",
+                               created_at=start + timedelta(seconds=i // 2), report_content=f"report {i}"))
+        db.session.commit()
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(created_at, "abc-2")) == (created_at, "abc-2")
+
+def test_pages_cover_every_job_once_newest_first(client):
+    add_jobs(7)
+    seen, cursor = [], None
+    while True:
+        response = client.get("/api/jobs?limit=2" + (f"&before={cursor}" if cursor else ""))
+        seen.extend(job["id"] for job in response.json)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [f"job-{i:02d}" for i in reversed(range(7))]
+
+def test_reports_are_left_out_unless_requested(client):
+    add_jobs(1)
+    assert "report_content" not in client.get("/api/jobs").json[0]
+    assert client.get("/api/jobs?fields=report_content").json[0]["report_content"] == "report 0"
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/jobs?before=not-a-cursor").status_code == 400
+
+def test_limit_is_clamped(client):
+    add_jobs(3)
+    assert len(client.get("/api/jobs?limit=0").json) == 1
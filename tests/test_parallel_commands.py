@@ -0,0 +1,62 @@
+import os
+import time
+import subprocess
+from agents.team import AgentTeamPool, JobContext
+from security.sandbox import EXEC_WRAPPER, KILL_TREE
+
+def test_batches_run_concurrently_and_return_in_order(tmp_path):
+    context = JobContext(str(tmp_path))
+    start = time.monotonic()
+    results = context.run_parallel(["sleep 1; echo first", "sleep 1; echo second; exit 3", "sleep 1; echo third"],
+                                   max_workers=3)
+    assert time.monotonic() - start < 2.5
+    assert [r.output for r in results] == ["first", "second", "third"]
+    assert [r.exit_code for r in results] == [0, 3, 0]
+    assert context.commands_run == 3
+
+def test_a_timed_out_command_does_not_end_the_batch(tmp_path):
+    results = JobContext(str(tmp_path)).run_parallel(["sleep 30", "sleep 0.2; echo done"], timeout=1)
+    assert results[0].timed_out and results[0].exit_code == 124
+    assert not results[1].timed_out and results[1].output == "done"
+
+def test_parallel_tool_reports_each_command(llm_configs, tmp_path):
+    with AgentTeamPool(llm_configs, size=1).checkout(JobContext(str(tmp_path))) as team:
+        report = team.run_shell_commands_parallel(["echo one", "", "echo two >&2; false"])
+    assert report.startswith("Ran 2 commands in parallel")
+    assert "[1] $ echo one\nExit code: 0" in report
+    assert "[2] $ echo two >&2; false\nExit code: 1" in report and "two" in report
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(") ")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+def descendants(pid):
+    children = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True).stdout.split()
+    return [p for child in map(int, children) for p in (child, *descendants(child))]
+
+def test_timeout_kill_ends_only_the_command_and_its_children(tmp_path):
+    """KILL_TREE as run in the container on timeout, here against local processes."""
+    pidfile = str(tmp_path / "command.pid")
+    bystander = subprocess.Popen(["sleep", "60"])
+    command = subprocess.Popen(["sh", "-c", EXEC_WRAPPER.format(pidfile=pidfile), "sh",
+                                "sleep 60 & sh -c 'sleep 60'; wait"])
+    try:
+        for _ in range(50):
+            if os.path.exists(pidfile):
+                break
+            time.sleep(0.1)
+        time.sleep(0.3)
+        shell = int(open(pidfile).read())
+        tree = descendants(shell)
+        assert len(tree) >= 3  # the command's shell and its two sleeps
+        subprocess.run(["sh", "-c", KILL_TREE.format(pidfile=pidfile)], timeout=30)
+        command.wait(timeout=10)
+        assert not any(alive(pid) for pid in [shell, *tree])
+        assert alive(bystander.pid)
+        assert not os.path.exists(pidfile)
+    finally:
+        bystander.kill()
+        command.kill()
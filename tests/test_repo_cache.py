@@ -0,0 +1,110 @@
+import os
+import time
+import shutil
+import pytest
+from git import Repo
+from app.repo_cache import RepoCache, object_bytes
+
+@pytest.fixture
+def cache(tmp_path):
+    return RepoCache(str(tmp_path / "cache"), max_bytes=0, gc_interval=0)
+
+def mirror_path(cache, url):
+    return os.path.join(cache.root, f"{cache._key(url)}.git")
+
+def test_checkout_is_self_contained(cache, git_repo, tmp_path):
+    sha = git_repo.commit({"app.py": "print('hi')\n"})
+    checkout = str(tmp_path / "job")
+    stats = {}
+    cache.materialize(git_repo.path, sha, checkout, stats)
+    cache.release(checkout)
+
+    assert stats["strategy"] == "mirror" and stats["cache_hit"] is False
+    assert not os.path.exists(os.path.join(checkout, ".git", "objects", "info", "alternates"))
+    assert Repo(checkout).remote().url == git_repo.path
+    # The sandbox only mounts the checkout: git must work without the cache
+    shutil.rmtree(cache.root)
+    assert Repo(checkout).head.commit.hexsha == sha
+
+def test_second_checkout_of_a_known_commit_is_a_hit(cache, git_repo, tmp_path):
+    sha = git_repo.commit({"a.txt": "a\n"})
+    cache.materialize(git_repo.path, sha, str(tmp_path / "one"))
+    stats = {}
+    cache.materialize(git_repo.path, sha, str(tmp_path / "two"), stats)
+    assert stats["cache_hit"] is True
+    assert stats["bytes_fetched"] == 0
+
+def test_new_commits_are_fetched_into_the_mirror(cache, git_repo, tmp_path):
+    git_repo.commit({"a.txt": "a\n"})
+    cache.materialize(git_repo.path, git_repo.git("rev-parse", "HEAD"), str(tmp_path / "one"))
+    sha = git_repo.commit({"b.txt": "b" * 10000})
+    stats = {}
+    cache.materialize(git_repo.path, sha, str(tmp_path / "two"), stats)
+    assert stats["cache_hit"] is False
+    assert stats["bytes_fetched"] > 0
+    assert os.path.exists(tmp_path / "two" / "b.txt")
+
+def test_commit_not_on_any_branch_is_fetched_by_sha(cache, git_repo, tmp_path):
+    git_repo.commit({"a.txt": "a\n"})
+    cache.materialize(git_repo.path, git_repo.git("rev-parse", "HEAD"), str(tmp_path / "one"))
+    orphan = git_repo.commit({"a.txt": "force-pushed away\n"})
+    git_repo.git("reset", "-q", "--hard", "HEAD~1")
+    git_repo.git("config", "uploadpack.allowAnySHA1InWant", "true")
+    cache.materialize(git_repo.path, orphan, str(tmp_path / "two"))
+    assert Repo(str(tmp_path / "two")).head.commit.hexsha == orphan
+
+def test_object_bytes_uses_git_counts(git_repo):
+    git_repo.commit({"data.bin": "x" * 50000})
+    assert object_bytes(git_repo.path) > 0
+    assert object_bytes(os.path.join(git_repo.path, "missing")) == 0
+
+def test_evicts_least_recently_used_unleased_mirrors(tmp_path, make_repo):
+    cache = RepoCache(str(tmp_path / "cache"), max_bytes=1, gc_interval=0)
+    repos = [make_repo(name) for name in ("old", "new")]
+    shas = [repo.commit({"f.txt": repo.path}) for repo in repos]
+    cache.materialize(repos[0].path, shas[0], str(tmp_path / "job-old"))
+    cache.materialize(repos[1].path, shas[1], str(tmp_path / "job-new"))
+    os.utime(mirror_path(cache, repos[0].path), (1, 1))
+
+    # Releasing only drops the lease; the newer mirror is still leased by its job
+    cache.release(str(tmp_path / "job-old"))
+    assert os.path.exists(mirror_path(cache, repos[0].path))
+    cache.evict()
+    assert not os.path.exists(mirror_path(cache, repos[0].path))
+    assert os.path.exists(mirror_path(cache, repos[1].path))
+    cache.release(str(tmp_path / "job-new"))
+    cache.evict()
+    assert not os.path.exists(mirror_path(cache, repos[1].path))
+
+def test_eviction_pass_repacks_mirrors_due_for_gc(tmp_path, git_repo):
+    cache = RepoCache(str(tmp_path / "cache"), max_bytes=0, gc_interval=3600)
+    sha = git_repo.commit({"a.txt": "a\n"})
+    cache.materialize(git_repo.path, sha, str(tmp_path / "job"))
+    key = cache._key(git_repo.path)
+    marker = os.path.join(cache.root, f"{key}.gc")
+    cache.release(str(tmp_path / "job"))
+    assert not os.path.exists(marker)
+    cache.evict()
+    assert os.path.exists(marker)
+    mirror = Repo(mirror_path(cache, git_repo.path))
+    assert "packs: 1" in mirror.git.count_objects("-v")
+
+    # Not due again within the interval
+    os.utime(marker, (100, 100))
+    cache._gc(mirror_path(cache, git_repo.path))
+    assert os.path.getmtime(marker) > 100
+    mtime = os.path.getmtime(marker)
+    cache._gc(mirror_path(cache, git_repo.path))
+    assert os.path.getmtime(marker) == mtime
+
+def test_background_pass_evicts(tmp_path, git_repo):
+    cache = RepoCache(str(tmp_path / "cache"), max_bytes=1, gc_interval=0)
+    sha = git_repo.commit({"a.txt": "a\n"})
+    cache.materialize(git_repo.path, sha, str(tmp_path / "job"))
+    cache.release(str(tmp_path / "job"))
+    cache.start(0.05)
+    for _ in range(100):
+        if not os.path.exists(mirror_path(cache, git_repo.path)):
+            break
+        time.sleep(0.05)
+    assert not os.path.exists(mirror_path(cache, git_repo.path))
@@ -0,0 +1,81 @@
+import pytest
+from agents.context_compactor import count_tokens
+from app.repo_index import RepoIndexer, file_score
+
+@pytest.fixture
+def indexer(tmp_path):
+    return RepoIndexer(str(tmp_path / "index" / "repo_index.sqlite3"), max_bytes=10 ** 7)
+
+@pytest.fixture
+def repo(git_repo):
+    files = {
+        "pyproject.toml": "[project]\n",
+        "README.md": "# Demo\n",
+        "app/main.py": "",
+        "node_modules/left-pad/index.js": "",
+        "node_modules/left-pad/package.json": "{}",
+    }
+    files.update({f"app/models/model_{i}.py": "" for i in range(100)})
+    files.update({f"tests/test_{i}.py": "" for i in range(30)})
+    git_repo.commit(files)
+    return git_repo
+
+def test_files_are_ranked_by_relevance():
+    ranked = sorted(["src/util.py", "README.md", "pom.xml", "src/main.py", "tests/test_util.py", "logo.png"],
+                    key=lambda path: -file_score(path))
+    assert ranked == ["pom.xml", "README.md", "src/main.py", "tests/test_util.py", "src/util.py", "logo.png"]
+
+def test_summary_fits_the_budget_and_collapses_vendored_directories(repo, indexer):
+    stats = {}
+    text = indexer.summarize(repo.path, budget=200, stats=stats)
+    assert count_tokens(text) <= 200
+    lines = text.splitlines()
+    assert lines[0].startswith("origin/ (135 files; showing the ")
+    assert "    pyproject.toml" in lines and "    README.md" in lines
+    assert "    node_modules/ (2 files, not expanded)" in lines
+    assert any(line.strip().startswith("... ") and "more (.py" in line for line in lines)
+    assert stats["files"] == 135 and stats["files_shown"] < 135 and not stats["cache_hit"]
+
+def test_unchanged_trees_are_not_listed_again(repo, indexer):
+    stats = {}
+    first = indexer.summarize(repo.path, budget=500, stats=stats)
+    assert stats["trees_listed"] == stats["trees"]
+    assert indexer.summarize(repo.path, budget=500, stats=stats) == first and stats["cache_hit"]
+
+    repo.commit({"tests/test_new.py": ""})
+    stats = {}
+    indexer.summarize(repo.path, budget=500, stats=stats)
+    assert not stats["cache_hit"]
+    assert stats["trees_listed"] == 2  # the root and tests/; app/ and node_modules/ come from the cache
+    assert stats["files"] == 136
+
+def test_plain_directories_honor_gitignore(tmp_path, indexer):
+    root = tmp_path / "plain"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "main.go").write_text("package main\n")
+    (root / "debug.log").write_text("")
+    (root / ".gitignore").write_text("*.log\n")
+    (root / "vendor" / "lib").mkdir(parents=True)
+    (root / "vendor" / "lib" / "lib.go").write_text("")
+    text = indexer.summarize(str(root), budget=500)
+    assert "debug.log" not in text
+    assert "    vendor/ (1 file, not expanded)" in text.splitlines()
+    assert "        main.go" in text.splitlines()
+
+def test_tiny_budgets_truncate_the_outline(repo, indexer):
+    text = indexer.summarize(repo.path, budget=20)
+    assert text.endswith("... (truncated to the token budget)")
+
+def test_identical_subtrees_in_a_full_listing(git_repo, indexer):
+    files = {f"pkg{i}/mod.py": f"# {i}\n" for i in range(80)}  # over INCREMENTAL_TREE_LIMIT new trees
+    files.update({"a/x.py": "", "b/x.py": "", "a/deep/y.py": "", "b/deep/y.py": ""})
+    git_repo.commit(files)
+    stats = {}
+    text = indexer.summarize(git_repo.path, budget=5000, stats=stats)
+    assert stats["files"] == 84 and stats["trees_listed"] == stats["trees"]
+    lines = text.splitlines()
+    assert lines[lines.index("    a/") + 1:lines.index("    b/")] == ["        deep/", "            y.py", "        x.py"]
+
+    git_repo.commit({"c/z.py": ""})  # a/ and b/ now come from the cache
+    indexer.summarize(git_repo.path, budget=5000, stats=stats)
+    assert stats["files"] == 85
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from app.config import Config
+from app.models import db, Job, Repository
+from app.result_cache import config_version, tree_hash, find_reusable_job, reused_report
+
+def test_config_version_follows_settings_models_and_clone(monkeypatch):
+    base = config_version(models=["default:gpt"])
+    assert config_version(models=["default:gpt"]) == base
+    assert config_version(models=["default:other"]) != base
+    sparse = Repository(name="demo", github_url="https://github.com/example/demo", clone_strategy="sparse",
+                        sparse_paths="src\ntests")
+    assert config_version(sparse, ["default:gpt"]) != base
+    monkeypatch.setattr(Config, "SANDBOX_MEMORY", "64g")
+    assert config_version(models=["default:gpt"]) != base
+
+def test_identical_trees_hash_alike(git_repo):
+    first = git_repo.commit({"app.py": "print(1)\n"}, "first")
+    git_repo.git("commit", "-q", "--allow-empty", "-m", "re-push")
+    same = tree_hash(git_repo.path)
+    git_repo.git("checkout", "-q", first)
+    assert tree_hash(git_repo.path) == same
+    git_repo.commit({"app.py": "print(2)\n"})
+    assert tree_hash(git_repo.path) != same
+
+def job(id, status="success", tree="t1", commit="c1", minutes=0, **fields):
+    fields.setdefault("config_version", "v1")
+    return Job(id=id, repo_url="https://github.com/example/demo", commit_sha=commit, status=status, tree_sha=tree,
+               created_at=datetime(2026, 1, 1) + timedelta(minutes=minutes), **fields)
+
+def test_latest_successful_job_on_the_same_tree_is_reused(app):
+    with app.app_context():
+        db.session.add_all([
+            job("old", minutes=1, test_scope="full"),
+            job("new", minutes=2, test_scope="full", commit="c2"),
+            job("failed", status="failed", minutes=3),
+            job("stale", minutes=4, config_version="v0"),
+            job("copy", minutes=5, reused_from="new"),
+        ])
+        current = job("current", status="running", tree=None)
+        db.session.add(current)
+        db.session.commit()
+        assert find_reusable_job(current, "t1").id == "new"
+        assert find_reusable_job(current).id == "old"  # before checkout: same commit only
+        assert find_reusable_job(current, "t2") is None
+
+def test_selected_test_results_are_only_reused_for_the_same_push(app):
+    with app.app_context():
+        db.session.add(job("selected", test_scope="selected", before_sha="b1"))
+        same_push = job("same", status="running", before_sha="b1")
+        other_push = job("other", status="running", before_sha="b0")
+        all_tests = job("all", status="running", before_sha="b1", full_tests=True)
+        db.session.add_all([same_push, other_push, all_tests])
+        db.session.commit()
+        assert find_reusable_job(same_push, "t1").id == "selected"
+        assert find_reusable_job(other_push, "t1") is None
+        assert find_reusable_job(all_tests, "t1") is None
+
+def test_reused_report_points_to_the_original():
+    original = job("abc1234", report_content="## All green", minutes=24 * 60 + 3 * 60 + 4)
+    report = reused_report(original, "f" * 40)
+    assert report.startswith("> ♻️ **Result reused** from job [`abc1234`](/api/jobs/abc1234) (commit `c1`, "
+                             "2026-01-02 03:04 UTC): the tree `ffffffffffff`")
+    assert report.endswith("## All green")
+
+def test_repeated_commits_get_distinct_job_ids(client):
+    from app.main import app as main_app, next_job_id
+    with main_app.app_context():
+        sha = "1234567890abcdef"
+        assert next_job_id(sha) == "1234567"
+        db.session.add_all([job("1234567", commit=sha), job("1234567-2", commit=sha)])
+        db.session.commit()
+        assert next_job_id(sha) == "1234567-3"
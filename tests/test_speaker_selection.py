@@ -0,0 +1,87 @@
+from agents.speaker_selection import SpeakerSelector
+
+TASKS = "Tasks:\n1. Scanner: detect the stack\n2. Builder: build it\n3. Tester: run the tests\n4. Reporter: report\n"
+
+class Agent:
+    def __init__(self, name):
+        self.name = name
+
+class Chat:
+    """The parts of autogen.GroupChat the selector uses."""
+    def __init__(self, names=("Admin", "Scanner", "Build_Engineer", "Test_Engineer", "Debugger", "Reporter")):
+        self.agents = {name: Agent(name) for name in names}
+        self.agent_names = list(names)
+        self.messages = []
+
+    def agent_by_name(self, name):
+        return self.agents[name]
+
+    def say(self, selector, name, content="", **fields):
+        self.messages.append(dict(fields, name=name, content=content))
+        selected = selector(self.agents[name], self)
+        return selected if selected == "auto" else selected.name
+
+    def run_tool(self, selector, name, exit_code):
+        assert self.say(selector, name, tool_calls=[{"id": "1"}]) == "Admin"
+        return self.say(selector, "Admin", f"Exit code: {exit_code}\nOutput: ...", role="tool",
+                        tool_responses=[{"content": "..."}])
+
+def test_stages_follow_the_task_list():
+    selector, chat = SpeakerSelector(), Chat()
+    assert chat.say(selector, "Admin", TASKS) == "Scanner"
+    assert selector.plan == ["Scanner", "Build_Engineer", "Test_Engineer", "Reporter"]
+    assert chat.run_tool(selector, "Scanner", 0) == "Scanner"
+    assert chat.say(selector, "Scanner", "Stack: Python") == "Build_Engineer"
+    assert chat.run_tool(selector, "Build_Engineer", 0) == "Build_Engineer"
+    assert chat.say(selector, "Build_Engineer", "Built") == "Test_Engineer"
+    assert chat.say(selector, "Test_Engineer", "Tests pass") == "Reporter"
+    assert chat.say(selector, "Reporter", "# Report\nTERMINATE") == "Admin"
+    assert selector.stats == {"rules": 7, "tools": 2, "fallbacks": 0}
+
+def test_failures_go_to_the_debugger_and_back():
+    selector, chat = SpeakerSelector(max_debug_rounds=2), Chat()
+    chat.say(selector, "Admin", TASKS)
+    chat.say(selector, "Scanner", "Stack: Python")
+    assert chat.run_tool(selector, "Build_Engineer", 1) == "Build_Engineer"
+    assert chat.say(selector, "Build_Engineer", "The build failed, Debugger please help") == "Debugger"
+    assert selector.failed_fixes == 0
+    assert chat.say(selector, "Debugger", "Fixed the import") == "Build_Engineer"
+    chat.run_tool(selector, "Build_Engineer", 2)
+    assert chat.say(selector, "Build_Engineer", "Still failing") == "Debugger"
+    assert selector.failed_fixes == 1
+    assert chat.say(selector, "Debugger", "Another fix") == "Build_Engineer"
+    chat.run_tool(selector, "Build_Engineer", 2)
+    # Out of Debugger rounds for this stage: move on so the failure gets reported
+    assert chat.say(selector, "Build_Engineer", "Still failing") == "Test_Engineer"
+    assert selector.failed_fixes == 2
+    chat.run_tool(selector, "Test_Engineer", 0)
+    assert chat.say(selector, "Test_Engineer", "Tests pass") == "Reporter"
+    assert selector.failed_fixes == 0
+
+def test_mentioning_the_debugger_without_a_failure_moves_on():
+    selector, chat = SpeakerSelector(), Chat()
+    chat.say(selector, "Admin", TASKS)
+    chat.run_tool(selector, "Scanner", 0)
+    assert chat.say(selector, "Scanner", "No need for the Debugger") == "Build_Engineer"
+
+def test_fast_mode_failures_start_with_the_debugger():
+    selector, chat = SpeakerSelector(), Chat()
+    assert chat.say(selector, "Admin", TASKS + "\nFast mode results:\n- [test] `pytest -q`: FAILED (exit 1)\n") == \
+        "Debugger"
+    assert chat.say(selector, "Debugger", "Fixed") == "Test_Engineer"
+
+def test_plans_without_a_task_list_or_debugger():
+    selector, chat = SpeakerSelector(), Chat(("Admin", "Scanner", "Build_Engineer", "Reporter"))
+    assert chat.say(selector, "Admin", "Please test this repository") == "Scanner"
+    assert selector.plan == ["Scanner", "Build_Engineer", "Reporter"]
+    chat.say(selector, "Scanner", "Stack: Go")
+    chat.run_tool(selector, "Build_Engineer", 1)
+    assert chat.say(selector, "Build_Engineer", "Failed") == "Reporter"  # no Debugger to call
+
+def test_unexpected_turns_fall_back_to_the_llm():
+    selector, chat = SpeakerSelector(), Chat()
+    assert chat.say(selector, "Scanner", "hello") == "auto"  # before any task list
+    chat.say(selector, "Admin", TASKS)
+    assert chat.say(selector, "Reporter", "Report without the end marker") == "auto"
+    assert chat.say(selector, "Debugger", "Unasked advice") == "auto"
+    assert selector.stats["fallbacks"] == 3
@@ -0,0 +1,53 @@
+import json
+import pytest
+from agents.stack_detector import detect_stack
+
+def make(tmp_path, files):
+    for name, content in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return str(tmp_path)
+
+@pytest.mark.parametrize("manifest, name, image", [
+    ("pom.xml", "Java (Maven)", "maven:3.8-openjdk-17"),
+    ("build.gradle.kts", "Java (Gradle)", "gradle:8-jdk17"),
+    ("go.mod", "Go", "golang:1.22"),
+    ("Cargo.toml", "Rust", "rust:1.79"),
+])
+def test_single_manifest_picks_the_stack(tmp_path, manifest, name, image):
+    stack, reason = detect_stack(make(tmp_path, {manifest: ""}))
+    assert (stack.name, stack.image) == (name, image)
+    assert manifest in reason
+
+def test_python_commands_follow_the_manifests(tmp_path):
+    stack, _ = detect_stack(make(tmp_path, {"requirements.txt": "flask\n", "pyproject.toml": "",
+                                            "pkg/test_app.py": ""}))
+    assert stack.build_commands == ["pip install -r requirements.txt", "pip install -e ."]
+    assert stack.test_commands == ["pip install pytest && python -m pytest -q"]
+
+def test_python_without_tests_has_no_test_command(tmp_path):
+    stack, _ = detect_stack(make(tmp_path, {"requirements.txt": "", "app.py": ""}))
+    assert stack.test_commands == []
+
+def test_node_scripts(tmp_path):
+    package = {"scripts": {"build": "tsc", "test": "jest"}}
+    stack, _ = detect_stack(make(tmp_path, {"package.json": json.dumps(package), "package-lock.json": "{}"}))
+    assert stack.build_commands == ["npm ci", "npm run build"]
+    assert stack.test_commands == ["npm test"]
+
+def test_node_placeholder_test_script_is_ignored(tmp_path):
+    package = {"scripts": {"test": "echo \"Error: no test specified\" && exit 1"}}
+    stack, _ = detect_stack(make(tmp_path, {"package.json": json.dumps(package)}))
+    assert stack.build_commands == ["npm install"]
+    assert stack.test_commands == []
+
+@pytest.mark.parametrize("files, reason", [
+    ({"README.md": ""}, "no known manifest files"),
+    ({"Dockerfile": ""}, "only a Dockerfile"),
+    ({"pom.xml": "", "package.json": "{}"}, "several stacks"),
+])
+def test_ambiguous_repositories_go_to_the_llm_scanner(tmp_path, files, reason):
+    stack, why = detect_stack(make(tmp_path, files))
+    assert stack is None
+    assert reason in why
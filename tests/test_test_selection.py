@@ -0,0 +1,101 @@
+import pytest
+from agents.stack_detector import Stack
+from agents import test_selection
+from agents.test_selection import PushedChange, _affected_tests, _parse_python, _LANGUAGES, parse_imports, is_test_file
+
+PYTHON = Stack("Python", "python:3.11-slim", [], ["python -m pytest -q"], ["pyproject.toml"])
+
+def index(sources):
+    return {path: ["blob", parse_imports(path, text)] for path, text in sources.items()}
+
+def test_relative_imports_resolve_against_the_package():
+    source = "from . import models\nfrom .views import render\nfrom ..core import engine\nimport json\n"
+    assert _parse_python("app/web/routes.py", source) == [
+        "app.core", "app.core.engine", "app.web", "app.web.models", "app.web.views", "app.web.views.render", "json",
+    ]
+    assert _parse_python("app/__init__.py", "from .config import Config\n") == ["app.config", "app.config.Config"]
+    assert _parse_python("broken.py", "def (") == []
+
+def test_tests_are_found_through_the_import_graph():
+    files = index({
+        "src/app/core.py": "",
+        "src/app/service.py": "from .core import run\n",
+        "src/app/cli.py": "",
+        "tests/test_core.py": "from app.core import run\n",
+        "tests/test_service.py": "from app import service\n",
+        "tests/test_cli.py": "import app.cli\n",
+    })
+    assert _affected_tests(files, ["src/app/core.py"], _LANGUAGES["Python"]) == {
+        "tests/test_core.py": "imports `src/app/core.py`",
+        "tests/test_service.py": "depends on `src/app/core.py` (via `src/app/service.py`)",
+    }
+    assert _affected_tests(files, ["tests/test_cli.py"], _LANGUAGES["Python"]) == {"tests/test_cli.py": "changed"}
+
+def test_node_and_go_graphs():
+    files = index({
+        "src/math.ts": "",
+        "src/index.ts": "export * from './math'\n",
+        "src/__tests__/index.test.ts": "import { add } from '../index'\n",
+        "src/other.spec.js": "const x = require('./unrelated')\n",
+    })
+    assert _affected_tests(files, ["src/math.ts"], _LANGUAGES["Node.js"]) == {
+        "src/__tests__/index.test.ts": "depends on `src/math.ts` (via `src/index.ts`)",
+    }
+    files = index({
+        "pkg/store/store.go": "package store\n",
+        "pkg/api/api.go": 'package api\nimport (\n\t"fmt"\n\t"example.com/app/pkg/store"\n)\n',
+        "pkg/api/api_test.go": "package api\n",
+        "cmd/main_test.go": "package main\n",
+    })
+    assert _affected_tests(files, ["pkg/store/store.go"], _LANGUAGES["Go"]) == {
+        "pkg/api": "imports `pkg/store/store.go`",
+    }
+
+def test_test_files_by_language():
+    assert is_test_file("tests/test_api.py") and is_test_file("pkg/api_test.go")
+    assert is_test_file("web/__tests__/app.js") and is_test_file("web/app.spec.tsx")
+    assert is_test_file("src/test/java/AppTest.java")
+    assert not is_test_file("src/main/java/App.java") and not is_test_file("testing.py")
+
+@pytest.fixture
+def repo(git_repo):
+    base = git_repo.commit({
+        "pyproject.toml": "[project]\nname = 'demo'\n",
+        "demo/__init__.py": "",
+        "demo/core.py": "def run():\n    return 1\n",
+        "demo/cli.py": "",
+        "tests/test_core.py": "from demo.core import run\n",
+        "tests/test_cli.py": "from demo import cli\n",
+        "tests/test_more.py": "from demo.core import run\n",
+    })
+    return git_repo, base
+
+def test_selection_for_a_push(repo, tmp_path):
+    git_repo, base = repo
+    after = git_repo.commit({"demo/core.py": "def run():\n    return 2\n", "README.md": "docs"})
+    selector = test_selection.TestSelector(str(tmp_path / "index"), shards=2)
+    selection = selector.select(git_repo.path, "https://github.com/example/demo", PYTHON, PushedChange(base, after))
+    assert not selection.full
+    assert sorted(selection.tests) == ["tests/test_core.py", "tests/test_more.py"]
+    assert selection.commands == ["python -m pytest -q tests/test_core.py", "python -m pytest -q tests/test_more.py"]
+    assert selection.summary() == f"2 tests selected for 2 changed files (git diff {base[:7]}..{after[:7]})"
+
+def test_full_runs(repo, tmp_path):
+    git_repo, base = repo
+    selector = test_selection.TestSelector(str(tmp_path / "index"), full_every=2)
+    url = "https://github.com/example/demo"
+    config = git_repo.commit({"pyproject.toml": "[project]\nname = 'demo2'\n"})
+    assert selector.select(git_repo.path, url, PYTHON, PushedChange(base, config)).reason == \
+        "`pyproject.toml` affects every test"
+    deleted = git_repo.commit({"demo/cli.py": None})
+    assert selector.select(git_repo.path, url, PYTHON, PushedChange(config, deleted)).reason == \
+        "`demo/cli.py` was deleted"
+    assert selector.select(git_repo.path, url, PYTHON, PushedChange("0" * 40, deleted)).full
+    assert selector.select(git_repo.path, url, Stack("Rust", "rust", [], [], []), PushedChange(base, config)).full
+
+    docs = git_repo.commit({"docs/guide.md": "hi"})
+    selection = selector.select(git_repo.path, url, PYTHON, PushedChange(deleted, docs))
+    assert not selection.full and selection.tests == {} and selection.commands == []
+    # every second selective run is a full one
+    assert selector.select(git_repo.path, url, PYTHON, PushedChange(deleted, docs)).reason == \
+        "periodic full run (every 2 runs)"